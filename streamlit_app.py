@@ -4,11 +4,20 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from scipy.stats import poisson
+from scipy.stats import poisson, nbinom
+from scipy.optimize import minimize
 import numpy as np
 import warnings
 import base64
 import requests
+import os
+import sys
+import json
+import hashlib
+import weakref
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from io import BytesIO
 from textwrap import dedent
 warnings.filterwarnings('ignore')
@@ -79,6 +88,29 @@ def normalize_team_name(team_name):
         normalized = normalized.replace(old, new)
     return normalized
 
+# Grafias alternativas -> nome canônico usado nas análises (aplicado após normalize_team_name)
+ALIASES_TIMES = {
+    "Mirasol": "Mirassol",
+    "Sao Paulo": "São Paulo",
+    "Athletico PR": "A. Paranaense",
+    "Athletico-PR": "A. Paranaense",
+    "Atletico MG": "A. Mineiro",
+    "Atlético-MG": "A. Mineiro",
+    "Atletico GO": "A. Goianiense",
+    "Atlético-GO": "A. Goianiense",
+    "Red Bull Bragantino": "Bragantino",
+    "Sport Recife": "Sport",
+    "Grêmio": "Gremio",
+    "Ceará": "Ceara",
+    "Vitória": "Vitoria",
+    "Criciúma": "Criciuma",
+}
+
+def canonicalizar_time(team_name):
+    """Resolve encoding quebrado e aliases, retornando o nome canônico do time"""
+    normalized = normalize_team_name(str(team_name).strip())
+    return ALIASES_TIMES.get(normalized, normalized)
+
 def _clean_html(s: str) -> str:
     """Remove indentação comum e espaços extras no início/fim para evitar code blocks no Markdown."""
     return dedent(s).strip()
@@ -297,45 +329,1248 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
-def load_data():
+# ===================================================================
+# PARÂMETROS DOS MODELOS (PADRÃO OU CALIBRADOS PELA VARREDURA)
+# ===================================================================
+
+ARQUIVO_PARAMETROS_MODELO = "parametros_modelo.json"
+
+PARAMETROS_MODELO_PADRAO = {
+    # Pesos de média geral / últimos 5 / últimos 3 nos lambdas de gols
+    'peso_geral': 0.60,
+    'peso_ultimos_5': 0.25,
+    'peso_ultimos_3': 0.15,
+    # Ajuste de mando nos lambdas de gols
+    'fator_mando': 1.15,
+    'fator_visitante': 0.85,
+    # Pesos do Value Score (value gap / força relativa / forma / coerência de gols)
+    'peso_value_gap': 0.50,
+    'peso_forca': 0.20,
+    'peso_forma': 0.20,
+    'peso_gols': 0.10,
+    # Limites superiores das 6 faixas de odds (Forte Favorito ... Azarão Forte)
+    'limites_faixas_odds': [1.5, 2.0, 2.5, 3.5, 5.0],
+}
+
+# Pesos de média geral / últimos 5 / últimos 3 nos lambdas de escanteios
+# (fixos: a varredura só avalia o modelo de gols e o Value Score)
+PESOS_FORMA_ESCANTEIOS = {'peso_geral': 0.60, 'peso_ultimos_5': 0.25, 'peso_ultimos_3': 0.15}
+
+
+def validar_parametros_modelo(parametros):
+    """Completa com os valores padrão e valida tipos e faixas; ValueError se inválido"""
+    validados = dict(PARAMETROS_MODELO_PADRAO)
+    for chave, valor in parametros.items():
+        if chave not in PARAMETROS_MODELO_PADRAO:
+            raise ValueError(f"Parâmetro desconhecido: {chave}")
+        validados[chave] = valor
+    
+    limites = [float(limite) for limite in validados['limites_faixas_odds']]
+    if len(limites) != len(PARAMETROS_MODELO_PADRAO['limites_faixas_odds']) or limites != sorted(set(limites)):
+        raise ValueError("limites_faixas_odds deve ter 5 valores crescentes")
+    validados['limites_faixas_odds'] = limites
+    
+    for chave, valor in validados.items():
+        if chave != 'limites_faixas_odds':
+            validados[chave] = float(valor)
+            if validados[chave] < 0:
+                raise ValueError(f"Parâmetro negativo: {chave}")
+    return validados
+
+
+def carregar_parametros_modelo(caminho=ARQUIVO_PARAMETROS_MODELO):
+    """
+    Lê a melhor configuração gravada pela varredura (chave 'parametros' do JSON).
+    
+    Sem arquivo, usa PARAMETROS_MODELO_PADRAO; arquivo inválido gera aviso e
+    também volta ao padrão.
+    """
+    if not os.path.exists(caminho):
+        return dict(PARAMETROS_MODELO_PADRAO)
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            conteudo = json.load(f)
+        return validar_parametros_modelo(conteudo.get('parametros', conteudo))
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        st.warning(f"⚠ Parâmetros em {caminho} ignorados ({e}); usando os valores padrão.")
+        return dict(PARAMETROS_MODELO_PADRAO)
+
+
+PARAMETROS_MODELO = carregar_parametros_modelo()
+
+# ===================================================================
+# CARREGAMENTO DOS DADOS (COM SNAPSHOT COLUNAR EM DISCO)
+# ===================================================================
+
+ARQUIVO_DADOS = "BRA_DADOS_2425_B.csv"
+PASTA_CACHE_DADOS = ".cache_dados"
+# Incrementar sempre que a preparação dos dados (tipos/colunas derivadas) mudar,
+# para invalidar snapshots gravados por versões anteriores
+VERSAO_CACHE_DADOS = 4
+
+
+def _assinatura_arquivo(caminho):
+    """Retorna (tamanho, mtime_ns) do arquivo - verificação barata de alteração"""
+    info = os.stat(caminho)
+    return info.st_size, info.st_mtime_ns
+
+
+def _hash_arquivo(caminho, tamanho_bloco=1 << 20):
+    """Calcula o SHA-1 do conteúdo do arquivo, lendo em blocos"""
+    sha1 = hashlib.sha1()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            sha1.update(bloco)
+    return sha1.hexdigest()
+
+
+def _caminhos_snapshot(caminho_csv):
+    """Retorna os caminhos do snapshot (.feather) e dos seus metadados (.json)"""
+    pasta = os.path.join(os.path.dirname(os.path.abspath(caminho_csv)), PASTA_CACHE_DADOS)
+    nome_base = os.path.splitext(os.path.basename(caminho_csv))[0]
+    return (os.path.join(pasta, f"{nome_base}.feather"),
+            os.path.join(pasta, f"{nome_base}.json"))
+
+
+def _gravar_json_atomico(caminho, conteudo):
+    """Grava JSON via arquivo temporário + rename, para nunca deixar arquivo pela metade"""
+    temporario = f"{caminho}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(conteudo, f)
+    os.replace(temporario, caminho)
+
+
+def _ler_snapshot(caminho_csv):
+    """
+    Lê o snapshot colunar se ele corresponder ao CSV atual.
+    
+    A validação é feita em duas etapas:
+    1. Tamanho e mtime iguais aos registrados -> snapshot válido (sem ler o CSV)
+    2. Só o mtime mudou (ex.: checkout do git) -> confere o hash do conteúdo
+    
+    Returns:
+        DataFrame já preparado, ou None se o snapshot não existir/estiver desatualizado
+    """
+    arquivo_snapshot, arquivo_meta = _caminhos_snapshot(caminho_csv)
+    try:
+        with open(arquivo_meta, encoding='utf-8') as f:
+            meta = json.load(f)
+        
+        if meta.get('versao') != VERSAO_CACHE_DADOS:
+            return None
+        
+        tamanho, mtime_ns = _assinatura_arquivo(caminho_csv)
+        if meta.get('tamanho') != tamanho:
+            return None
+        
+        if meta.get('mtime_ns') != mtime_ns:
+            if meta.get('sha1') != _hash_arquivo(caminho_csv):
+                return None
+            # Conteúdo idêntico: apenas atualiza o mtime registrado
+            meta['mtime_ns'] = mtime_ns
+            _gravar_json_atomico(arquivo_meta, meta)
+        
+        return pd.read_feather(arquivo_snapshot)
+    
+    except Exception:
+        # Snapshot é apenas otimização: qualquer falha cai no parse do CSV
+        return None
+
+
+def _gravar_snapshot(caminho_csv, df):
+    """Grava o DataFrame preparado em formato colunar (Feather) junto com a assinatura do CSV"""
+    arquivo_snapshot, arquivo_meta = _caminhos_snapshot(caminho_csv)
+    try:
+        os.makedirs(os.path.dirname(arquivo_snapshot), exist_ok=True)
+        tamanho, mtime_ns = _assinatura_arquivo(caminho_csv)
+        
+        temporario = f"{arquivo_snapshot}.tmp"
+        df.to_feather(temporario)
+        os.replace(temporario, arquivo_snapshot)
+        
+        _gravar_json_atomico(arquivo_meta, {
+            'versao': VERSAO_CACHE_DADOS,
+            'arquivo': os.path.basename(caminho_csv),
+            'tamanho': tamanho,
+            'mtime_ns': mtime_ns,
+            'sha1': _hash_arquivo(caminho_csv)
+        })
+    except Exception:
+        # Sem permissão de escrita ou pyarrow indisponível: segue sem snapshot
+        pass
+
+
+def _preparar_dados(df):
+    """Aplica limpeza, conversão de tipos e colunas derivadas ao CSV bruto"""
+    # Renomear colunas problemáticas, se necessário
+    if 'Gols  Away' in df.columns:
+        df = df.rename(columns={'Gols  Away': 'Gols Away'})
+
+    # Limpeza básica
+    df = df.dropna(subset=['Home', 'Away', 'Ano'])
+    df = df[df['Home'].str.strip() != '']
+    df = df[df['Away'].str.strip() != '']
+
+    # Conversão de tipos
+    df['Ano'] = pd.to_numeric(df['Ano'], errors='coerce')
+    numeric_columns = ['Gols Home', 'Gols Away', 'odd Home', 'odd Draw', 'odd Away',
+                       'Corner Home', 'Corner Away', 'Total Corner Match',
+                       'Home Score HT', 'Away Score HT']
+    for col in numeric_columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Jogos sem placar (rodadas futuras) não entram nas análises
+    df = df.dropna(subset=['Gols Home', 'Gols Away'])
+
+    for col in ['Gols Home', 'Gols Away', 'Home Score HT', 'Away Score HT',
+                'Corner Home', 'Corner Away', 'Total Corner Match']:
+        if col in df.columns:
+            df[col] = _compactar_inteiros(df[col])
+
+    df = _adicionar_colunas_derivadas(df)
+    df = _codificar_times(df)
+
+    return df.reset_index(drop=True)
+
+
+def _codificar_times(df):
+    """
+    Unifica os aliases de cada clube e codifica Home/Away como categóricas.
+    
+    As duas colunas compartilham a mesma lista de categorias (ordem alfabética),
+    de modo que 'Home ID' e 'Away ID' (int16) apontam para a mesma tabela de times
+    e comparações como df['Home'] == time viram comparações de inteiros.
+    """
+    home = df['Home'].map(canonicalizar_time)
+    away = df['Away'].map(canonicalizar_time)
+    
+    times = sorted(set(home) | set(away))
+    tipo_times = pd.CategoricalDtype(categories=times)
+    
+    df['Home'] = home.astype(tipo_times)
+    df['Away'] = away.astype(tipo_times)
+    df['Home ID'] = df['Home'].cat.codes.astype('int16')
+    df['Away ID'] = df['Away'].cat.codes.astype('int16')
+    
+    return df
+
+
+def _compactar_inteiros(serie):
+    """Converte contagens para int8 quando não há valores ausentes; senão float32"""
+    if serie.isna().any() or serie.abs().max() > 127:
+        return serie.astype('float32')
+    return serie.astype('int8')
+
+
+# ===================================================================
+# REMOÇÃO DA MARGEM DAS ODDS (DE-VIG) - VETORIZADA POR COLUNA
+# ===================================================================
+
+METODOS_DEVIG = {
+    'proporcional': 'Proporcional (divide pela soma)',
+    'potencia': 'Potência (p = r^k)',
+    'shin': 'Shin (apostadores informados)',
+    'razao_odds': 'Razão de odds (odds ratio)',
+}
+METODO_DEVIG_PADRAO = 'shin'
+
+COLUNAS_ODDS_1X2 = ['odd Home', 'odd Draw', 'odd Away']
+COLUNAS_PROB_JUSTA = ['Prob Justa Home', 'Prob Justa Draw', 'Prob Justa Away']
+
+
+def _bisseccao_vetorizada(excesso, baixo, alto, iteracoes=60):
+    """
+    Raiz de excesso(x) = 0 para cada linha, com excesso decrescente em x.
+    
+    Args:
+        excesso: função de um array (n, 1) de parâmetros -> array (n,) com soma das probabilidades - 1
+        baixo, alto: arrays (n,) com o intervalo de busca
+    """
+    baixo, alto = baixo.copy(), alto.copy()
+    for _ in range(iteracoes):
+        meio = (baixo + alto) / 2
+        acima = excesso(meio[:, None]) > 0
+        baixo = np.where(acima, meio, baixo)
+        alto = np.where(acima, alto, meio)
+    return ((baixo + alto) / 2)[:, None]
+
+
+def probabilidades_justas(odds, metodo=METODO_DEVIG_PADRAO):
+    """
+    Remove a margem da casa de um conjunto de odds (uma linha por mercado).
+    
+    Métodos:
+        proporcional: p = r / soma(r)
+        potencia: p = r^k, com k tal que soma(p) = 1
+        shin: modelo de Shin, com fração z de apostadores informados
+        razao_odds: p/(1-p) = r/(1-r) / c, com c tal que soma(p) = 1
+    
+    Args:
+        odds: array (n, k) de odds decimais (ex.: colunas Home/Draw/Away)
+        metodo: chave de METODOS_DEVIG
+    
+    Returns:
+        array (n, k) de probabilidades que somam 1 por linha; NaN nas linhas
+        com alguma odd ausente ou <= 1
+    """
+    if metodo not in METODOS_DEVIG:
+        raise ValueError(f"Método de remoção de margem desconhecido: {metodo}")
+    
+    odds = np.atleast_2d(np.asarray(odds, dtype='float64'))
+    validas = (odds > 1).all(axis=1)
+    probs = np.full(odds.shape, np.nan)
+    if not validas.any():
+        return probs
+    
+    r = 1 / odds[validas]
+    soma = r.sum(axis=1, keepdims=True)
+    n_linhas, n_resultados = r.shape
+    
+    if metodo == 'proporcional':
+        justas = r / soma
+    
+    elif metodo == 'potencia':
+        # soma(r^k) decresce em k (todo r < 1); k > 1 quando há margem
+        log_r = np.log(r)
+        k = _bisseccao_vetorizada(lambda k: np.exp(log_r * k).sum(axis=1) - 1,
+                                  np.full(n_linhas, 1e-3), np.full(n_linhas, 50.0))
+        justas = np.exp(log_r * k)
+    
+    elif metodo == 'shin':
+        # p_i(z) = (sqrt(z^2 + 4(1-z) r_i^2 / R) - z) / (2(1-z)); sem margem (R <= 1), z = 0
+        def shin(z):
+            return (np.sqrt(z ** 2 + 4 * (1 - z) * r ** 2 / soma) - z) / (2 * (1 - z))
+        
+        z = _bisseccao_vetorizada(lambda z: shin(z).sum(axis=1) - 1,
+                                  np.zeros(n_linhas), np.full(n_linhas, 0.99))
+        z = np.where(soma > 1, z, 0.0)
+        justas = shin(z)
+    
+    else:
+        # soma das probabilidades decresce em log(c); c > 1 quando há margem
+        def razao(log_c):
+            return r / (np.exp(log_c) * (1 - r) + r)
+        
+        log_c = _bisseccao_vetorizada(lambda log_c: razao(log_c).sum(axis=1) - 1,
+                                      np.full(n_linhas, -10.0), np.full(n_linhas, 10.0))
+        justas = razao(log_c)
+    
+    # Renormaliza o resíduo numérico das bissecções
+    probs[validas] = justas / justas.sum(axis=1, keepdims=True)
+    return probs
+
+
+def margem_das_odds(odds):
+    """Margem da casa (overround) de cada linha: soma(1/odd) - 1"""
+    odds = np.atleast_2d(np.asarray(odds, dtype='float64'))
+    with np.errstate(divide='ignore'):
+        return np.where((odds > 1).all(axis=1), (1 / odds).sum(axis=1) - 1, np.nan)
+
+
+def _adicionar_probabilidades_justas(df, metodo=METODO_DEVIG_PADRAO):
+    """Colunas de probabilidade justa (sem margem) e margem da casa para cada jogo"""
+    if not all(col in df.columns for col in COLUNAS_ODDS_1X2):
+        return df
+    
+    odds = df[COLUNAS_ODDS_1X2].to_numpy(dtype='float64', na_value=np.nan)
+    probs = probabilidades_justas(odds, metodo)
+    for i, col in enumerate(COLUNAS_PROB_JUSTA):
+        df[col] = probs[:, i].astype('float32')
+    df['Margem Odds'] = margem_das_odds(odds).astype('float32')
+    return df
+
+
+def _adicionar_colunas_derivadas(df):
+    """
+    Calcula, em uma única passada vetorizada, as colunas derivadas usadas pelas análises.
+    
+    Colunas criadas:
+        Codigo Resultado / Codigo Resultado HT: 1 vitória mandante, 0 empate, -1 vitória visitante
+        Resultado Home: categórica ('Vitória', 'Empate', 'Derrota') na perspectiva do mandante
+        Pontos Home / Pontos Away: pontos conquistados por cada lado (3/1/0)
+        Total Gols, Gols Home ST, Gols Away ST (2º tempo = final - intervalo), Total Escanteios
+        Over 1.5 / Over 2.5 / Over 3.5 / Ambas Marcam: flags booleanas
+        Prob Justa Home/Draw/Away, Margem Odds: odds 1X2 sem a margem da casa
+    """
+    gols_home = df['Gols Home'].to_numpy()
+    gols_away = df['Gols Away'].to_numpy()
+    
+    codigo = np.sign(gols_home - gols_away).astype('int8')
+    df['Codigo Resultado'] = codigo
+    df['Resultado Home'] = pd.Categorical.from_codes(
+        1 - codigo, categories=['Vitória', 'Empate', 'Derrota']
+    )
+    
+    # Pontos: vitória = 3, empate = 1, derrota = 0
+    tabela_pontos = np.array([0, 1, 3], dtype='int8')
+    df['Pontos Home'] = tabela_pontos[codigo + 1]
+    df['Pontos Away'] = tabela_pontos[1 - codigo]
+    
+    df['Total Gols'] = _compactar_inteiros(df['Gols Home'] + df['Gols Away'])
+    total_gols = df['Total Gols'].to_numpy()
+    df['Over 1.5'] = total_gols > 1.5
+    df['Over 2.5'] = total_gols > 2.5
+    df['Over 3.5'] = total_gols > 3.5
+    df['Ambas Marcam'] = (gols_home > 0) & (gols_away > 0)
+    
+    if 'Home Score HT' in df.columns and 'Away Score HT' in df.columns:
+        df['Gols Home ST'] = _compactar_inteiros(df['Gols Home'] - df['Home Score HT'])
+        df['Gols Away ST'] = _compactar_inteiros(df['Gols Away'] - df['Away Score HT'])
+        diferenca_ht = (df['Home Score HT'] - df['Away Score HT']).to_numpy()
+        df['Codigo Resultado HT'] = np.sign(np.nan_to_num(diferenca_ht)).astype('int8')
+    
+    if 'Corner Home' in df.columns and 'Corner Away' in df.columns:
+        df['Total Escanteios'] = _compactar_inteiros(df['Corner Home'] + df['Corner Away'])
+    
+    return _adicionar_probabilidades_justas(df)
+
+
+def _ler_dados():
+    """Lê o dataset (snapshot ou CSV) e aplica a preparação, sem cache do Streamlit"""
     try:
-        df = pd.read_csv("BRA_DADOS_2425_B.csv", sep=';', encoding='latin1')
+        # Caminho rápido: snapshot colunar já preparado e válido para o CSV atual
+        df = _ler_snapshot(ARQUIVO_DADOS)
+        if df is not None:
+            return df
+
+        df = pd.read_csv(ARQUIVO_DADOS, sep=';', encoding='latin1')
 
         # Validação da coluna Ano
         if 'Ano' not in df.columns:
             st.error("⚠ A coluna 'Ano' é obrigatória para filtrar os dados por período.")
             return pd.DataFrame()
 
-        # Renomear colunas problemáticas, se necessário
-        if 'Gols  Away' in df.columns:
-            df = df.rename(columns={'Gols  Away': 'Gols Away'})
+        df = _preparar_dados(df)
+        _gravar_snapshot(ARQUIVO_DADOS, df)
 
-        # Limpeza básica
-        df = df.dropna(subset=['Home', 'Away', 'Ano'])
-        df = df[df['Home'].str.strip() != '']
-        df = df[df['Away'].str.strip() != '']
+        return df
 
-        # Conversão de tipos
-        df['Ano'] = pd.to_numeric(df['Ano'], errors='coerce')
-        numeric_columns = ['Gols Home', 'Gols Away', 'odd Home', 'odd Draw', 'odd Away',
-                           ' Home', ' Away', 'Total  Match', 'Home Score HT', 'Away Score HT']
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+    except Exception as e:
+        st.error(f"Erro ao carregar os dados: {e}")
+        return pd.DataFrame()
 
-        # Coluna Resultado e Total Gols
-        df['Resultado Home'] = df.apply(
-            lambda row: 'Vitória' if row['Gols Home'] > row['Gols Away']
-            else 'Empate' if row['Gols Home'] == row['Gols Away']
-            else 'Derrota', axis=1)
-        df['Total Gols'] = df['Gols Home'] + df['Gols Away']
 
-        return df.reset_index(drop=True)
+# ============================================================================
+# VISÕES POR TEMPORADA (PARTIÇÕES CACHEADAS ENTRE RERUNS E SESSÕES)
+# ============================================================================
 
-    except Exception as e:
-        st.error(f"Erro ao carregar os dados: {e}")
+FILTRO_COMBINADO = "2025 + 2026 (Combinados)"
+FILTRO_TODOS = "Todos os Anos"
+ANOS_COMBINADOS = (2025, 2026)
+
+
+def _times_da_visao(df):
+    """Lista ordenada dos times presentes na visão"""
+    if df.empty or 'Home' not in df.columns or 'Away' not in df.columns:
+        return []
+    home_teams = df['Home'].dropna().astype(str).str.strip()
+    away_teams = df['Away'].dropna().astype(str).str.strip()
+    return sorted(set(home_teams) | set(away_teams))
+
+
+@st.cache_resource(show_spinner=False)
+def _montar_visoes(assinatura):
+    """
+    Particiona o dataset uma única vez por versão do CSV.
+    
+    O resultado é compartilhado (sem cópia) entre reruns e sessões, por isso as
+    visões são somente leitura: as análises sempre trabalham sobre recortes
+    próprios (jogos_do_time, filtros booleanos), nunca alteram o df recebido.
+    
+    Args:
+        assinatura: (tamanho, mtime) do CSV, usada apenas como chave do cache
+    
+    Returns:
+        dict: base, anos disponíveis, visões por filtro e lista de times por filtro
+    """
+    base = _ler_dados()
+    visoes = {FILTRO_TODOS: base}
+    anos = []
+    
+    if not base.empty:
+        for ano, particao in base.groupby('Ano', sort=True):
+            anos.append(int(ano))
+            visoes[str(int(ano))] = particao
+        visoes[FILTRO_COMBINADO] = base[base['Ano'].isin(ANOS_COMBINADOS)]
+    
+    return {
+        'base': base,
+        'anos': anos,
+        'visoes': visoes,
+        'times': {filtro: _times_da_visao(visao) for filtro, visao in visoes.items()}
+    }
+
+
+def obter_visoes_temporada():
+    """Retorna as visões por temporada do CSV atual (reconstruídas só se o arquivo mudar)"""
+    try:
+        assinatura = _assinatura_arquivo(ARQUIVO_DADOS)
+    except OSError:
+        assinatura = None
+    return _montar_visoes(assinatura)
+
+
+def obter_visao(visoes, filtro):
+    """Retorna (df, times) do filtro selecionado; filtro sem dados gera uma visão vazia"""
+    df = visoes['visoes'].get(filtro)
+    if df is None:
+        df = visoes['base'].iloc[0:0]
+    return df, visoes['times'].get(filtro, [])
+
+
+# ============================================================================
+# ÍNDICE DE PARTIDAS POR TIME (CONSTRUÍDO UMA VEZ POR DATAFRAME)
+# ============================================================================
+
+# Artefatos derivados de cada DataFrame carregado/filtrado, indexados por id(df).
+# A entrada é removida automaticamente quando o DataFrame é coletado.
+_ARTEFATOS_POR_FRAME = {}
+
+
+def _artefato_do_frame(df, nome, construtor):
+    """
+    Retorna o artefato `nome` associado a este DataFrame, construindo-o na primeira chamada.
+    
+    DataFrames não são hashable, então o registro usa id(df) e um weakref.finalize
+    para limpar a entrada quando o objeto deixa de existir. O artefato não deve
+    guardar referência ao próprio df (senão ele nunca seria coletado).
+    """
+    chave = id(df)
+    artefatos = _ARTEFATOS_POR_FRAME.get(chave)
+    if artefatos is None:
+        artefatos = {}
+        _ARTEFATOS_POR_FRAME[chave] = artefatos
+        weakref.finalize(df, _ARTEFATOS_POR_FRAME.pop, chave, None)
+    
+    if nome not in artefatos:
+        artefatos[nome] = construtor(df)
+    return artefatos[nome]
+
+
+class MatchIndex:
+    """
+    Mapeia (time, mando) para as posições (ordenadas) das linhas do DataFrame.
+    
+    Substitui varreduras do tipo df[df['Home'] == time] por um acesso O(k)
+    às k partidas do time, seguido de df.take(posicoes).
+    """
+    
+    def __init__(self, df):
+        self.total_linhas = len(df)
+        self.mandante = self._agrupar(df['Home'])
+        self.visitante = self._agrupar(df['Away'])
+        self._todos = {}
+    
+    @staticmethod
+    def _agrupar(coluna):
+        indices = coluna.groupby(coluna, observed=True, sort=False).indices
+        return {time: np.asarray(posicoes, dtype=np.intp) for time, posicoes in indices.items()}
+    
+    def posicoes(self, team, venue='Home'):
+        """Posições das partidas do time: venue = 'Home', 'Away' ou 'Todos'"""
+        vazio = np.empty(0, dtype=np.intp)
+        if venue == 'Home':
+            return self.mandante.get(team, vazio)
+        if venue == 'Away':
+            return self.visitante.get(team, vazio)
+        
+        if team not in self._todos:
+            self._todos[team] = np.union1d(self.mandante.get(team, vazio),
+                                           self.visitante.get(team, vazio))
+        return self._todos[team]
+
+
+def indice_partidas(df):
+    """Retorna o MatchIndex do DataFrame (construído uma única vez por DataFrame)"""
+    return _artefato_do_frame(df, 'indice_partidas', MatchIndex)
+
+
+def jogos_do_time(df, team, venue='Home'):
+    """
+    Retorna as partidas do time como novo DataFrame (já é uma cópia, pode ser alterado).
+    
+    Args:
+        df: DataFrame com os dados dos jogos
+        team: Nome do time
+        venue: 'Home' (mandante), 'Away' (visitante) ou 'Todos'
+    """
+    return df.take(indice_partidas(df).posicoes(team, venue))
+
+
+# ============================================================================
+# CUBO DE AGREGADOS TIME x MANDO x TEMPORADA (UM ÚNICO GROUPBY POR DATAFRAME)
+# ============================================================================
+
+# Contagens somadas no cubo (todas inteiras); médias e desvios são derivados delas
+COLUNAS_SOMA_CUBO = [
+    'jogos', 'vitorias', 'empates', 'derrotas', 'pontos',
+    'gols_feitos', 'gols_sofridos', 'gols_feitos_q', 'gols_sofridos_q',
+    'gols_ht_feitos', 'gols_ht_sofridos', 'gols_st_feitos', 'gols_st_sofridos',
+    'marcou_ht', 'sofreu_ht', 'marcou_st', 'sofreu_st',
+    'jogos_escanteios', 'corners_feitos', 'corners_sofridos',
+    'corners_feitos_q', 'corners_sofridos_q'
+]
+
+
+def _coluna_float(df, coluna):
+    """Coluna como array float64 (NaN se a coluna não existir)"""
+    if coluna in df.columns:
+        return df[coluna].to_numpy(dtype='float64', na_value=np.nan)
+    return np.full(len(df), np.nan)
+
+
+def _tabela_longa_times(df):
+    """
+    Reorganiza os jogos na perspectiva de cada time: uma linha por (jogo, lado).
+    
+    As colunas ficam sempre como 'feitos'/'sofridos' do time da linha, o que
+    permite agregar mandantes e visitantes com o mesmo groupby.
+    """
+    n = len(df)
+    gols_home, gols_away = _coluna_float(df, 'Gols Home'), _coluna_float(df, 'Gols Away')
+    ht_home, ht_away = _coluna_float(df, 'Home Score HT'), _coluna_float(df, 'Away Score HT')
+    corner_home, corner_away = _coluna_float(df, 'Corner Home'), _coluna_float(df, 'Corner Away')
+    codigo = np.sign(gols_home - gols_away)
+    
+    def lados(valor_home, valor_away):
+        return np.concatenate([valor_home, valor_away])
+    
+    return pd.DataFrame({
+        'Time': pd.concat([df['Home'], df['Away']], ignore_index=True),
+        'Mando': np.repeat(['Home', 'Away'], n),
+        'Ano': np.tile(df['Ano'].to_numpy(), 2),
+        'Jogo ID': np.tile(_coluna_float(df, 'Jogo ID'), 2),
+        'Posicao': np.tile(np.arange(n), 2),
+        'Resultado': lados(codigo, -codigo),
+        'Gols Feitos': lados(gols_home, gols_away),
+        'Gols Sofridos': lados(gols_away, gols_home),
+        'HT Feitos': lados(ht_home, ht_away),
+        'HT Sofridos': lados(ht_away, ht_home),
+        'Escanteios Feitos': lados(corner_home, corner_away),
+        'Escanteios Sofridos': lados(corner_away, corner_home),
+    })
+
+
+def _completar_metricas(tabela):
+    """Acrescenta médias e desvios-padrão (populacionais) às somas do cubo"""
+    jogos = tabela['jogos'].replace(0, np.nan)
+    jogos_escanteios = tabela['jogos_escanteios'].replace(0, np.nan)
+    
+    for chave in ['gols_feitos', 'gols_sofridos', 'gols_ht_feitos', 'gols_ht_sofridos',
+                  'gols_st_feitos', 'gols_st_sofridos']:
+        tabela[f'media_{chave}'] = (tabela[chave] / jogos).fillna(0)
+    for chave in ['vitorias', 'empates', 'derrotas']:
+        tabela[f'perc_{chave}'] = (tabela[chave] / jogos * 100).fillna(0)
+    for chave in ['marcou_ht', 'sofreu_ht', 'marcou_st', 'sofreu_st']:
+        tabela[f'pct_{chave}'] = (tabela[chave] / jogos * 100).fillna(0)
+    
+    for chave, base in [('gols_feitos', jogos), ('gols_sofridos', jogos),
+                        ('corners_feitos', jogos_escanteios), ('corners_sofridos', jogos_escanteios)]:
+        media = tabela[chave] / base
+        variancia = (tabela[f'{chave}_q'] / base - media ** 2).clip(lower=0)
+        if chave.startswith('corners'):
+            tabela[f'media_{chave}'] = media.fillna(0)
+        tabela[f'desvio_{chave}'] = np.sqrt(variancia).fillna(0)
+    
+    return tabela
+
+
+def _construir_cubo_times(df):
+    """
+    Agrega todas as métricas por time x mando x temporada em um único groupby.
+    
+    Returns:
+        dict com:
+            'cubo': DataFrame indexado por (Time, Mando, Ano)
+            'totais': {(time, mando): métricas somando todas as temporadas do df}
+    """
+    longa = _tabela_longa_times(df)
+    
+    ht_feitos, ht_sofridos = longa['HT Feitos'], longa['HT Sofridos']
+    st_feitos = longa['Gols Feitos'] - ht_feitos
+    st_sofridos = longa['Gols Sofridos'] - ht_sofridos
+    escanteios_validos = longa['Escanteios Feitos'].notna() & longa['Escanteios Sofridos'].notna()
+    corners_feitos = longa['Escanteios Feitos'].where(escanteios_validos, 0)
+    corners_sofridos = longa['Escanteios Sofridos'].where(escanteios_validos, 0)
+    
+    contagens = pd.DataFrame({
+        'Time': longa['Time'],
+        'Mando': longa['Mando'],
+        'Ano': longa['Ano'],
+        'jogos': 1,
+        'vitorias': longa['Resultado'] == 1,
+        'empates': longa['Resultado'] == 0,
+        'derrotas': longa['Resultado'] == -1,
+        'pontos': np.select([longa['Resultado'] == 1, longa['Resultado'] == 0], [3, 1], 0),
+        'gols_feitos': longa['Gols Feitos'],
+        'gols_sofridos': longa['Gols Sofridos'],
+        'gols_feitos_q': longa['Gols Feitos'] ** 2,
+        'gols_sofridos_q': longa['Gols Sofridos'] ** 2,
+        'gols_ht_feitos': ht_feitos,
+        'gols_ht_sofridos': ht_sofridos,
+        'gols_st_feitos': st_feitos,
+        'gols_st_sofridos': st_sofridos,
+        'marcou_ht': ht_feitos > 0,
+        'sofreu_ht': ht_sofridos > 0,
+        'marcou_st': st_feitos > 0,
+        'sofreu_st': st_sofridos > 0,
+        'jogos_escanteios': escanteios_validos,
+        'corners_feitos': corners_feitos,
+        'corners_sofridos': corners_sofridos,
+        'corners_feitos_q': corners_feitos ** 2,
+        'corners_sofridos_q': corners_sofridos ** 2,
+    })
+    
+    cubo = (contagens.groupby(['Time', 'Mando', 'Ano'], observed=True, sort=True)[COLUNAS_SOMA_CUBO]
+            .sum().astype('int64'))
+    totais = cubo.groupby(level=['Time', 'Mando'], observed=True).sum()
+    
+    return {
+        'cubo': _completar_metricas(cubo),
+        'totais': _completar_metricas(totais).to_dict('index')
+    }
+
+
+def agregado_time(df, team, venue='Home', ano=None):
+    """
+    Consulta O(1) das métricas agregadas de um time.
+    
+    Args:
+        df: DataFrame com os dados dos jogos
+        team: Nome do time
+        venue: 'Home' ou 'Away'
+        ano: Temporada específica ou None para somar todas as temporadas do df
+    
+    Returns:
+        dict com somas, médias, percentuais e desvios, ou None se o time não jogou
+    """
+    artefato = _artefato_do_frame(df, 'cubo_times', _construir_cubo_times)
+    if ano is None:
+        return artefato['totais'].get((team, venue))
+    
+    try:
+        return artefato['cubo'].loc[(team, venue, ano)].to_dict()
+    except KeyError:
+        return None
+
+
+# ============================================================================
+# MOTOR DE FORMA RECENTE (JANELAS MÓVEIS CRONOLÓGICAS POR TIME E MANDO)
+# ============================================================================
+
+# Janelas usadas pelas análises e spans das médias exponenciais pré-calculadas
+JANELAS_FORMA = (3, 5)
+SPANS_FORMA_EWM = (3, 5)
+
+# Métrica do motor -> coluna da tabela longa (perspectiva do time)
+METRICAS_FORMA = {
+    'gols_feitos': 'Gols Feitos',
+    'gols_sofridos': 'Gols Sofridos',
+    'gols_ht_feitos': 'HT Feitos',
+    'gols_ht_sofridos': 'HT Sofridos',
+    'gols_st_feitos': 'ST Feitos',
+    'gols_st_sofridos': 'ST Sofridos',
+    'corners_feitos': 'Escanteios Feitos',
+    'corners_sofridos': 'Escanteios Sofridos',
+    'pontos': 'Pontos',
+    'vitorias': 'Vitoria',
+    'empates': 'Empate',
+    'derrotas': 'Derrota',
+}
+
+
+class MotorForma:
+    """
+    Forma recente de todos os times, em ordem cronológica (Ano, Jogo ID).
+    
+    Os jogos de cada (time, mando) ficam contíguos e ordenados; para cada métrica
+    guardamos a soma acumulada (e a contagem de valores válidos) dentro do grupo.
+    Assim a média dos últimos N jogos, para qualquer N e "até" qualquer jogo, é a
+    diferença de duas linhas: O(1) depois de localizar o jogo de corte.
+    
+    Mandos disponíveis: 'Home', 'Away' e 'Todos' (todos os jogos do time).
+    """
+    
+    def __init__(self, df):
+        longa = _tabela_longa_times(df)
+        longa['ST Feitos'] = longa['Gols Feitos'] - longa['HT Feitos']
+        longa['ST Sofridos'] = longa['Gols Sofridos'] - longa['HT Sofridos']
+        longa['Pontos'] = np.select([longa['Resultado'] == 1, longa['Resultado'] == 0], [3.0, 1.0], 0.0)
+        longa['Vitoria'] = (longa['Resultado'] == 1).astype('float64')
+        longa['Empate'] = (longa['Resultado'] == 0).astype('float64')
+        longa['Derrota'] = (longa['Resultado'] == -1).astype('float64')
+        
+        longa = pd.concat([longa, longa.assign(Mando='Todos')], ignore_index=True)
+        longa['Ordinal'] = longa['Ano'].astype('float64') * 1000 + longa['Jogo ID'].fillna(0)
+        longa = longa.sort_values(['Time', 'Mando', 'Ordinal', 'Posicao'], kind='stable')
+        longa = longa.reset_index(drop=True)
+        
+        self.metricas = list(METRICAS_FORMA)
+        self._coluna = {metrica: i for i, metrica in enumerate(self.metricas)}
+        self.valores = longa[[METRICAS_FORMA[m] for m in self.metricas]].to_numpy(dtype='float64')
+        self.ordinal = longa['Ordinal'].to_numpy()
+        
+        # Somas e contagens acumuladas com uma linha zero no início (acumulado[i] = soma das linhas < i)
+        validos = ~np.isnan(self.valores)
+        zeros = np.zeros((1, len(self.metricas)))
+        self.acumulado = np.vstack([zeros, np.cumsum(np.where(validos, self.valores, 0.0), axis=0)])
+        self.contagem = np.vstack([zeros, np.cumsum(validos, axis=0)])
+        
+        # Faixa [inicio, fim) de cada (time, mando) na tabela ordenada
+        grupos = longa.groupby(['Time', 'Mando'], observed=True, sort=False).indices
+        self.faixas = {chave: (int(linhas[0]), int(linhas[-1]) + 1) for chave, linhas in grupos.items()}
+        
+        # Médias exponenciais dentro de cada grupo, já na ordem cronológica
+        self.ewm = {}
+        agrupado = pd.DataFrame(self.valores, columns=self.metricas).groupby(
+            [longa['Time'], longa['Mando']], observed=True, sort=False)
+        for span in SPANS_FORMA_EWM:
+            self.ewm[span] = self._ewm_agrupado(agrupado, span)
+    
+    def _ewm_agrupado(self, agrupado, span):
+        medias = agrupado.ewm(span=span).mean()
+        return medias.reset_index(level=[0, 1], drop=True).sort_index().to_numpy()
+    
+    def _fim(self, team, venue, antes_de):
+        """Linha final (exclusiva) do recorte: todos os jogos ou só os anteriores a antes_de=(ano, jogo_id)"""
+        faixa = self.faixas.get((team, venue))
+        if faixa is None:
+            return None, None
+        inicio, fim = faixa
+        if antes_de is not None:
+            ano, jogo_id = antes_de
+            fim = inicio + int(np.searchsorted(self.ordinal[inicio:fim], ano * 1000 + jogo_id, side='left'))
+        return inicio, fim
+    
+    def jogos(self, team, venue='Home', antes_de=None):
+        """Quantidade de jogos do time no recorte"""
+        inicio, fim = self._fim(team, venue, antes_de)
+        return 0 if inicio is None else fim - inicio
+    
+    def janela(self, team, venue='Home', n=5, antes_de=None):
+        """
+        Médias e totais dos últimos n jogos do time (ou de todos, se houver menos de n).
+        
+        Returns:
+            dict com 'jogos' (tamanho efetivo da janela), cada métrica (média) e
+            'total_<métrica>' (soma); None se o time não tiver jogos no recorte
+        """
+        inicio, fim = self._fim(team, venue, antes_de)
+        if inicio is None or fim <= inicio:
+            return None
+        
+        corte = max(inicio, fim - n)
+        somas = self.acumulado[fim] - self.acumulado[corte]
+        contagens = self.contagem[fim] - self.contagem[corte]
+        medias = np.divide(somas, contagens, out=np.zeros_like(somas), where=contagens > 0)
+        
+        resultado = {'jogos': fim - corte}
+        for metrica, i in self._coluna.items():
+            resultado[metrica] = float(medias[i])
+            resultado[f'total_{metrica}'] = float(somas[i])
+        return resultado
+    
+    def media_exponencial(self, team, venue='Home', span=5, antes_de=None):
+        """Média exponencial (span em jogos) de cada métrica até o último jogo do recorte"""
+        inicio, fim = self._fim(team, venue, antes_de)
+        if inicio is None or fim <= inicio:
+            return None
+        if span not in self.ewm:
+            grupo = pd.DataFrame(self.valores[inicio:fim], columns=self.metricas)
+            return grupo.ewm(span=span).mean().iloc[-1].to_dict()
+        return dict(zip(self.metricas, self.ewm[span][fim - 1].tolist()))
+    
+    def sequencia(self, team, metricas, venue='Home', n=5, antes_de=None):
+        """
+        Valores das métricas nos últimos n jogos, do mais recente para o mais antigo.
+        
+        Jogos com alguma das métricas ausente são ignorados, assim várias métricas
+        lidas juntas cobrem sempre as mesmas partidas.
+        
+        Returns:
+            array (jogos,) para uma métrica (str) ou (jogos, métricas) para uma lista
+        """
+        unica = isinstance(metricas, str)
+        colunas = [self._coluna[m] for m in ([metricas] if unica else metricas)]
+        inicio, fim = self._fim(team, venue, antes_de)
+        if inicio is None:
+            valores = np.empty((0, len(colunas)))
+        else:
+            valores = self.valores[inicio:fim, colunas][::-1]
+            valores = valores[~np.isnan(valores).any(axis=1)][:n]
+        return valores[:, 0] if unica else valores
+
+
+def motor_forma(df):
+    """Retorna o MotorForma do DataFrame (construído uma única vez por DataFrame)"""
+    return _artefato_do_frame(df, 'motor_forma', MotorForma)
+
+
+# ============================================================================
+# RATINGS ELO (ATUALIZADOS JOGO A JOGO)
+# ============================================================================
+
+ELO_INICIAL = 1500.0
+ELO_K = 20.0
+
+# Vantagem de mando em pontos de Elo (só no rating único; com mandos separados
+# os ratings de casa já incorporam a vantagem)
+ELO_VANTAGEM_MANDO = 65.0
+
+# Fração do rating puxada de volta para a média na virada de temporada
+ELO_REGRESSAO_TEMPORADA = 0.25
+
+
+def multiplicador_saldo_elo(saldo):
+    """Multiplicador de saldo de gols (World Football Elo): 1, 1.5 e (11 + N) / 8 a partir de 3 gols"""
+    saldo = np.abs(np.asarray(saldo, dtype='float64'))
+    return np.select([saldo <= 1, saldo == 2], [1.0, 1.5], (11 + saldo) / 8)
+
+
+def probabilidade_elo(rating_time, rating_adversario, vantagem=0.0):
+    """Pontuação esperada (vitória = 1, empate = 0.5) pela diferença de ratings"""
+    return 1 / (1 + 10 ** ((rating_adversario - rating_time - vantagem) / 400))
+
+
+class MotorElo:
+    """
+    Ratings Elo de todos os times, atualizados em uma passada cronológica (Ano, Jogo ID).
+    
+    Cada jogo processado gera um snapshot com os ratings antes e depois da partida.
+    Jogos novos são acrescentados com adicionar_jogos; cada partida é identificada
+    por (Ano, Jogo ID) e só entra uma vez. Se todas as partidas novas vêm depois da
+    última processada, só elas são calculadas; se alguma é anterior (jogo adiado que
+    recebeu placar depois), a passada é refeita do início com todas as partidas, de
+    modo que alimentar o motor em partes dá os mesmos ratings que uma passada única.
+    
+    Jogos sem 'Jogo ID' seguem a ordem das linhas, no fim da sua temporada, e são
+    identificados por (Ano, Home, Away, ocorrência); no snapshot o ID fica nulo.
+    
+    Com separar_mando=True cada time tem um rating como mandante e outro como
+    visitante; caso contrário, um rating único com vantagem fixa de mando.
+    """
+    
+    def __init__(self, separar_mando=False, k=ELO_K, vantagem_mando=ELO_VANTAGEM_MANDO,
+                 regressao_temporada=ELO_REGRESSAO_TEMPORADA):
+        self.separar_mando = separar_mando
+        self.k = k
+        self.vantagem_mando = 0.0 if separar_mando else vantagem_mando
+        self.regressao_temporada = regressao_temporada
+        self._jogos = []
+        self._chaves = set()
+        self._reiniciar()
+    
+    def _reiniciar(self):
+        self.ratings = {}
+        self.ano_atual = None
+        self._snapshots = []
+    
+    def _chave(self, time, mando):
+        return (time, mando if self.separar_mando else 'Geral')
+    
+    def rating(self, time, mando='Home'):
+        """Rating atual do time (no mando pedido, se os mandos forem separados)"""
+        return self.ratings.get(self._chave(time, mando), ELO_INICIAL)
+    
+    def adicionar_jogos(self, df):
+        """Processa os jogos de df ainda não vistos (ver a regra de atraso na classe). Retorna o próprio motor."""
+        anos = _coluna_float(df, 'Ano')
+        jogo_ids = _coluna_float(df, 'Jogo ID')
+        homes = df['Home'].to_numpy()
+        aways = df['Away'].to_numpy()
+        gols_home = _coluna_float(df, 'Gols Home')
+        gols_away = _coluna_float(df, 'Gols Away')
+        validos = ~(np.isnan(anos) | np.isnan(gols_home) | np.isnan(gols_away))
+        
+        novos = []
+        ocorrencias = {}
+        for i in np.flatnonzero(validos):
+            ano = int(anos[i])
+            if np.isnan(jogo_ids[i]):
+                base = (ano, homes[i], aways[i])
+                ocorrencias[base] = ocorrencias.get(base, 0) + 1
+                chave, jogo_id = base + (ocorrencias[base],), None
+            else:
+                jogo_id = int(jogo_ids[i])
+                chave = (ano, jogo_id)
+            if chave in self._chaves:
+                continue
+            self._chaves.add(chave)
+            ordem = (ano, jogo_id is None, jogo_id or 0, len(self._jogos) + len(novos))
+            novos.append((ordem, ano, jogo_id, homes[i], aways[i], gols_home[i], gols_away[i]))
+        
+        if not novos:
+            return self
+        novos.sort(key=lambda jogo: jogo[0])
+        if self._jogos and novos[0][0] < self._jogos[-1][0]:
+            self._jogos = sorted(self._jogos + novos, key=lambda jogo: jogo[0])
+            self._reiniciar()
+            self._processar(self._jogos)
+        else:
+            self._jogos.extend(novos)
+            self._processar(novos)
+        return self
+    
+    def _processar(self, jogos):
+        """Atualiza os ratings com os jogos (já em ordem cronológica), registrando os snapshots"""
+        _, anos, jogo_ids, homes, aways, gols_home, gols_away = zip(*jogos)
+        saldos = np.array(gols_home) - np.array(gols_away)
+        resultados = np.sign(saldos) / 2 + 0.5
+        multiplicadores = multiplicador_saldo_elo(saldos)
+        
+        for ano, jogo_id, home, away, resultado, multiplicador in zip(
+                anos, jogo_ids, homes, aways, resultados, multiplicadores):
+            if self.ano_atual is not None and ano > self.ano_atual:
+                self._regredir_para_media()
+            self.ano_atual = ano
+            
+            chave_home, chave_away = self._chave(home, 'Home'), self._chave(away, 'Away')
+            antes_home = self.ratings.get(chave_home, ELO_INICIAL)
+            antes_away = self.ratings.get(chave_away, ELO_INICIAL)
+            esperado = probabilidade_elo(antes_home, antes_away, self.vantagem_mando)
+            variacao = self.k * multiplicador * (resultado - esperado)
+            self.ratings[chave_home] = antes_home + variacao
+            self.ratings[chave_away] = antes_away - variacao
+            
+            self._snapshots.append((ano, jogo_id, home, away, antes_home, antes_away,
+                                    esperado, antes_home + variacao, antes_away - variacao))
+    
+    def _regredir_para_media(self):
+        """Aproxima todos os ratings da média inicial na virada de temporada"""
+        for chave, valor in self.ratings.items():
+            self.ratings[chave] = ELO_INICIAL + (1 - self.regressao_temporada) * (valor - ELO_INICIAL)
+    
+    def snapshots(self):
+        """DataFrame com os ratings antes/depois de cada jogo processado"""
+        snapshots = pd.DataFrame(self._snapshots, columns=[
+            'Ano', 'Jogo ID', 'Home', 'Away', 'Elo Home Antes', 'Elo Away Antes',
+            'Prob Esperada Home', 'Elo Home Depois', 'Elo Away Depois'
+        ])
+        snapshots['Jogo ID'] = snapshots['Jogo ID'].astype('Int64')
+        return snapshots
+    
+    def historico(self, time):
+        """Rating do time depois de cada um dos seus jogos: Ano, Jogo ID, Jogo Nº (na temporada), Mando, Rating"""
+        snapshots = self.snapshots()
+        como_home = snapshots[snapshots['Home'] == time].assign(Mando='Home', Rating=lambda t: t['Elo Home Depois'])
+        como_away = snapshots[snapshots['Away'] == time].assign(Mando='Away', Rating=lambda t: t['Elo Away Depois'])
+        historico = pd.concat([como_home, como_away]).sort_values(['Ano', 'Jogo ID'], kind='stable')
+        historico['Jogo Nº'] = historico.groupby('Ano').cumcount() + 1
+        return historico[['Ano', 'Jogo ID', 'Jogo Nº', 'Mando', 'Rating']].reset_index(drop=True)
+    
+    def probabilidade(self, team_home, team_away):
+        """Pontuação esperada do mandante no confronto, pelos ratings atuais"""
+        return float(probabilidade_elo(self.rating(team_home, 'Home'), self.rating(team_away, 'Away'),
+                                       self.vantagem_mando))
+
+
+def motor_elo(df, separar_mando=False):
+    """Retorna o MotorElo do DataFrame (uma passada por DataFrame e modo de mando)"""
+    nome = 'motor_elo_mando' if separar_mando else 'motor_elo'
+    return _artefato_do_frame(df, nome, lambda frame: MotorElo(separar_mando).adicionar_jogos(frame))
+
+
+
+
+# ============================================================================
+# ÍNDICE DE CONFRONTOS DIRETOS (PAR NÃO ORDENADO -> JOGOS E TOTAIS)
+# ============================================================================
+
+def _construir_indice_confrontos(df):
+    """
+    Agrupa os jogos por par de times (sem considerar o mando) em uma única passada.
+    
+    Cada par é guardado em ordem alfabética (a, b) com as posições dos jogos e os
+    totais já agregados na perspectiva de 'a': vitórias, empates, gols e médias de odds.
+    """
+    home = df['Home'].astype(str).to_numpy()
+    away = df['Away'].astype(str).to_numpy()
+    a_em_casa = home <= away
+    
+    gols_home, gols_away = _coluna_float(df, 'Gols Home'), _coluna_float(df, 'Gols Away')
+    gols_a = np.where(a_em_casa, gols_home, gols_away)
+    gols_b = np.where(a_em_casa, gols_away, gols_home)
+    
+    odds = np.column_stack([_coluna_float(df, col) for col in ['odd Home', 'odd Draw', 'odd Away']])
+    odds_validas = ~np.isnan(odds).any(axis=1)
+    odds_zeradas = np.where(odds_validas[:, None], odds, 0.0)
+    
+    partes = pd.DataFrame({
+        'a': np.where(a_em_casa, home, away),
+        'b': np.where(a_em_casa, away, home),
+        'vitorias_a': gols_a > gols_b,
+        'vitorias_b': gols_b > gols_a,
+        'empates': gols_a == gols_b,
+        'gols_a': gols_a,
+        'gols_b': gols_b,
+        'jogos_com_odds': odds_validas,
+        'soma_odd_home': odds_zeradas[:, 0],
+        'soma_odd_draw': odds_zeradas[:, 1],
+        'soma_odd_away': odds_zeradas[:, 2],
+    })
+    
+    agrupado = partes.groupby(['a', 'b'], sort=False)
+    totais = agrupado.sum()
+    posicoes = agrupado.indices
+    
+    indice = {}
+    for (a, b), linha in zip(totais.index, totais.itertuples(index=False)):
+        indice[(a, b)] = {'posicoes': np.asarray(posicoes[(a, b)], dtype=np.intp), **linha._asdict()}
+    return indice
+
+
+def confronto_direto(df, team1, team2):
+    """
+    Consulta O(1) dos confrontos entre dois times, na perspectiva de team1.
+    
+    Returns:
+        dict com posicoes (linhas do df, em ordem), jogos, vitorias_team1,
+        vitorias_team2, empates, gols_team1, gols_team2, jogos_com_odds e as
+        médias de odd Home/Draw/Away (None sem odds)
+    """
+    indice = _artefato_do_frame(df, 'indice_confrontos', _construir_indice_confrontos)
+    team1, team2 = str(team1), str(team2)
+    invertido = team1 > team2
+    par = indice.get((team2, team1) if invertido else (team1, team2))
+    
+    if par is None:
+        return {
+            'posicoes': np.empty(0, dtype=np.intp), 'jogos': 0,
+            'vitorias_team1': 0, 'vitorias_team2': 0, 'empates': 0,
+            'gols_team1': 0, 'gols_team2': 0, 'jogos_com_odds': 0,
+            'media_odd_home': None, 'media_odd_draw': None, 'media_odd_away': None
+        }
+    
+    lado1, lado2 = ('b', 'a') if invertido else ('a', 'b')
+    com_odds = int(par['jogos_com_odds'])
+    return {
+        'posicoes': par['posicoes'],
+        'jogos': len(par['posicoes']),
+        'vitorias_team1': int(par[f'vitorias_{lado1}']),
+        'vitorias_team2': int(par[f'vitorias_{lado2}']),
+        'empates': int(par['empates']),
+        'gols_team1': int(par[f'gols_{lado1}']),
+        'gols_team2': int(par[f'gols_{lado2}']),
+        'jogos_com_odds': com_odds,
+        'media_odd_home': par['soma_odd_home'] / com_odds if com_odds else None,
+        'media_odd_draw': par['soma_odd_draw'] / com_odds if com_odds else None,
+        'media_odd_away': par['soma_odd_away'] / com_odds if com_odds else None,
+    }
+
+
+# ============================================================================
+# CLASSIFICAÇÃO REAL POR RODADA (SOMAS ACUMULADAS POR TEMPORADA)
+# ============================================================================
+
+def _rodadas_da_temporada(temporada, n_times):
+    """Rodada (0-based) de cada jogo: 'Jogo ID' em blocos de n_times/2 jogos, ou a ordem das linhas"""
+    jogos_por_rodada = max(1, n_times // 2)
+    if 'Jogo ID' in temporada.columns and temporada['Jogo ID'].notna().all():
+        return (temporada['Jogo ID'].to_numpy(dtype='int64') - 1) // jogos_por_rodada
+    return np.arange(len(temporada)) // jogos_por_rodada
+
+
+def _classificacao_temporada(temporada):
+    """
+    Tabela de classificação após cada rodada de uma temporada.
+    
+    Pontos, jogos, vitórias, saldo e gols pró são somados por (rodada, time) com
+    bincount e acumulados com cumsum. A posição usa os critérios de desempate
+    do Brasileirão: pontos, vitórias, saldo de gols, gols pró (e nome, por último).
+    
+    Returns:
+        dict com 'times' (ordem alfabética), 'rodadas' (1..R) e matrizes (R, T):
+        'pontos', 'jogos', 'vitorias', 'empates', 'derrotas', 'gols_pro',
+        'gols_contra', 'saldo' e 'posicao'
+    """
+    home = temporada['Home'].astype(str).to_numpy()
+    away = temporada['Away'].astype(str).to_numpy()
+    times = sorted(set(home) | set(away))
+    n_times = len(times)
+    indice_times = pd.Index(times)
+    
+    rodada = _rodadas_da_temporada(temporada, n_times)
+    n_rodadas = int(rodada.max()) + 1 if len(rodada) else 0
+    
+    gols_home = temporada['Gols Home'].to_numpy(dtype='float64')
+    gols_away = temporada['Gols Away'].to_numpy(dtype='float64')
+    codigo = np.sign(gols_home - gols_away)
+    
+    # Mandantes e visitantes empilhados, sempre na perspectiva do time
+    celula = np.concatenate([
+        rodada * n_times + indice_times.get_indexer(home),
+        rodada * n_times + indice_times.get_indexer(away),
+    ])
+    resultado = np.concatenate([codigo, -codigo])
+    
+    def acumular(pesos):
+        por_rodada = np.bincount(celula, weights=pesos, minlength=n_rodadas * n_times)
+        return np.cumsum(por_rodada.reshape(n_rodadas, n_times), axis=0)
+    
+    tabela = {
+        'times': times,
+        'rodadas': np.arange(1, n_rodadas + 1),
+        'jogos': acumular(np.ones(len(resultado))),
+        'vitorias': acumular((resultado == 1).astype('float64')),
+        'empates': acumular((resultado == 0).astype('float64')),
+        'derrotas': acumular((resultado == -1).astype('float64')),
+        'gols_pro': acumular(np.concatenate([gols_home, gols_away])),
+        'gols_contra': acumular(np.concatenate([gols_away, gols_home])),
+    }
+    tabela['pontos'] = 3 * tabela['vitorias'] + tabela['empates']
+    tabela['saldo'] = tabela['gols_pro'] - tabela['gols_contra']
+    
+    # Ordenação de todas as rodadas de uma vez (lexsort: última chave é a principal)
+    nome = np.broadcast_to(np.arange(n_times), (n_rodadas, n_times))
+    ordem = np.lexsort((nome, -tabela['gols_pro'], -tabela['saldo'],
+                        -tabela['vitorias'], -tabela['pontos']), axis=-1)
+    posicao = np.empty((n_rodadas, n_times), dtype=np.int64)
+    np.put_along_axis(posicao, ordem, np.arange(1, n_times + 1)[None, :].repeat(n_rodadas, axis=0), axis=-1)
+    tabela['posicao'] = posicao
+    
+    return tabela
+
+
+def _construir_classificacoes(df):
+    """Classificação por rodada de cada temporada presente no df"""
+    if df.empty or 'Ano' not in df.columns:
+        return {}
+    return {int(ano): _classificacao_temporada(temporada)
+            for ano, temporada in df.groupby('Ano', sort=True)}
+
+
+def classificacoes_por_temporada(df):
+    """Classificações por rodada de todas as temporadas do df (construídas uma única vez por DataFrame)"""
+    return _artefato_do_frame(df, 'classificacoes', _construir_classificacoes)
+
+
+def tabela_classificacao(df, ano, rodada=None):
+    """
+    Tabela de classificação de uma temporada após a rodada informada (padrão: última).
+    
+    Returns:
+        DataFrame ordenado pela posição, ou DataFrame vazio se a temporada não existir
+    """
+    tabela = classificacoes_por_temporada(df).get(int(ano))
+    if tabela is None or len(tabela['rodadas']) == 0:
         return pd.DataFrame()
+    
+    linha = (len(tabela['rodadas']) if rodada is None else min(int(rodada), len(tabela['rodadas']))) - 1
+    resultado = pd.DataFrame({
+        'Posição': tabela['posicao'][linha],
+        'Time': tabela['times'],
+        'Pontos': tabela['pontos'][linha].astype(int),
+        'Jogos': tabela['jogos'][linha].astype(int),
+        'Vitórias': tabela['vitorias'][linha].astype(int),
+        'Empates': tabela['empates'][linha].astype(int),
+        'Derrotas': tabela['derrotas'][linha].astype(int),
+        'Gols Pró': tabela['gols_pro'][linha].astype(int),
+        'Gols Contra': tabela['gols_contra'][linha].astype(int),
+        'Saldo': tabela['saldo'][linha].astype(int),
+    })
+    return resultado.sort_values('Posição').reset_index(drop=True)
+
 
 def calculate_team_stats(df, team_name, as_home=True):
     """
@@ -350,22 +1585,10 @@ def calculate_team_stats(df, team_name, as_home=True):
         dict: Dicionário com as estatísticas do time
     """
     try:
-        if as_home:
-            # Jogos como mandante
-            team_games = df[df['Home'] == team_name].copy()
-            gols_feitos_col = 'Gols Home'
-            gols_sofridos_col = 'Gols Away'
-            escanteios_feitos_col = ' Home'
-            escanteios_sofridos_col = ' Away'
-        else:
-            # Jogos como visitante
-            team_games = df[df['Away'] == team_name].copy()
-            gols_feitos_col = 'Gols Away'
-            gols_sofridos_col = 'Gols Home'
-            escanteios_feitos_col = 'Corner Away'
-            escanteios_sofridos_col = 'Corner Home'
-        
-        if team_games.empty:
+        # Consulta direta ao cubo de agregados (mandante ou visitante)
+        agregado = agregado_time(df, team_name, 'Home' if as_home else 'Away')
+        
+        if agregado is None:
             return {
                 'jogos': 0,
                 'vitorias': 0,
@@ -381,25 +1604,18 @@ def calculate_team_stats(df, team_name, as_home=True):
                 'media_escanteios_sofridos': 0
             }
         
-        # Calcula resultados
-        if as_home:
-            vitorias = len(team_games[team_games['Resultado Home'] == 'Vitória'])
-            empates = len(team_games[team_games['Resultado Home'] == 'Empate'])
-            derrotas = len(team_games[team_games['Resultado Home'] == 'Derrota'])
-        else:
-            vitorias = len(team_games[team_games['Resultado Home'] == 'Derrota'])  # Vitória do visitante
-            empates = len(team_games[team_games['Resultado Home'] == 'Empate'])
-            derrotas = len(team_games[team_games['Resultado Home'] == 'Vitória'])  # Derrota do visitante
+        # Resultados, gols e escanteios já somados na perspectiva do time
+        vitorias = agregado['vitorias']
+        empates = agregado['empates']
+        derrotas = agregado['derrotas']
         
-        # Calcula gols
-        gols_feitos = team_games[gols_feitos_col].sum() if gols_feitos_col in team_games.columns else 0
-        gols_sofridos = team_games[gols_sofridos_col].sum() if gols_sofridos_col in team_games.columns else 0
+        gols_feitos = agregado['gols_feitos']
+        gols_sofridos = agregado['gols_sofridos']
         
-        # Calcula escanteios
-        escanteios_feitos = team_games[escanteios_feitos_col].sum() if escanteios_feitos_col in team_games.columns else 0
-        escanteios_sofridos = team_games[escanteios_sofridos_col].sum() if escanteios_sofridos_col in team_games.columns else 0
+        escanteios_feitos = agregado['corners_feitos']
+        escanteios_sofridos = agregado['corners_sofridos']
         
-        jogos = len(team_games)
+        jogos = agregado['jogos']
         
         return {
             'jogos': jogos,
@@ -416,35 +1632,523 @@ def calculate_team_stats(df, team_name, as_home=True):
             'media_escanteios_sofridos': escanteios_sofridos / jogos if jogos > 0 else 0
         }
         
-    except Exception as e:
-        st.error(f"Erro ao calcular estatísticas do time {team_name}: {str(e)}")
-        return {
-            'jogos': 0,
-            'vitorias': 0,
-            'empates': 0,
-            'derrotas': 0,
-            'gols_feitos': 0,
-            'gols_sofridos': 0,
-            'media_gols_feitos': 0,
-            'media_gols_sofridos': 0,
-            'escanteios_feitos': 0,
-            'escanteios_sofridos': 0,
-            'media_escanteios_feitos': 0,
-            'media_escanteios_sofridos': 0
-        }
+    except Exception as e:
+        st.error(f"Erro ao calcular estatísticas do time {team_name}: {str(e)}")
+        return {
+            'jogos': 0,
+            'vitorias': 0,
+            'empates': 0,
+            'derrotas': 0,
+            'gols_feitos': 0,
+            'gols_sofridos': 0,
+            'media_gols_feitos': 0,
+            'media_gols_sofridos': 0,
+            'escanteios_feitos': 0,
+            'escanteios_sofridos': 0,
+            'media_escanteios_feitos': 0,
+            'media_escanteios_sofridos': 0
+        }
+
+def calculate_implicit_probabilities(home_odd, draw_odd, away_odd):
+    """Calcula probabilidades implícitas das odds"""
+    try:
+        if home_odd <= 0 or draw_odd <= 0 or away_odd <= 0:
+            return 0, 0, 0
+        home_prob = 1 / home_odd * 100
+        draw_prob = 1 / draw_odd * 100
+        away_prob = 1 / away_odd * 100
+        return home_prob, draw_prob, away_prob
+    except Exception as e:
+        st.error(f"Erro no cálculo de probabilidades: {str(e)}")
+        return 0, 0, 0
+
+# ============================================================================
+# MATRIZ DE PLACARES (POISSON VETORIZADO, EM LOTE)
+# ============================================================================
+
+MAX_GOLS_MATRIZ = 6
+
+
+def matriz_placar(lambda_home, lambda_away, max_gols=MAX_GOLS_MATRIZ):
+    """
+    Probabilidade de cada placar (0..max_gols x 0..max_gols) com Poisson independente.
+    
+    Uma chamada de pmf por lado e um produto externo. Aceita escalares ou arrays
+    de lambdas (mesmo formato ou broadcast) para pontuar vários jogos de uma vez.
+    
+    Returns:
+        (matriz, massa_cauda): matriz [..., gols_home, gols_away] e a probabilidade
+        dos placares acima de max_gols, que ficaram de fora da matriz
+    """
+    gols = np.arange(max_gols + 1)
+    pmf_home = poisson.pmf(gols, np.asarray(lambda_home, dtype='float64')[..., None])
+    pmf_away = poisson.pmf(gols, np.asarray(lambda_away, dtype='float64')[..., None])
+    matriz = pmf_home[..., :, None] * pmf_away[..., None, :]
+    return matriz, 1.0 - matriz.sum(axis=(-2, -1))
+
+
+def placares_mais_provaveis(matriz, n=None):
+    """Placares ((gols_home, gols_away), prob) em ordem decrescente; empates na ordem da matriz"""
+    ordem = np.argsort(-matriz.ravel(), kind='stable')[:n]
+    linhas, colunas = np.unravel_index(ordem, matriz.shape)
+    return [((int(h), int(a)), float(matriz[h, a])) for h, a in zip(linhas, colunas)]
+
+
+# Linhas de handicap asiático do mandante (inteiras, meias e quartos)
+LINHAS_HANDICAP_ASIATICO = np.arange(-3.0, 3.01, 0.25)
+
+
+def odd_justa(probabilidade):
+    """Odd sem margem (1/p); infinita quando a probabilidade é zero"""
+    probabilidade = np.asarray(probabilidade, dtype='float64')
+    with np.errstate(divide='ignore'):
+        return np.where(probabilidade > 0, 1 / probabilidade, np.inf)
+
+
+def _tabela_mercado(selecoes, probabilidades):
+    """DataFrame padrão de um mercado: Seleção, Probabilidade e Odd Justa"""
+    probabilidades = np.asarray(probabilidades, dtype='float64')
+    return pd.DataFrame({'Seleção': selecoes, 'Probabilidade': probabilidades,
+                         'Odd Justa': odd_justa(probabilidades)})
+
+
+def _linhas_over_under(distribuicao, rotulo=""):
+    """Over/Under em todas as linhas .5 a partir da distribuição de um total (índice = gols)"""
+    acumulada = np.cumsum(distribuicao)
+    linhas = np.arange(len(distribuicao) - 1) + 0.5
+    under = acumulada[:-1]
+    selecoes = [f"{lado} {rotulo}{linha:g}" for linha in linhas for lado in ('Over', 'Under')]
+    return _tabela_mercado(selecoes, np.column_stack([1 - under, under]).ravel())
+
+
+def _handicap_asiatico(prob_margem, margens, linhas=LINHAS_HANDICAP_ASIATICO):
+    """
+    Handicap asiático do mandante e do visitante nas `linhas` informadas.
+    
+    Linhas de quarto dividem a aposta nas duas linhas vizinhas; a odd justa zera o
+    valor esperado considerando devoluções: odd = 1 + P(perda) / P(vitória).
+    """
+    def vitoria_perda(linha):
+        resultado = margens + linha
+        return prob_margem[resultado > 0].sum(), prob_margem[resultado < 0].sum()
+    
+    registros = []
+    for linha in linhas:
+        partes = [linha] if (linha * 2) % 1 == 0 else [linha - 0.25, linha + 0.25]
+        vitorias, perdas = zip(*(vitoria_perda(parte) for parte in partes))
+        vitoria, perda = np.mean(vitorias), np.mean(perdas)
+        devolucao = 1 - vitoria - perda
+        registros.append({
+            'Linha': linha,
+            'Vitória Mandante': vitoria,
+            'Devolução': devolucao,
+            'Vitória Visitante': perda,
+            'Odd Justa Mandante': 1 + perda / vitoria if vitoria > 0 else np.inf,
+            'Odd Justa Visitante': 1 + vitoria / perda if perda > 0 else np.inf,
+        })
+    return pd.DataFrame(registros)
+
+
+def precificar_mercados(matriz):
+    """
+    Deriva os principais mercados de uma única matriz de placares (sem recalculá-la).
+    
+    A matriz truncada é renormalizada para somar 1. Cada mercado vem com a
+    probabilidade e a odd justa (sem margem) de cada seleção.
+    
+    Returns:
+        dict mercado -> DataFrame: '1X2', 'Dupla Chance', 'Ambas Marcam',
+        'Total de Gols', 'Handicap Asiático', 'Placar Exato', 'Margem de Vitória',
+        'Total do Mandante' e 'Total do Visitante'
+    """
+    matriz = np.asarray(matriz, dtype='float64')
+    matriz = matriz / matriz.sum()
+    gols_home, gols_away = np.indices(matriz.shape)
+    
+    # Distribuições derivadas: margem (home - away), total de gols e gols de cada lado
+    deslocamento = matriz.shape[1] - 1
+    prob_margem = np.bincount((gols_home - gols_away + deslocamento).ravel(), weights=matriz.ravel())
+    margens = np.arange(len(prob_margem)) - deslocamento
+    prob_total = np.bincount((gols_home + gols_away).ravel(), weights=matriz.ravel())
+    
+    casa, empate, fora = prob_margem[margens > 0].sum(), prob_margem[margens == 0].sum(), prob_margem[margens < 0].sum()
+    ambas = matriz[1:, 1:].sum()
+    
+    def margem_de(minimo, maximo=None, lado=1):
+        selecionadas = (lado * margens >= minimo) & (True if maximo is None else lado * margens <= maximo)
+        return prob_margem[selecionadas].sum()
+    
+    ordem_placares = placares_mais_provaveis(matriz)
+    
+    return {
+        '1X2': _tabela_mercado(['Mandante', 'Empate', 'Visitante'], [casa, empate, fora]),
+        'Dupla Chance': _tabela_mercado(['1X', 'X2', '12'], [casa + empate, empate + fora, casa + fora]),
+        'Ambas Marcam': _tabela_mercado(['Sim', 'Não'], [ambas, 1 - ambas]),
+        'Total de Gols': _linhas_over_under(prob_total),
+        'Handicap Asiático': _handicap_asiatico(prob_margem, margens),
+        'Placar Exato': _tabela_mercado([f"{h} x {a}" for (h, a), _ in ordem_placares],
+                                        [prob for _, prob in ordem_placares]),
+        'Margem de Vitória': _tabela_mercado(
+            ['Mandante por 1', 'Mandante por 2', 'Mandante por 3+', 'Empate',
+             'Visitante por 1', 'Visitante por 2', 'Visitante por 3+'],
+            [margem_de(1, 1), margem_de(2, 2), margem_de(3), empate,
+             margem_de(1, 1, -1), margem_de(2, 2, -1), margem_de(3, lado=-1)]
+        ),
+        'Total do Mandante': _linhas_over_under(matriz.sum(axis=1)),
+        'Total do Visitante': _linhas_over_under(matriz.sum(axis=0)),
+    }
+
+
+def display_price_sheet(mercados, team_home, team_away):
+    """Folha de preços: uma aba por mercado, com probabilidades e odds justas"""
+    formato = {'Probabilidade': '{:.1%}', 'Odd Justa': '{:.2f}'}
+    abas = st.tabs(list(mercados))
+    for aba, (nome, tabela) in zip(abas, mercados.items()):
+        with aba:
+            if nome == 'Handicap Asiático':
+                st.caption(f"Linha aplicada ao mandante ({team_home}); o visitante ({team_away}) recebe a linha oposta.")
+                st.dataframe(tabela.style.format({
+                    'Linha': '{:+.2f}', 'Vitória Mandante': '{:.1%}', 'Devolução': '{:.1%}',
+                    'Vitória Visitante': '{:.1%}', 'Odd Justa Mandante': '{:.2f}', 'Odd Justa Visitante': '{:.2f}'
+                }), use_container_width=True, hide_index=True)
+            else:
+                st.dataframe(tabela.style.format(formato), use_container_width=True, hide_index=True)
+
+
+# ===================================================================
+# MODELO DIXON-COLES (FORÇAS DE ATAQUE/DEFESA AJUSTADAS)
+# ===================================================================
+
+# Meia-vida do peso temporal, em rodadas (um turno e meio de campeonato)
+MEIA_VIDA_DIXON_COLES = 57
+
+# Limites do parâmetro de correção de placares baixos (mantêm tau positivo)
+LIMITES_RHO_DIXON_COLES = (-0.2, 0.2)
+
+# Penalidade que fixa a soma de ataques e defesas em zero (identificabilidade)
+PENALIDADE_SOMA_DIXON_COLES = 1.0
+
+# Opções do seletor de modelo na predição de placar
+MODELO_PREDICAO_MEDIAS = "Médias ajustadas (Poisson)"
+MODELO_PREDICAO_DIXON_COLES = "Dixon-Coles (ataque/defesa ajustados)"
+
+
+def _tau_dixon_coles(gols_home, gols_away, lambda_home, lambda_away, rho):
+    """
+    Correção de Dixon-Coles para 0x0, 0x1, 1x0 e 1x1 (vetorizada).
+    
+    Returns:
+        tuple: (tau, dlog_tau/dλ_home, dlog_tau/dλ_away, dlog_tau/dρ)
+    """
+    tau = np.ones_like(lambda_home)
+    d_home, d_away, d_rho = np.zeros_like(tau), np.zeros_like(tau), np.zeros_like(tau)
+    
+    zero_zero = (gols_home == 0) & (gols_away == 0)
+    zero_um = (gols_home == 0) & (gols_away == 1)
+    um_zero = (gols_home == 1) & (gols_away == 0)
+    um_um = (gols_home == 1) & (gols_away == 1)
+    
+    tau[zero_zero] = 1 - lambda_home[zero_zero] * lambda_away[zero_zero] * rho
+    tau[zero_um] = 1 + lambda_home[zero_um] * rho
+    tau[um_zero] = 1 + lambda_away[um_zero] * rho
+    tau[um_um] = 1 - rho
+    tau = np.maximum(tau, 1e-10)
+    
+    d_home[zero_zero] = -lambda_away[zero_zero] * rho / tau[zero_zero]
+    d_away[zero_zero] = -lambda_home[zero_zero] * rho / tau[zero_zero]
+    d_rho[zero_zero] = -lambda_home[zero_zero] * lambda_away[zero_zero] / tau[zero_zero]
+    d_home[zero_um] = rho / tau[zero_um]
+    d_rho[zero_um] = lambda_home[zero_um] / tau[zero_um]
+    d_away[um_zero] = rho / tau[um_zero]
+    d_rho[um_zero] = lambda_away[um_zero] / tau[um_zero]
+    d_rho[um_um] = -1 / tau[um_um]
+    return tau, d_home, d_away, d_rho
+
+
+def _pesos_temporais(df, meia_vida):
+    """Peso exp(-ξ·idade) de cada jogo, com a idade em rodadas contada a partir do jogo mais recente"""
+    ordinal = _coluna_float(df, 'Ano') * 1000 + np.nan_to_num(_coluna_float(df, 'Jogo ID'))
+    idade_jogos = len(df) - 1 - pd.Series(ordinal).rank(method='max').to_numpy() + 1
+    times_por_temporada = pd.concat([df[['Ano', 'Home']].set_axis(['Ano', 'Time'], axis=1),
+                                     df[['Ano', 'Away']].set_axis(['Ano', 'Time'], axis=1)])
+    jogos_por_rodada = max(1.0, times_por_temporada.groupby('Ano')['Time'].nunique().mean() / 2)
+    if not meia_vida:
+        return np.ones(len(df))
+    return np.exp(-np.log(2) / meia_vida * idade_jogos / jogos_por_rodada)
+
+
+class ModeloDixonColes:
+    """
+    Modelo de Dixon-Coles ajustado por máxima verossimilhança ponderada no tempo.
+    
+    log λ_mandante = intercepto + mando + ataque[mandante] + defesa[visitante]
+    log λ_visitante = intercepto + ataque[visitante] + defesa[mandante]
+    
+    `defesa` alto significa defesa fraca (o adversário marca mais). Depois do
+    ajuste, os λ de qualquer confronto são uma consulta O(1).
+    """
+    
+    def __init__(self, df, meia_vida=MEIA_VIDA_DIXON_COLES):
+        validos = df[['Gols Home', 'Gols Away']].notna().all(axis=1).to_numpy()
+        jogos = df[validos]
+        codigos_home, codigos_away, nomes = _codigos_lados(jogos)
+        
+        self.times = {nome: i for i, nome in enumerate(nomes)}
+        self.jogos = len(jogos)
+        self.meia_vida = meia_vida
+        n_times = len(nomes)
+        
+        self.ataque = np.zeros(n_times)
+        self.defesa = np.zeros(n_times)
+        self.intercepto, self.mando, self.rho = 0.0, 0.0, 0.0
+        self.convergiu = False
+        self.log_verossimilhanca = np.nan
+        if self.jogos == 0:
+            return
+        
+        gols_home = _coluna_float(jogos, 'Gols Home')
+        gols_away = _coluna_float(jogos, 'Gols Away')
+        pesos = _pesos_temporais(jogos, meia_vida)
+        
+        def objetivo(parametros):
+            ataque, defesa = parametros[:n_times], parametros[n_times:2 * n_times]
+            intercepto, mando, rho = parametros[2 * n_times:]
+            log_home = intercepto + mando + ataque[codigos_home] + defesa[codigos_away]
+            log_away = intercepto + ataque[codigos_away] + defesa[codigos_home]
+            lambda_home, lambda_away = np.exp(log_home), np.exp(log_away)
+            tau, d_home, d_away, d_rho = _tau_dixon_coles(gols_home, gols_away, lambda_home, lambda_away, rho)
+            
+            # Log-verossimilhança (sem os termos constantes log(k!))
+            log_vero = np.sum(pesos * (np.log(tau) + gols_home * log_home - lambda_home
+                                       + gols_away * log_away - lambda_away))
+            
+            # Gradiente em relação a log λ de cada lado
+            g_home = pesos * (gols_home - lambda_home + lambda_home * d_home)
+            g_away = pesos * (gols_away - lambda_away + lambda_away * d_away)
+            grad_ataque = np.bincount(codigos_home, g_home, n_times) + np.bincount(codigos_away, g_away, n_times)
+            grad_defesa = np.bincount(codigos_away, g_home, n_times) + np.bincount(codigos_home, g_away, n_times)
+            
+            soma_ataque, soma_defesa = ataque.sum(), defesa.sum()
+            penalidade = PENALIDADE_SOMA_DIXON_COLES * (soma_ataque ** 2 + soma_defesa ** 2)
+            gradiente = np.concatenate([
+                grad_ataque - 2 * PENALIDADE_SOMA_DIXON_COLES * soma_ataque,
+                grad_defesa - 2 * PENALIDADE_SOMA_DIXON_COLES * soma_defesa,
+                [g_home.sum() + g_away.sum(), g_home.sum(), np.sum(pesos * d_rho)]
+            ])
+            return -(log_vero - penalidade), -gradiente
+        
+        inicial = np.zeros(2 * n_times + 3)
+        inicial[2 * n_times] = np.log(max(np.average(gols_away, weights=pesos), 0.1))
+        inicial[2 * n_times + 1] = np.log(max(np.average(gols_home, weights=pesos), 0.1) / np.exp(inicial[2 * n_times]))
+        limites = [(None, None)] * (2 * n_times + 2) + [LIMITES_RHO_DIXON_COLES]
+        resultado = minimize(objetivo, inicial, jac=True, method='L-BFGS-B', bounds=limites)
+        
+        parametros = resultado.x
+        self.ataque = parametros[:n_times]
+        self.defesa = parametros[n_times:2 * n_times]
+        self.intercepto, self.mando, self.rho = (float(valor) for valor in parametros[2 * n_times:])
+        self.convergiu = bool(resultado.success)
+        self.log_verossimilhanca = float(-resultado.fun)
+    
+    def lambdas(self, team_home, team_away):
+        """(λ_mandante, λ_visitante) do confronto, ou None se algum time não está no ajuste"""
+        home, away = self.times.get(team_home), self.times.get(team_away)
+        if home is None or away is None:
+            return None
+        lambda_home = np.exp(self.intercepto + self.mando + self.ataque[home] + self.defesa[away])
+        lambda_away = np.exp(self.intercepto + self.ataque[away] + self.defesa[home])
+        return float(lambda_home), float(lambda_away)
+    
+    def matriz(self, team_home, team_away, max_gols=MAX_GOLS_MATRIZ):
+        """Matriz de placares com a correção de placares baixos (None se algum time não está no ajuste)"""
+        lambdas = self.lambdas(team_home, team_away)
+        if lambdas is None:
+            return None
+        lambda_home, lambda_away = lambdas
+        matriz, _ = matriz_placar(lambda_home, lambda_away, max_gols)
+        matriz[0, 0] *= 1 - lambda_home * lambda_away * self.rho
+        matriz[0, 1] *= 1 + lambda_home * self.rho
+        matriz[1, 0] *= 1 + lambda_away * self.rho
+        matriz[1, 1] *= 1 - self.rho
+        return np.maximum(matriz, 0.0)
+    
+    def forcas(self):
+        """Tabela de forças por time (multiplicadores de gols em relação à média)"""
+        nomes = list(self.times)
+        return pd.DataFrame({
+            'Time': nomes,
+            'Ataque': np.exp(self.ataque),
+            'Defesa': np.exp(-self.defesa),
+        }).sort_values('Ataque', ascending=False, ignore_index=True)
+
+
+def modelo_dixon_coles(df):
+    """Modelo Dixon-Coles deste DataFrame (ajustado uma única vez por dataset/filtro de temporada)"""
+    return _artefato_do_frame(df, 'dixon_coles', ModeloDixonColes)
+
+
+# ===================================================================
+# SIMULAÇÃO DE MONTE CARLO DA TEMPORADA
+# ===================================================================
+
+SIMULACOES_TEMPORADA = 100_000
+TAMANHO_LOTE_SIMULACAO = 10_000
+SEMENTE_SIMULACAO = 2026
+
+# Zonas da tabela (posições inclusivas; negativas contam a partir do último colocado),
+# as mesmas marcadas no gráfico de evolução
+ZONAS_TABELA = {
+    'Título': (1, 1),
+    'Libertadores': (1, 4),
+    'Sul-Americana': (5, 6),
+    'Rebaixamento': (-4, -1),
+}
+
+
+def jogos_restantes(df, ano):
+    """
+    Confrontos ainda não disputados de uma temporada em turno e returno.
+    
+    Cada time joga 2 x (n - 1) vezes; os jogos que faltam saem da tabela de
+    classificação. Entre os pares (mandante, visitante) ainda não registrados,
+    só entram os de times que ainda têm jogos a fazer, sem passar desse total,
+    assim um confronto registrado em duplicidade não reabre uma temporada já
+    encerrada.
+    
+    Returns:
+        tuple: (times em ordem alfabética, códigos dos mandantes, códigos dos visitantes)
+    """
+    vazio = np.array([], dtype=np.int64)
+    temporada = df[df['Ano'] == ano]
+    tabela = classificacoes_por_temporada(df).get(int(ano))
+    if tabela is None:
+        return [], vazio, vazio
+    
+    times = tabela['times']
+    n_times = len(times)
+    jogos = tabela_classificacao(df, ano).set_index('Time')['Jogos'].reindex(times, fill_value=0)
+    faltam = np.maximum(2 * (n_times - 1) - jogos.to_numpy(dtype=np.int64), 0)
+    if not faltam.any():
+        return times, vazio, vazio
+    
+    indice_times = pd.Index(times)
+    disputados = np.zeros((n_times, n_times), dtype=bool)
+    disputados[indice_times.get_indexer(temporada['Home'].astype(str)),
+               indice_times.get_indexer(temporada['Away'].astype(str))] = True
+    np.fill_diagonal(disputados, True)
+    
+    home, away = [], []
+    for h, a in zip(*np.nonzero(~disputados)):
+        if faltam[h] > 0 and faltam[a] > 0:
+            faltam[h] -= 1
+            faltam[a] -= 1
+            home.append(h)
+            away.append(a)
+    return times, np.array(home, dtype=np.int64), np.array(away, dtype=np.int64)
+
+
+def _simular_lote(semente, simulacoes, lambda_home, lambda_away, home, away, base):
+    """
+    Simula `simulacoes` temporadas de uma vez (arrays simulações x jogos).
+    
+    Returns:
+        tuple: (contagens (times, posições), soma dos pontos finais por time)
+    """
+    rng = np.random.default_rng(semente)
+    n_times = base['pontos'].shape[0]
+    gols_home = rng.poisson(lambda_home, size=(simulacoes, len(lambda_home))).astype('float64')
+    gols_away = rng.poisson(lambda_away, size=(simulacoes, len(lambda_away))).astype('float64')
+    
+    # Matrizes indicadoras jogo -> time: somar por time vira um produto de matrizes
+    mandante = np.zeros((len(home), n_times))
+    mandante[np.arange(len(home)), home] = 1.0
+    visitante = np.zeros((len(away), n_times))
+    visitante[np.arange(len(away)), away] = 1.0
+    
+    vitoria_home, vitoria_away = gols_home > gols_away, gols_away > gols_home
+    empate = ~(vitoria_home | vitoria_away)
+    vitorias = base['vitorias'] + vitoria_home @ mandante + vitoria_away @ visitante
+    pontos = base['pontos'] + 3 * vitorias - 3 * base['vitorias'] + empate @ mandante + empate @ visitante
+    gols_pro = base['gols_pro'] + gols_home @ mandante + gols_away @ visitante
+    saldo = base['saldo'] + gols_pro - base['gols_pro'] - gols_away @ mandante - gols_home @ visitante
+    
+    # Critérios do Brasileirão: pontos, vitórias, saldo, gols pró (e nome, por último)
+    nome = np.broadcast_to(np.arange(n_times), (simulacoes, n_times))
+    ordem = np.lexsort((nome, -gols_pro, -saldo, -vitorias, -pontos), axis=-1)
+    posicao = np.empty((simulacoes, n_times), dtype=np.int64)
+    np.put_along_axis(posicao, ordem, np.broadcast_to(np.arange(n_times), (simulacoes, n_times)), axis=-1)
+    
+    contagens = np.bincount((nome * n_times + posicao).ravel(), minlength=n_times * n_times)
+    return contagens.reshape(n_times, n_times), pontos.sum(axis=0)
+
+
+def simular_temporada(df, ano, simulacoes=SIMULACOES_TEMPORADA, semente=SEMENTE_SIMULACAO, processos=1):
+    """
+    Projeta a tabela final de uma temporada por Monte Carlo.
+    
+    Os jogos restantes são sorteados com os λ do modelo Dixon-Coles do df. As
+    simulações são divididas em lotes com sementes independentes (SeedSequence),
+    então o resultado depende só da semente, não do número de processos.
+    
+    Returns:
+        dict com 'resumo' (probabilidades por zona, pontos e posição esperados),
+        'distribuicao' (probabilidade de cada time em cada posição), 'jogos_restantes'
+        e 'simulacoes'; None se a temporada não existir
+    """
+    times, home, away = jogos_restantes(df, ano)
+    if not times:
+        return None
+    
+    atual = tabela_classificacao(df, ano).set_index('Time').reindex(times)
+    base = {
+        'pontos': atual['Pontos'].to_numpy(dtype='float64'),
+        'vitorias': atual['Vitórias'].to_numpy(dtype='float64'),
+        'gols_pro': atual['Gols Pró'].to_numpy(dtype='float64'),
+        'saldo': atual['Saldo'].to_numpy(dtype='float64'),
+    }
+    
+    modelo = modelo_dixon_coles(df)
+    media_home, media_away = df['Gols Home'].mean(), df['Gols Away'].mean()
+    lambdas = [modelo.lambdas(times[h], times[a]) or (media_home, media_away) for h, a in zip(home, away)]
+    lambda_home = np.array([par[0] for par in lambdas], dtype='float64')
+    lambda_away = np.array([par[1] for par in lambdas], dtype='float64')
+    
+    tamanhos = [TAMANHO_LOTE_SIMULACAO] * (simulacoes // TAMANHO_LOTE_SIMULACAO)
+    if simulacoes % TAMANHO_LOTE_SIMULACAO:
+        tamanhos.append(simulacoes % TAMANHO_LOTE_SIMULACAO)
+    sementes = np.random.SeedSequence(semente).spawn(len(tamanhos))
+    argumentos = [(semente_lote, tamanho, lambda_home, lambda_away, home, away, base)
+                  for semente_lote, tamanho in zip(sementes, tamanhos)]
+    
+    if processos > 1 and len(argumentos) > 1:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            lotes = list(executor.map(_simular_lote, *zip(*argumentos)))
+    else:
+        lotes = [_simular_lote(*args) for args in argumentos]
+    
+    contagens = sum(lote[0] for lote in lotes)
+    soma_pontos = sum(lote[1] for lote in lotes)
+    n_times = len(times)
+    distribuicao = pd.DataFrame(contagens / simulacoes, index=times, columns=np.arange(1, n_times + 1))
+    
+    resumo = pd.DataFrame({
+        'Time': times,
+        'Pontos Atuais': base['pontos'].astype(int),
+        'Pontos Esperados': soma_pontos / simulacoes,
+        'Posição Média': distribuicao.to_numpy() @ np.arange(1, n_times + 1),
+    })
+    for zona, (inicio, fim) in ZONAS_TABELA.items():
+        inicio = inicio if inicio > 0 else n_times + inicio + 1
+        fim = fim if fim > 0 else n_times + fim + 1
+        resumo[zona] = distribuicao.loc[:, inicio:fim].sum(axis=1).to_numpy()
+    
+    return {
+        'resumo': resumo.sort_values('Posição Média').reset_index(drop=True),
+        'distribuicao': distribuicao.loc[resumo.sort_values('Posição Média')['Time']],
+        'jogos_restantes': len(home),
+        'simulacoes': simulacoes,
+    }
 
-def calculate_implicit_probabilities(home_odd, draw_odd, away_odd):
-    """Calcula probabilidades implícitas das odds"""
-    try:
-        if home_odd <= 0 or draw_odd <= 0 or away_odd <= 0:
-            return 0, 0, 0
-        home_prob = 1 / home_odd * 100
-        draw_prob = 1 / draw_odd * 100
-        away_prob = 1 / away_odd * 100
-        return home_prob, draw_prob, away_prob
-    except Exception as e:
-        st.error(f"Erro no cálculo de probabilidades: {str(e)}")
-        return 0, 0, 0
 
 def predict_score_poisson(home_avg, away_avg, home_def, away_def):
     """Prediz placar usando distribuição de Poisson"""
@@ -454,15 +2158,8 @@ def predict_score_poisson(home_avg, away_avg, home_def, away_def):
         away_goals_expected = max(0.1, (away_avg + home_def) / 2)
         
         # Encontra o placar mais provável
-        max_prob = 0
-        best_score = (0, 0)
-        
-        for home_goals in range(6):
-            for away_goals in range(6):
-                prob = poisson.pmf(home_goals, home_goals_expected) * poisson.pmf(away_goals, away_goals_expected)
-                if prob > max_prob:
-                    max_prob = prob
-                    best_score = (home_goals, away_goals)
+        matriz, _ = matriz_placar(home_goals_expected, away_goals_expected, max_gols=5)
+        best_score, max_prob = placares_mais_provaveis(matriz, 1)[0]
         
         return best_score, max_prob, home_goals_expected, away_goals_expected
     except Exception as e:
@@ -601,8 +2298,8 @@ def calculate_team_statistics(df, team_home, team_away):
         dict: Dicionário com estatísticas calculadas
     """
     # Filtrar jogos onde cada time atua em sua respectiva condição
-    home_games = df[df['Home'] == team_home].copy()
-    away_games = df[df['Away'] == team_away].copy()
+    home_games = jogos_do_time(df, team_home, 'Home')
+    away_games = jogos_do_time(df, team_away, 'Away')
     
     # Calcular estatísticas do time mandante (quando joga em casa)
     home_stats = {
@@ -905,35 +2602,40 @@ def display_first_half_analysis(stats, analysis, team_home, team_away):
 # PARTE 1: CÁLCULO DE ESTATÍSTICAS HT E ST
 # ===================================================================
 
-def calculate_ht_st_stats(games, is_home):
+def calculate_ht_st_stats_time(df, team, is_home):
     """
-    Calcula estatísticas COMPLETAS de HT e ST
-    Separa primeiro tempo e segundo tempo
+    Estatísticas COMPLETAS de HT e ST do time no mando, lidas do cubo de agregados.
+    
+    A forma recente usa os 5 últimos jogos em ordem cronológica (motor de forma).
     """
-    if games.empty:
+    venue = 'Home' if is_home else 'Away'
+    agregado = agregado_time(df, team, venue)
+    if agregado is None:
         return create_empty_ht_st_stats()
     
-    jogos = len(games)
-    
-    # Colunas conforme posição
-    if is_home:
-        ht_feitos_col = 'Home Score HT'
-        ht_sofridos_col = 'Away Score HT'
-        ft_feitos_col = 'Gols Home'
-        ft_sofridos_col = 'Gols Away'
-    else:
-        ht_feitos_col = 'Away Score HT'
-        ht_sofridos_col = 'Home Score HT'
-        ft_feitos_col = 'Gols Away'
-        ft_sofridos_col = 'Gols Home'
+    recentes = None
+    janela = motor_forma(df).janela(team, venue, 5)
+    if janela is not None and janela['jogos'] >= 5:
+        recentes = [janela['total_gols_ht_feitos'], janela['total_gols_ht_sofridos'],
+                    janela['total_gols_st_feitos'], janela['total_gols_st_sofridos']]
     
-    # PRIMEIRO TEMPO (HT)
-    gols_feitos_ht = games[ht_feitos_col].sum()
-    gols_sofridos_ht = games[ht_sofridos_col].sum()
+    return _montar_estatisticas_ht_st(agregado, recentes)
+
+
+def _montar_estatisticas_ht_st(agregado, recentes):
+    """
+    Monta o dicionário de estatísticas HT/ST a partir das somas do time.
     
-    # SEGUNDO TEMPO (ST) = Total - HT
-    gols_feitos_st = games[ft_feitos_col].sum() - gols_feitos_ht
-    gols_sofridos_st = games[ft_sofridos_col].sum() - gols_sofridos_ht
+    Args:
+        agregado: dict com jogos, gols_ht/st feitos/sofridos e contagens marcou/sofreu
+        recentes: somas [ht_feitos, ht_sofridos, st_feitos, st_sofridos] dos 5 jogos
+                  recentes, ou None se houver menos de 5 jogos
+    """
+    jogos = agregado['jogos']
+    gols_feitos_ht = agregado['gols_ht_feitos']
+    gols_sofridos_ht = agregado['gols_ht_sofridos']
+    gols_feitos_st = agregado['gols_st_feitos']
+    gols_sofridos_st = agregado['gols_st_sofridos']
     
     # Médias
     media_feitos_ht = gols_feitos_ht / jogos
@@ -941,30 +2643,16 @@ def calculate_ht_st_stats(games, is_home):
     media_feitos_st = gols_feitos_st / jogos
     media_sofridos_st = gols_sofridos_st / jogos
     
-    # Percentuais (marcou/sofreu em quantos jogos)
-    marcou_ht = (games[ht_feitos_col] > 0).sum()
-    sofreu_ht = (games[ht_sofridos_col] > 0).sum()
-    
-    # Para ST, precisamos calcular gols no segundo tempo por jogo
-    st_feitos_por_jogo = games[ft_feitos_col] - games[ht_feitos_col]
-    st_sofridos_por_jogo = games[ft_sofridos_col] - games[ht_sofridos_col]
+    marcou_ht = agregado['marcou_ht']
+    sofreu_ht = agregado['sofreu_ht']
+    marcou_st = agregado['marcou_st']
+    sofreu_st = agregado['sofreu_st']
     
-    marcou_st = (st_feitos_por_jogo > 0).sum()
-    sofreu_st = (st_sofridos_por_jogo > 0).sum()
-    
-    # Últimos 5 jogos (forma recente)
-    if len(games) >= 5:
-        recent_games = games.head(5)
-        
-        recent_ht_feitos = recent_games[ht_feitos_col].sum()
-        recent_ht_sofridos = recent_games[ht_sofridos_col].sum()
-        recent_st_feitos = (recent_games[ft_feitos_col] - recent_games[ht_feitos_col]).sum()
-        recent_st_sofridos = (recent_games[ft_sofridos_col] - recent_games[ht_sofridos_col]).sum()
-        
-        recent_media_ht_feitos = recent_ht_feitos / 5
-        recent_media_ht_sofridos = recent_ht_sofridos / 5
-        recent_media_st_feitos = recent_st_feitos / 5
-        recent_media_st_sofridos = recent_st_sofridos / 5
+    if recentes is not None:
+        recent_media_ht_feitos = recentes[0] / 5
+        recent_media_ht_sofridos = recentes[1] / 5
+        recent_media_st_feitos = recentes[2] / 5
+        recent_media_st_sofridos = recentes[3] / 5
     else:
         recent_media_ht_feitos = media_feitos_ht
         recent_media_ht_sofridos = media_sofridos_ht
@@ -1254,12 +2942,12 @@ def show_first_half_analysis(df, teams):
     st.markdown("---")
     
     # Filtrar jogos
-    home_games = df[df['Home'] == team_home].copy()
-    away_games = df[df['Away'] == team_away].copy()
+    home_games = jogos_do_time(df, team_home, 'Home')
+    away_games = jogos_do_time(df, team_away, 'Away')
     
-    # Calcular estatísticas HT + ST (NOVO)
-    home_stats = calculate_ht_st_stats(home_games, True)
-    away_stats = calculate_ht_st_stats(away_games, False)
+    # Calcular estatísticas HT + ST (consulta ao cubo de agregados)
+    home_stats = calculate_ht_st_stats_time(df, team_home, True)
+    away_stats = calculate_ht_st_stats_time(df, team_away, False)
     
     # Verificar dados mínimos
     if home_stats['jogos'] < 3 or away_stats['jogos'] < 3:
@@ -1294,8 +2982,13 @@ def show_first_half_analysis(df, teams):
     
     st.markdown("---")
     
+    # Predição ao vivo a partir do placar do intervalo (NOVO)
+    display_live_ht_ft_predictor(df, team_home, team_away)
+    
+    st.markdown("---")
+    
     # Análise de cenários HT para FT (MANTIDO ORIGINAL)
-    display_complete_scenario_analysis(home_games, away_games, team_home, team_away)
+    display_complete_scenario_analysis(home_games, away_games, team_home, team_away, df=df)
 
 
 def display_temporal_tendencies(home_stats, away_stats, team_home, team_away):
@@ -1549,12 +3242,154 @@ def display_probabilistic_scenarios(home_stats, away_stats, team_home, team_away
         )
 
 
+# ===================================================================
+# PREDIÇÃO AO VIVO: PLACAR DO INTERVALO -> PLACAR FINAL
+# ===================================================================
+
+# Placares de intervalo cobertos pela tabela (0..N gols de cada lado)
+MAX_GOLS_HT_AO_VIVO = 5
+
+# Gols de cada lado considerados no segundo tempo
+MAX_GOLS_ST_AO_VIVO = 8
+
+LINHAS_OVER_AO_VIVO = [0.5, 1.5, 2.5, 3.5, 4.5, 5.5]
+
+
+def tabela_ht_ft_ao_vivo(lambda_home_st, lambda_away_st, max_gols_ht=MAX_GOLS_HT_AO_VIVO,
+                         max_gols_st=MAX_GOLS_ST_AO_VIVO):
+    """
+    Matrizes de placar final para todos os placares de intervalo de um confronto.
+    
+    Uma única matriz do segundo tempo (renormalizada) é deslocada para cada placar
+    HT (h, a): final[h, a, h + i, a + j] = st[i, j]. Os mercados de todos os
+    estados saem vetorizados dessas matrizes.
+    
+    Returns:
+        dict com 'lambda_home_st', 'lambda_away_st', 'matrizes' (HT, HT, FT, FT),
+        'prob_1x2' (HT, HT, 3), 'prob_over' (HT, HT, linhas), 'prob_ambas' (HT, HT)
+        e 'gols_restantes' (soma dos λ do segundo tempo)
+    """
+    matriz_st, _ = matriz_placar(lambda_home_st, lambda_away_st, max_gols_st)
+    matriz_st = matriz_st / matriz_st.sum()
+    
+    n_ht, n_st = max_gols_ht + 1, max_gols_st + 1
+    n_ft = n_ht + n_st - 1
+    ht_home, ht_away, st_home, st_away = np.ix_(np.arange(n_ht), np.arange(n_ht), np.arange(n_st), np.arange(n_st))
+    matrizes = np.zeros((n_ht, n_ht, n_ft, n_ft))
+    matrizes[ht_home, ht_away, ht_home + st_home, ht_away + st_away] = matriz_st[st_home, st_away]
+    
+    gols_home, gols_away = np.indices((n_ft, n_ft))
+    total = gols_home + gols_away
+    
+    return {
+        'lambda_home_st': float(lambda_home_st),
+        'lambda_away_st': float(lambda_away_st),
+        'matrizes': matrizes,
+        'prob_1x2': np.stack([
+            matrizes[..., gols_home > gols_away].sum(axis=-1),
+            matrizes[..., gols_home == gols_away].sum(axis=-1),
+            matrizes[..., gols_home < gols_away].sum(axis=-1),
+        ], axis=-1),
+        'prob_over': np.stack([matrizes[..., total > linha].sum(axis=-1) for linha in LINHAS_OVER_AO_VIVO], axis=-1),
+        'prob_ambas': matrizes[..., 1:, 1:].sum(axis=(-2, -1)),
+        'gols_restantes': float(lambda_home_st + lambda_away_st),
+    }
+
+
+def tabela_ht_ft_confronto(df, team_home, team_away):
+    """
+    Tabela ao vivo do confronto com os λ do 2º tempo.
+    
+    Não fica em cache: as estatísticas de cada time já vêm do cubo de agregados
+    e do motor de forma, e montar a tabela custa menos de 1 ms, enquanto guardar
+    uma por confronto faria a memória crescer com cada par consultado.
+    """
+    home_stats = calculate_ht_st_stats_time(df, team_home, True)
+    away_stats = calculate_ht_st_stats_time(df, team_away, False)
+    lambda_home_st, lambda_away_st = calculate_st_dominance_score(home_stats, away_stats)
+    return tabela_ht_ft_ao_vivo(max(lambda_home_st, 0.01), max(lambda_away_st, 0.01))
+
+
+def display_live_ht_ft_predictor(df, team_home, team_away):
+    """Predição ao vivo: informe o placar do intervalo e veja o placar final e os mercados"""
+    
+    st.markdown("""
+    <div style="background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%); padding: 20px; border-radius: 12px; margin: 20px 0;">
+        <h2 style="color: white; margin: 0; text-align: center;">⏱️ Predição ao Vivo (Intervalo → Final)</h2>
+        <p style="color: white; text-align: center; margin: 5px 0;">Segundo tempo projetado com os gols esperados no 2º tempo de cada equipe</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    tabela = tabela_ht_ft_confronto(df, team_home, team_away)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        gols_home_ht = st.number_input(f"🏠 {team_home} no intervalo", min_value=0, max_value=MAX_GOLS_HT_AO_VIVO,
+                                       value=0, step=1, key="ao_vivo_ht_home")
+    with col2:
+        gols_away_ht = st.number_input(f"✈️ {team_away} no intervalo", min_value=0, max_value=MAX_GOLS_HT_AO_VIVO,
+                                       value=0, step=1, key="ao_vivo_ht_away")
+    with col3:
+        st.metric("Gols Esperados no 2º Tempo", f"{tabela['gols_restantes']:.2f}",
+                  help=f"{team_home}: {tabela['lambda_home_st']:.2f} | {team_away}: {tabela['lambda_away_st']:.2f}")
+    
+    # Consulta direta ao estado do placar (tabela já calculada)
+    prob_home, prob_draw, prob_away = tabela['prob_1x2'][gols_home_ht, gols_away_ht]
+    matriz = tabela['matrizes'][gols_home_ht, gols_away_ht]
+    
+    st.markdown(f"### 🏁 Resultado Final a partir de {gols_home_ht} x {gols_away_ht}")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(f"Vitória {team_home}", f"{prob_home*100:.1f}%", help=f"Odd justa: {odd_justa(prob_home):.2f}")
+    with col2:
+        st.metric("Empate", f"{prob_draw*100:.1f}%", help=f"Odd justa: {odd_justa(prob_draw):.2f}")
+    with col3:
+        st.metric(f"Vitória {team_away}", f"{prob_away*100:.1f}%", help=f"Odd justa: {odd_justa(prob_away):.2f}")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**📊 Total de Gols (jogo inteiro)**")
+        overs = tabela['prob_over'][gols_home_ht, gols_away_ht]
+        st.dataframe(pd.DataFrame({
+            'Linha': [f"Over {linha}" for linha in LINHAS_OVER_AO_VIVO],
+            'Probabilidade': overs,
+            'Odd Justa': odd_justa(overs),
+        }).style.format({'Probabilidade': '{:.1%}', 'Odd Justa': '{:.2f}'}), use_container_width=True, hide_index=True)
+        ambas = tabela['prob_ambas'][gols_home_ht, gols_away_ht]
+        st.info(f"**Ambas Marcam:** {ambas*100:.1f}% (odd justa {odd_justa(ambas):.2f})")
+    
+    with col2:
+        st.markdown("**🎯 Placares Finais Mais Prováveis**")
+        st.dataframe(pd.DataFrame([
+            {'Placar Final': f"{h} x {a}", 'Probabilidade': prob, 'Odd Justa': odd_justa(prob)}
+            for (h, a), prob in placares_mais_provaveis(matriz, 8)
+        ]).style.format({'Probabilidade': '{:.1%}', 'Odd Justa': '{:.2f}'}), use_container_width=True, hide_index=True)
+    
+    with st.expander("📋 Tabela completa por placar do intervalo"):
+        placares_ht = [(h, a) for h in range(MAX_GOLS_HT_AO_VIVO + 1) for a in range(MAX_GOLS_HT_AO_VIVO + 1)]
+        h_idx, a_idx = np.array(placares_ht).T
+        st.dataframe(pd.DataFrame({
+            'Placar HT': [f"{h} x {a}" for h, a in placares_ht],
+            'Mandante': tabela['prob_1x2'][h_idx, a_idx, 0],
+            'Empate': tabela['prob_1x2'][h_idx, a_idx, 1],
+            'Visitante': tabela['prob_1x2'][h_idx, a_idx, 2],
+            'Over 2.5': tabela['prob_over'][h_idx, a_idx, LINHAS_OVER_AO_VIVO.index(2.5)],
+            'Ambas Marcam': tabela['prob_ambas'][h_idx, a_idx],
+        }).style.format({coluna: '{:.1%}' for coluna in ['Mandante', 'Empate', 'Visitante', 'Over 2.5', 'Ambas Marcam']}),
+            use_container_width=True, hide_index=True)
+
+
 # ===================================================================
 # FUNÇÕES AUXILIARES ORIGINAIS (MANTIDAS)
 # ===================================================================
 
-def display_complete_scenario_analysis(home_games, away_games, team_home, team_away):
-    """Análise completa de cenários HT para FT (FUNÇÃO ORIGINAL MANTIDA)"""
+def display_complete_scenario_analysis(home_games, away_games, team_home, team_away, df=None):
+    """
+    Análise completa de cenários HT para FT.
+    
+    Com df informado, as contagens vêm das matrizes pré-calculadas de todos os
+    times e é exibido também o comparativo com a liga.
+    """
     
     st.markdown("""
     <div style="background: linear-gradient(135deg, #fa709a 0%, #fee140 100%); padding: 20px; border-radius: 12px; margin: 20px 0;">
@@ -1563,8 +3398,12 @@ def display_complete_scenario_analysis(home_games, away_games, team_home, team_a
     """, unsafe_allow_html=True)
     
     # Analisar cenários completos
-    home_scenarios = analyze_all_scenarios(home_games, True)
-    away_scenarios = analyze_all_scenarios(away_games, False)
+    if df is not None:
+        home_scenarios = _cenarios_da_matriz(matriz_ht_ft_time(df, team_home, True))
+        away_scenarios = _cenarios_da_matriz(matriz_ht_ft_time(df, team_away, False))
+    else:
+        home_scenarios = analyze_all_scenarios(home_games, True)
+        away_scenarios = analyze_all_scenarios(away_games, False)
     
     # Exibir lado a lado
     col1, col2 = st.columns(2)
@@ -1574,58 +3413,182 @@ def display_complete_scenario_analysis(home_games, away_games, team_home, team_a
     
     with col2:
         display_scenario_stats(away_scenarios, team_away, "✈️ Visitante", "#FF6B6B")
+    
+    if df is not None:
+        display_league_transition_comparison(df, team_home, team_away)
 
 
-def analyze_all_scenarios(games, is_home):
-    """Analisa todos os cenários possíveis HT para FT (FUNÇÃO ORIGINAL MANTIDA)"""
-    scenarios = {
-        'ht_win_ft_win': 0,
-        'ht_win_ft_draw': 0,
-        'ht_win_ft_loss': 0,
-        'ht_draw_ft_win': 0,
-        'ht_draw_ft_draw': 0,
-        'ht_draw_ft_loss': 0,
-        'ht_loss_ft_win': 0,
-        'ht_loss_ft_draw': 0,
-        'ht_loss_ft_loss': 0
+# ===================================================================
+# MATRIZES DE TRANSIÇÃO HT -> FT (TODOS OS TIMES, VETORIZADO)
+# ===================================================================
+
+# Linhas = resultado HT, colunas = resultado FT, sempre na perspectiva do time
+RESULTADOS_TRANSICAO = ['win', 'draw', 'loss']
+
+
+def _indice_resultado(gols_time, gols_adversario):
+    """0 = vitória, 1 = empate, 2 = derrota (placar ausente conta como empate)"""
+    diferenca = np.nan_to_num(np.asarray(gols_time, dtype='float64') -
+                              np.asarray(gols_adversario, dtype='float64'))
+    return (1 - np.sign(diferenca)).astype(np.intp)
+
+
+def _contar_transicoes(ht_time, ht_adv, ft_time, ft_adv, grupos=None, n_grupos=1):
+    """
+    Conta as 9 transições HT -> FT com um único bincount.
+    
+    Returns:
+        array (n_grupos, 3, 3) de contagens; grupos=None conta tudo em um grupo só
+    """
+    celula = _indice_resultado(ht_time, ht_adv) * 3 + _indice_resultado(ft_time, ft_adv)
+    if grupos is None:
+        grupos = np.zeros(len(celula), dtype=np.intp)
+    contagens = np.bincount(grupos * 9 + celula, minlength=n_grupos * 9)
+    return contagens.reshape(n_grupos, 3, 3)
+
+
+def _cenarios_da_matriz(matriz):
+    """Converte a matriz 3x3 no dicionário de cenários usado pela interface"""
+    return {
+        f"ht_{ht}_ft_{ft}": int(matriz[i, j])
+        for i, ht in enumerate(RESULTADOS_TRANSICAO)
+        for j, ft in enumerate(RESULTADOS_TRANSICAO)
     }
+
+
+def taxas_transicao(matriz):
+    """Probabilidade do resultado FT dado o resultado HT (cada linha soma 1; linha vazia = 0)"""
+    matriz = np.asarray(matriz, dtype='float64')
+    totais = matriz.sum(axis=-1, keepdims=True)
+    return np.divide(matriz, totais, out=np.zeros_like(matriz), where=totais > 0)
+
+
+def _codigos_lados(df):
+    """Códigos inteiros (mesma numeração) para mandantes e visitantes, e a lista de nomes"""
+    n = len(df)
+    codigos, nomes = pd.factorize(pd.concat([df['Home'].astype(str), df['Away'].astype(str)],
+                                            ignore_index=True))
+    return codigos[:n], codigos[n:], list(nomes)
+
+
+def _construir_matrizes_ht_ft(df):
+    """
+    Matrizes HT -> FT de todos os times (mandante e visitante) e da liga, em uma passada.
+    
+    Returns:
+        dict com:
+            'times': {nome: índice}
+            'contagens': array (times, 2, 3, 3) -> [time, 0 = mandante / 1 = visitante]
+            'liga': array (2, 3, 3) -> perspectiva de todos os mandantes / visitantes
+    """
+    codigos_home, codigos_away, nomes = _codigos_lados(df)
+    n_times = len(nomes)
+    
+    ht_home, ht_away = _coluna_float(df, 'Home Score HT'), _coluna_float(df, 'Away Score HT')
+    ft_home, ft_away = _coluna_float(df, 'Gols Home'), _coluna_float(df, 'Gols Away')
     
+    # Grupo = time * 2 + lado; mandantes e visitantes empilhados em um único bincount
+    grupos = np.concatenate([codigos_home * 2, codigos_away * 2 + 1])
+    contagens = _contar_transicoes(
+        np.concatenate([ht_home, ht_away]), np.concatenate([ht_away, ht_home]),
+        np.concatenate([ft_home, ft_away]), np.concatenate([ft_away, ft_home]),
+        grupos=grupos, n_grupos=n_times * 2
+    ).reshape(n_times, 2, 3, 3)
+    
+    return {
+        'times': {nome: i for i, nome in enumerate(nomes)},
+        'contagens': contagens,
+        'liga': contagens.sum(axis=0)
+    }
+
+
+def matrizes_ht_ft(df):
+    """Matrizes HT -> FT do DataFrame (construídas uma única vez por DataFrame)"""
+    return _artefato_do_frame(df, 'matrizes_ht_ft', _construir_matrizes_ht_ft)
+
+
+def matriz_ht_ft_time(df, team, is_home):
+    """Matriz 3x3 de contagens HT -> FT do time no mando informado"""
+    matrizes = matrizes_ht_ft(df)
+    indice = matrizes['times'].get(team)
+    if indice is None:
+        return np.zeros((3, 3), dtype=np.int64)
+    return matrizes['contagens'][indice, 0 if is_home else 1]
+
+
+def analyze_all_scenarios(games, is_home):
+    """Analisa todos os cenários possíveis HT para FT (contagem vetorizada)"""
     if games.empty:
-        return scenarios
-    
-    for _, game in games.iterrows():
-        if is_home:
-            ht_team = game['Home Score HT']
-            ht_opp = game['Away Score HT']
-            ft_team = game['Gols Home']
-            ft_opp = game['Gols Away']
-        else:
-            ht_team = game['Away Score HT']
-            ht_opp = game['Home Score HT']
-            ft_team = game['Gols Away']
-            ft_opp = game['Gols Home']
-        
-        # Resultado HT
-        if ht_team > ht_opp:
-            ht_result = 'win'
-        elif ht_team < ht_opp:
-            ht_result = 'loss'
-        else:
-            ht_result = 'draw'
+        return _cenarios_da_matriz(np.zeros((3, 3), dtype=np.int64))
+    
+    if is_home:
+        colunas = ['Home Score HT', 'Away Score HT', 'Gols Home', 'Gols Away']
+    else:
+        colunas = ['Away Score HT', 'Home Score HT', 'Gols Away', 'Gols Home']
+    
+    matriz = _contar_transicoes(*(_coluna_float(games, col) for col in colunas))[0]
+    return _cenarios_da_matriz(matriz)
+
+
+def display_league_transition_comparison(df, team_home, team_away):
+    """Compara as taxas HT -> FT dos times com a média da liga (mesmo mando)"""
+    matrizes = matrizes_ht_ft(df)
+    
+    with st.expander("📊 Comparativo com a Liga (HT → FT)"):
+        st.caption("Probabilidade do resultado final dado o resultado do 1º tempo, "
+                   "comparada com todos os mandantes/visitantes do período filtrado.")
         
-        # Resultado FT
-        if ft_team > ft_opp:
-            ft_result = 'win'
-        elif ft_team < ft_opp:
-            ft_result = 'loss'
-        else:
-            ft_result = 'draw'
+        situacoes = [
+            ("Vencendo no HT → Vence", 0, 0),
+            ("Vencendo no HT → Não vence", 0, None),
+            ("Empatando no HT → Vence", 1, 0),
+            ("Empatando no HT → Perde", 1, 2),
+            ("Perdendo no HT → Não perde", 2, None),
+            ("Perdendo no HT → Vira", 2, 0),
+        ]
         
-        scenario_key = f"ht_{ht_result}_ft_{ft_result}"
-        if scenario_key in scenarios:
-            scenarios[scenario_key] += 1
-    
-    return scenarios
+        def taxa(matriz, linha, coluna):
+            taxas = taxas_transicao(matriz)
+            if coluna is None:
+                # "Não vence" quando vencia / "não perde" quando perdia
+                return (1 - taxas[linha, linha]) * 100 if matriz[linha].sum() > 0 else 0.0
+            return taxas[linha, coluna] * 100
+        
+        linhas = []
+        for rotulo, linha, coluna in situacoes:
+            linhas.append({
+                'Cenário': rotulo,
+                f'{team_home} (casa)': taxa(matriz_ht_ft_time(df, team_home, True), linha, coluna),
+                'Liga (mandantes)': taxa(matrizes['liga'][0], linha, coluna),
+                f'{team_away} (fora)': taxa(matriz_ht_ft_time(df, team_away, False), linha, coluna),
+                'Liga (visitantes)': taxa(matrizes['liga'][1], linha, coluna),
+            })
+        
+        tabela = pd.DataFrame(linhas).set_index('Cenário')
+        st.dataframe(tabela.style.format("{:.1f}%"), use_container_width=True)
+        
+        # Ranking da liga: quem mais segura a vitória do intervalo e quem mais reage
+        nomes = list(matrizes['times'])
+        taxas_times = taxas_transicao(matrizes['contagens'])
+        ranking = pd.DataFrame({
+            'Time': nomes,
+            'Segura vitória HT (casa) %': taxas_times[:, 0, 0, 0] * 100,
+            'Segura vitória HT (fora) %': taxas_times[:, 1, 0, 0] * 100,
+            'Reage perdendo HT (casa) %': (1 - taxas_times[:, 0, 2, 2]) * 100,
+            'Reage perdendo HT (fora) %': (1 - taxas_times[:, 1, 2, 2]) * 100,
+        })
+        # Time sem jogos perdendo no HT não "reage": mantém 0 em vez de 100%
+        for lado in (0, 1):
+            sem_jogos = matrizes['contagens'][:, lado, 2].sum(axis=1) == 0
+            coluna = 'Reage perdendo HT (casa) %' if lado == 0 else 'Reage perdendo HT (fora) %'
+            ranking.loc[sem_jogos, coluna] = 0.0
+        
+        st.markdown("**Todos os times do período:**")
+        st.dataframe(
+            ranking.sort_values('Segura vitória HT (casa) %', ascending=False)
+                   .set_index('Time').style.format("{:.1f}"),
+            use_container_width=True
+        )
 
 
 def display_scenario_stats(scenarios, team_name, position, color):
@@ -1763,71 +3726,58 @@ def show_direct_confrontation(df, teams):
         st.warning("Selecione dois times diferentes.")
         return
     
-    # Buscar todos os confrontos diretos
-    confrontos = df[
-        ((df['Home'] == team1) & (df['Away'] == team2)) |
-        ((df['Home'] == team2) & (df['Away'] == team1))
-    ].copy()
+    # Buscar todos os confrontos diretos (índice de pares, totais já agregados)
+    resumo = confronto_direto(df, team1, team2)
     
-    if confrontos.empty:
+    if resumo['jogos'] == 0:
         st.warning(f"Nenhum confronto encontrado entre {team1} e {team2}.")
         return
     
-    # Ordenar por data se disponível, senão por index
-    confrontos = confrontos.sort_index()
+    # Posições já em ordem de linha (equivalente a ordenar pelo index)
+    confrontos = df.take(resumo['posicoes'])
     
     st.subheader(f"📊 Histórico de Confrontos: {team1} x {team2}")
     st.write(f"**Total de jogos encontrados:** {len(confrontos)}")
     
-    # Preparar dados para exibição
-    confrontos_display = []
-    team1_wins = 0
-    team2_wins = 0
-    draws = 0
-    
-    for idx, game in confrontos.iterrows():
-        home_team = game['Home']
-        away_team = game['Away']
-        home_score = game['Gols Home']
-        away_score = game['Gols Away']
-        
-        # Determinar resultado na perspectiva dos times selecionados
-        if home_team == team1:
-            team1_score = home_score
-            team2_score = away_score
-            team1_condition = "Mandante"
-            team2_condition = "Visitante"
-        else:
-            team1_score = away_score
-            team2_score = home_score
-            team1_condition = "Visitante"
-            team2_condition = "Mandante"
-        
-        # Contar vitórias
-        if team1_score > team2_score:
-            team1_wins += 1
-            resultado = f"Vitória {team1}"
-        elif team2_score > team1_score:
-            team2_wins += 1
-            resultado = f"Vitória {team2}"
-        else:
-            draws += 1
-            resultado = "Empate"
-        
-        # Obter odds se disponíveis
-        odds_info = ""
-        if all(col in game.index for col in ['odd Home', 'odd Draw', 'odd Away']):
-            if pd.notna(game['odd Home']) and pd.notna(game['odd Draw']) and pd.notna(game['odd Away']):
-                odds_info = f"Odds: H:{game['odd Home']:.2f} E:{game['odd Draw']:.2f} A:{game['odd Away']:.2f}"
-        
-        confrontos_display.append({
-            'Confronto': f"{home_team} x {away_team}",
-            'Placar': f"{int(home_score)} x {int(away_score)}",
-            f'{team1}': f"{int(team1_score)} ({team1_condition})",
-            f'{team2}': f"{int(team2_score)} ({team2_condition})",
-            'Resultado': resultado,
-            'Odds': odds_info
-        })
+    team1_wins = resumo['vitorias_team1']
+    team2_wins = resumo['vitorias_team2']
+    draws = resumo['empates']
+    
+    # Preparar dados para exibição (colunas montadas de forma vetorizada)
+    home_team = confrontos['Home'].astype(str)
+    away_team = confrontos['Away'].astype(str)
+    home_score = confrontos['Gols Home'].astype(int)
+    away_score = confrontos['Gols Away'].astype(int)
+    team1_em_casa = (home_team == team1).to_numpy()
+    
+    team1_score = pd.Series(np.where(team1_em_casa, home_score, away_score), index=confrontos.index)
+    team2_score = pd.Series(np.where(team1_em_casa, away_score, home_score), index=confrontos.index)
+    team1_condition = np.where(team1_em_casa, " (Mandante)", " (Visitante)")
+    team2_condition = np.where(team1_em_casa, " (Visitante)", " (Mandante)")
+    
+    resultado = np.select(
+        [team1_score > team2_score, team2_score > team1_score],
+        [f"Vitória {team1}", f"Vitória {team2}"],
+        "Empate"
+    )
+    
+    # Odds, quando disponíveis
+    odds_info = pd.Series("", index=confrontos.index)
+    if all(col in confrontos.columns for col in ['odd Home', 'odd Draw', 'odd Away']):
+        odds = confrontos[['odd Home', 'odd Draw', 'odd Away']]
+        validas = odds.notna().all(axis=1)
+        formatadas = odds[validas].apply(lambda coluna: coluna.map('{:.2f}'.format))
+        odds_info[validas] = ("Odds: H:" + formatadas['odd Home'] + " E:" + formatadas['odd Draw'] +
+                              " A:" + formatadas['odd Away'])
+    
+    df_confrontos = pd.DataFrame({
+        'Confronto': home_team + " x " + away_team,
+        'Placar': home_score.astype(str) + " x " + away_score.astype(str),
+        f'{team1}': team1_score.astype(str) + team1_condition,
+        f'{team2}': team2_score.astype(str) + team2_condition,
+        'Resultado': resultado,
+        'Odds': odds_info
+    })
     
     # Exibir resumo
     st.subheader("📈 Resumo dos Confrontos")
@@ -1861,33 +3811,186 @@ def show_direct_confrontation(df, teams):
     
     # Tabela detalhada
     st.subheader("📋 Detalhes dos Confrontos")
-    df_confrontos = pd.DataFrame(confrontos_display)
     st.dataframe(df_confrontos, use_container_width=True, hide_index=True)
     
     # Análise adicional se houver odds
-    odds_available = any(row['Odds'] for row in confrontos_display)
-    if odds_available:
+    if resumo['jogos_com_odds'] > 0:
         st.subheader("💰 Análise das Odds")
-        analyze_confronto_odds(confrontos, team1, team2)
-
-def analyze_confronto_odds(confrontos, team1, team2):
-    """Analisa as odds dos confrontos diretos"""
-    valid_odds = confrontos.dropna(subset=['odd Home', 'odd Draw', 'odd Away'])
+        analyze_confronto_odds(confrontos, team1, team2, resumo=resumo)
+
+def analyze_confronto_odds(confrontos, team1, team2, resumo=None):
+    """Analisa as odds dos confrontos diretos (usa as médias do índice de pares, se informado)"""
+    if resumo is None:
+        valid_odds = confrontos.dropna(subset=['odd Home', 'odd Draw', 'odd Away'])
+        resumo = {
+            'jogos_com_odds': len(valid_odds),
+            'media_odd_home': valid_odds['odd Home'].mean(),
+            'media_odd_draw': valid_odds['odd Draw'].mean(),
+            'media_odd_away': valid_odds['odd Away'].mean()
+        }
     
-    if valid_odds.empty:
+    if resumo['jogos_com_odds'] == 0:
         st.write("Dados de odds não disponíveis para análise.")
         return
     
-    st.write(f"**Jogos com odds disponíveis:** {len(valid_odds)}")
+    st.write(f"**Jogos com odds disponíveis:** {resumo['jogos_com_odds']}")
     
     # Estatísticas das odds
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Odd Mandante Média", f"{valid_odds['odd Home'].mean():.2f}")
+        st.metric("Odd Mandante Média", f"{resumo['media_odd_home']:.2f}")
     with col2:
-        st.metric("Odd Empate Média", f"{valid_odds['odd Draw'].mean():.2f}")
+        st.metric("Odd Empate Média", f"{resumo['media_odd_draw']:.2f}")
     with col3:
-        st.metric("Odd Visitante Média", f"{valid_odds['odd Away'].mean():.2f}")
+        st.metric("Odd Visitante Média", f"{resumo['media_odd_away']:.2f}")
+
+
+# ============================================================================
+# KERNEL VETORIZADO DE VALOR (ARRAYS -> SCORES E CÓDIGOS DE CLASSE)
+# ============================================================================
+
+# Força relativa pelo mercado: código -> (categoria, fator de confiança, descrição)
+CLASSES_FORCA = {
+    -1: ('Desconhecida', 1.0, 'Odd do adversário não fornecida'),
+    0: ('Underdog', 0.8, 'Time azarão pelo mercado'),  # Reduz confiança (mas não elimina valor!)
+    1: ('Equilibrado', 1.0, 'Jogo equilibrado segundo mercado'),
+    2: ('Favorito', 1.1, 'Time ligeiramente favorito'),
+    3: ('Dominante', 1.2, 'Time muito favorito pelo mercado'),  # Aumenta confiança em vitória
+}
+
+# Coerência do padrão de gols com a odd: código -> (fator, descrição)
+CLASSES_COERENCIA_GOLS = {
+    0: (1.0, 'Padrão de gols neutro'),
+    1: (1.1, 'Padrão ofensivo valida favoritismo'),
+    2: (0.95, 'Padrão ofensivo incomum para azarão'),
+    3: (1.05, 'Padrão defensivo coerente'),
+    4: (0.95, 'Padrão defensivo pode limitar vitória'),
+}
+
+# Classe de valor: código -> (classificação, confiança); -1 = sem histórico suficiente
+CLASSES_VALOR = {
+    -1: ('— Sem histórico', 'Nenhuma'),
+    0: ('🔴 Sem Valor', 'Nenhuma'),
+    1: ('⚪ Valor Marginal', 'Baixa'),
+    2: ('🟡 Valor Moderado', 'Média'),
+    3: ('🟢 Alto Valor', 'Alta'),
+}
+
+
+def _fatores_por_codigo(tabela, codigos, posicao=0):
+    """Converte códigos inteiros no valor numérico correspondente da tabela de classes"""
+    chaves = np.array(sorted(tabela))
+    valores = np.array([tabela[chave][posicao] for chave in chaves], dtype='float64')
+    return valores[np.searchsorted(chaves, codigos)]
+
+
+def codigo_forca_por_probabilidade(prob_time_norm):
+    """Código de CLASSES_FORCA (0 a 3) pela probabilidade do time normalizada entre os dois lados"""
+    prob_time_norm = np.asarray(prob_time_norm, dtype='float64')
+    return np.select([prob_time_norm >= 0.65, prob_time_norm >= 0.55, prob_time_norm >= 0.45], [3, 2, 1], 0)
+
+
+def codigo_forca_relativa(odd_time, odd_adversario):
+    """Código de CLASSES_FORCA pela probabilidade normalizada entre os dois lados (-1 sem odd do adversário)"""
+    odd_time = np.asarray(odd_time, dtype='float64')
+    odd_adversario = np.asarray(odd_adversario, dtype='float64')
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prob_time, prob_adversario = 1 / odd_time, 1 / odd_adversario
+        total = prob_time + prob_adversario
+        prob_time_norm = np.where(total > 0, prob_time / total, 0.5)
+    
+    return np.where(np.isnan(odd_adversario), -1, codigo_forca_por_probabilidade(prob_time_norm))
+
+
+def codigo_coerencia_gols(perc_over25_historico, odd_resultado):
+    """Código de CLASSES_COERENCIA_GOLS (ofensivo >= 65% de Over 2.5, defensivo <= 40%)"""
+    over = np.asarray(perc_over25_historico, dtype='float64')
+    odd = np.asarray(odd_resultado, dtype='float64')
+    return np.select(
+        [(over >= 65) & (odd < 2.0), over >= 65, (over <= 40) & (odd >= 3.0), over <= 40],
+        [1, 2, 3, 4], 0
+    )
+
+
+def componentes_value_score(value_gap, fator_forca, fator_forma, fator_gols, parametros=None):
+    """
+    Componentes ponderados do Value Score (arrays ou escalares).
+    
+    Value Gap limitado a +/-30 com peso 50%; fatores de força, forma e
+    coerência de gols (0.8 a 1.2) normalizados para +/-5 com pesos 20/20/10%
+    (pesos de PARAMETROS_MODELO, ou de parametros quando informado).
+    """
+    parametros = parametros or PARAMETROS_MODELO
+    return {
+        'value_gap': np.clip(value_gap, -30, 30) * parametros['peso_value_gap'],
+        'forca': (np.asarray(fator_forca) - 1.0) * 25 * parametros['peso_forca'],
+        'forma': (np.asarray(fator_forma) - 1.0) * 25 * parametros['peso_forma'],
+        'gols': (np.asarray(fator_gols) - 1.0) * 25 * parametros['peso_gols'],
+    }
+
+
+def classe_value_score(score):
+    """Código de CLASSES_VALOR pelos limites do Value Score (8 / 4 / 0); NaN -> -1"""
+    score = np.asarray(score, dtype='float64')
+    return np.select([np.isnan(score), score >= 8, score >= 4, score >= 0], [-1, 3, 2, 1], 0)
+
+
+def classe_gap_empate(value_gap):
+    """Código de CLASSES_VALOR para o empate, cujo critério é o próprio gap (10 / >5 / 0); NaN -> -1"""
+    value_gap = np.asarray(value_gap, dtype='float64')
+    return np.select([np.isnan(value_gap), value_gap >= 10, value_gap > 5, value_gap >= 0], [-1, 3, 2, 1], 0)
+
+
+def rotulos_classe_valor(codigos):
+    """Rótulos de exibição para um array de códigos de classe de valor"""
+    rotulos = np.array([CLASSES_VALOR[chave][0] for chave in sorted(CLASSES_VALOR)], dtype=object)
+    return rotulos[np.asarray(codigos) + 1]
+
+
+def kernel_value_score(perc_historica, odd, odd_adversario, fator_forma, perc_over_25, prob_justa=None,
+                       parametros=None):
+    """
+    Value Score de muitos candidatos de uma vez (mesma regra da análise individual).
+    
+    Args:
+        perc_historica: % de vitórias históricas na faixa de odd
+        odd: odd do resultado (a probabilidade implícita sai dela)
+        odd_adversario: odd do adversário (NaN = desconhecida, força neutra)
+        fator_forma: fator de forma recente (0.8 a 1.2)
+        perc_over_25: % de Over 2.5 na faixa
+        prob_justa: probabilidade sem margem (%) usada no value gap; sem ela, 1/odd
+        parametros: pesos do score (padrão: PARAMETROS_MODELO)
+    
+    Returns:
+        dict de arrays: 'prob_implicita', 'value_gap', 'score', 'classe' (códigos de
+        CLASSES_VALOR), 'forca' (códigos de CLASSES_FORCA) e 'coerencia' (códigos de
+        CLASSES_COERENCIA_GOLS)
+    """
+    odd = np.asarray(odd, dtype='float64')
+    prob_implicita = (1 / odd) * 100 if prob_justa is None else np.asarray(prob_justa, dtype='float64')
+    
+    value_gap = calcular_value_gap(np.asarray(perc_historica, dtype='float64'), prob_implicita)
+    forca = codigo_forca_relativa(odd, odd_adversario)
+    coerencia = codigo_coerencia_gols(perc_over_25, odd)
+    
+    componentes = componentes_value_score(
+        value_gap,
+        _fatores_por_codigo(CLASSES_FORCA, forca, 1),
+        fator_forma,
+        _fatores_por_codigo(CLASSES_COERENCIA_GOLS, coerencia),
+        parametros,
+    )
+    score = sum(componentes.values())
+    
+    return {
+        'prob_implicita': prob_implicita,
+        'value_gap': value_gap,
+        'score': score,
+        'classe': classe_value_score(score),
+        'forca': forca,
+        'coerencia': coerencia,
+    }
 
 
 def calcular_value_gap(prob_historica, prob_implicita):
@@ -1909,39 +4012,57 @@ def calcular_forca_relativa(odd_time, odd_adversario):
     Retorna:
         dict com: 'categoria', 'fator_confianca', 'descricao'
     """
-    # Probabilidades implícitas
-    prob_time = 1 / odd_time
-    prob_adversario = 1 / odd_adversario
-    
-    # Normaliza
-    total = prob_time + prob_adversario
-    prob_time_norm = prob_time / total if total > 0 else 0.5
+    categoria, fator, descricao = CLASSES_FORCA[int(codigo_forca_relativa(odd_time, odd_adversario))]
+    return {
+        'categoria': categoria,
+        'fator_confianca': fator,
+        'descricao': descricao
+    }
+
+
+def calcular_forca_relativa_elo(df, team, adversario, position):
+    """
+    Força relativa pelos ratings Elo (mesmas classes de calcular_forca_relativa).
     
-    # Classifica força relativa
-    if prob_time_norm >= 0.65:
-        return {
-            'categoria': 'Dominante',
-            'fator_confianca': 1.2,  # Aumenta confiança em vitória
-            'descricao': 'Time muito favorito pelo mercado'
-        }
-    elif prob_time_norm >= 0.55:
-        return {
-            'categoria': 'Favorito',
-            'fator_confianca': 1.1,
-            'descricao': 'Time ligeiramente favorito'
-        }
-    elif prob_time_norm >= 0.45:
-        return {
-            'categoria': 'Equilibrado',
-            'fator_confianca': 1.0,
-            'descricao': 'Jogo equilibrado segundo mercado'
-        }
+    Retorna:
+        dict com: 'categoria', 'fator_confianca', 'descricao', 'prob_elo',
+        'rating_time' e 'rating_adversario'
+    """
+    motor = motor_elo(df)
+    if position == "Home":
+        prob_elo = motor.probabilidade(team, adversario)
     else:
-        return {
-            'categoria': 'Underdog',
-            'fator_confianca': 0.8,  # Reduz confiança (mas não elimina valor!)
-            'descricao': 'Time azarão pelo mercado'
-        }
+        prob_elo = 1 - motor.probabilidade(adversario, team)
+    
+    categoria, fator, _ = CLASSES_FORCA[int(codigo_forca_por_probabilidade(prob_elo))]
+    return {
+        'categoria': categoria,
+        'fator_confianca': fator,
+        'descricao': f"Ratings Elo {motor.rating(team):.0f} x {motor.rating(adversario):.0f}",
+        'prob_elo': prob_elo,
+        'rating_time': motor.rating(team),
+        'rating_adversario': motor.rating(adversario)
+    }
+
+
+def fator_forma_recente(taxa_vitoria, saldo):
+    """
+    Fator de forma (0.8 a 1.2) pela taxa de vitórias e pelo saldo médio de gols recentes.
+    
+    Aceita escalares ou arrays (usado também no backtest).
+    """
+    taxa_vitoria = np.asarray(taxa_vitoria, dtype='float64')
+    saldo = np.asarray(saldo, dtype='float64')
+    
+    # Ajuste por taxa de vitória (+/- 0.15)
+    ajuste_vitorias = np.select(
+        [taxa_vitoria >= 0.8, taxa_vitoria >= 0.6, taxa_vitoria <= 0.2, taxa_vitoria <= 0.4],
+        [0.15, 0.08, -0.15, -0.08], 0.0
+    )
+    # Ajuste por saldo de gols (+/- 0.05)
+    ajuste_saldo = np.select([saldo >= 1.5, saldo <= -1.5], [0.05, -0.05], 0.0)
+    
+    return np.clip(1.0 + ajuste_vitorias + ajuste_saldo, 0.8, 1.2)
 
 
 def calcular_ajuste_forma_recente(df, team, position, ultimos_n=5):
@@ -1956,58 +4077,27 @@ def calcular_ajuste_forma_recente(df, team, position, ultimos_n=5):
     NÃO deve inverter decisões de valor claras, apenas ajustar.
     """
     try:
-        if position == "Home":
-            games = df[df['Home'] == team].copy()
-            gols_feitos_col = 'Gols Home'
-            gols_sofridos_col = 'Gols Away'
-        else:
-            games = df[df['Away'] == team].copy()
-            gols_feitos_col = 'Gols Away'
-            gols_sofridos_col = 'Gols Home'
+        venue = 'Home' if position == "Home" else 'Away'
+        motor = motor_forma(df)
         
-        if len(games) < ultimos_n:
+        if motor.jogos(team, venue) < ultimos_n:
             return {'fator': 1.0, 'descricao': 'Dados insuficientes'}
         
-        # Ordena por data (assumindo ordem cronológica ou coluna 'Data')
-        if 'Data' in games.columns:
-            games = games.sort_values('Data', ascending=False)
-        
-        recentes = games.head(ultimos_n)
+        # Últimos N jogos em ordem cronológica (Ano, Jogo ID)
+        recentes = motor.janela(team, venue, ultimos_n)
         
         # Calcula vitórias recentes
-        if position == "Home":
-            vitorias = len(recentes[recentes[gols_feitos_col] > recentes[gols_sofridos_col]])
-        else:
-            vitorias = len(recentes[recentes[gols_feitos_col] > recentes[gols_sofridos_col]])
+        vitorias = int(recentes['total_vitorias'])
         
         taxa_vitoria = vitorias / ultimos_n
         
         # Saldo de gols recente
-        gols_feitos = recentes[gols_feitos_col].mean()
-        gols_sofridos = recentes[gols_sofridos_col].mean()
+        gols_feitos = recentes['gols_feitos']
+        gols_sofridos = recentes['gols_sofridos']
         saldo = gols_feitos - gols_sofridos
         
         # Calcula fator (limitado entre 0.8 e 1.2)
-        fator_base = 1.0
-        
-        # Ajuste por taxa de vitória (+/- 0.1)
-        if taxa_vitoria >= 0.8:
-            fator_base += 0.15
-        elif taxa_vitoria >= 0.6:
-            fator_base += 0.08
-        elif taxa_vitoria <= 0.2:
-            fator_base -= 0.15
-        elif taxa_vitoria <= 0.4:
-            fator_base -= 0.08
-        
-        # Ajuste por saldo de gols (+/- 0.05)
-        if saldo >= 1.5:
-            fator_base += 0.05
-        elif saldo <= -1.5:
-            fator_base -= 0.05
-        
-        # Limita entre 0.8 e 1.2
-        fator_final = np.clip(fator_base, 0.8, 1.2)
+        fator_final = float(fator_forma_recente(taxa_vitoria, saldo))
         
         # Descrição
         if fator_final > 1.1:
@@ -2041,25 +4131,8 @@ def avaliar_coerencia_gols(perc_over25_historico, odd_resultado):
     
     Retorna fator de coerência (0.8 a 1.2)
     """
-    # Odd baixa = favorito esperado para ganhar com mais gols
-    # Odd alta = azarão, jogo tende a ser mais fechado
-    
-    if perc_over25_historico >= 65:
-        # Jogo ofensivo - favorece vitórias claras
-        if odd_resultado < 2.0:
-            return {'fator': 1.1, 'descricao': 'Padrão ofensivo valida favoritismo'}
-        else:
-            return {'fator': 0.95, 'descricao': 'Padrão ofensivo incomum para azarão'}
-    
-    elif perc_over25_historico <= 40:
-        # Jogo defensivo - favorece empates ou vitórias apertadas
-        if odd_resultado >= 3.0:
-            return {'fator': 1.05, 'descricao': 'Padrão defensivo coerente'}
-        else:
-            return {'fator': 0.95, 'descricao': 'Padrão defensivo pode limitar vitória'}
-    
-    else:
-        return {'fator': 1.0, 'descricao': 'Padrão de gols neutro'}
+    fator, descricao = CLASSES_COERENCIA_GOLS[int(codigo_coerencia_gols(perc_over25_historico, odd_resultado))]
+    return {'fator': fator, 'descricao': descricao}
 
 
 def calcular_value_score(value_gap, forca_relativa, forma_recente, coerencia_gols):
@@ -2072,56 +4145,25 @@ def calcular_value_score(value_gap, forca_relativa, forma_recente, coerencia_gol
         (Forma Recente × 0.20) +
         (Coerência Gols × 0.10)
     
+    Versão escalar de kernel_value_score, para a análise de um jogo.
+    
     Retorna:
         dict com: 'score', 'classificacao', 'confianca'
     """
-    
-    # Normaliza value gap para escala -100 a +100
-    value_gap_norm = np.clip(value_gap, -30, 30)
-    
-    # Componente 1: Value Gap (peso 50%)
-    componente_gap = value_gap_norm * 0.50
-    
-    # Componente 2: Força Relativa (peso 20%)
-    # forca_relativa['fator_confianca'] varia de 0.8 a 1.2
-    # Normaliza para -5 a +5
-    componente_forca = (forca_relativa['fator_confianca'] - 1.0) * 25 * 0.20
-    
-    # Componente 3: Forma Recente (peso 20%)
-    # forma_recente['fator'] varia de 0.8 a 1.2
-    # Normaliza para -5 a +5
-    componente_forma = (forma_recente['fator'] - 1.0) * 25 * 0.20
-    
-    # Componente 4: Coerência Gols (peso 10%)
-    componente_gols = (coerencia_gols['fator'] - 1.0) * 25 * 0.10
-    
-    # Score final
-    score = componente_gap + componente_forca + componente_forma + componente_gols
-    
-    # Classificação
-    if score >= 8:
-        classificacao = '🟢 Alto Valor'
-        confianca = 'Alta'
-    elif score >= 4:
-        classificacao = '🟡 Valor Moderado'
-        confianca = 'Média'
-    elif score >= 0:
-        classificacao = '⚪ Valor Marginal'
-        confianca = 'Baixa'
-    else:
-        classificacao = '🔴 Sem Valor'
-        confianca = 'Nenhuma'
+    componentes = componentes_value_score(
+        value_gap,
+        forca_relativa['fator_confianca'],
+        forma_recente['fator'],
+        coerencia_gols['fator']
+    )
+    score = float(sum(componentes.values()))
+    classificacao, confianca = CLASSES_VALOR[int(classe_value_score(score))]
     
     return {
         'score': score,
         'classificacao': classificacao,
         'confianca': confianca,
-        'componentes': {
-            'value_gap': componente_gap,
-            'forca': componente_forca,
-            'forma': componente_forma,
-            'gols': componente_gols
-        }
+        'componentes': {nome: float(valor) for nome, valor in componentes.items()}
     }
 
 
@@ -2129,56 +4171,38 @@ def calcular_value_score(value_gap, forca_relativa, forma_recente, coerencia_gol
 # FUNÇÃO DE ANÁLISE REFINADA - SUBSTITUI analyze_team_comprehensive
 # ============================================================================
 
-def analyze_team_comprehensive_refinado(df, team, position, current_odd, odd_adversario=None):
+def analyze_team_comprehensive_refinado(df, team, position, current_odd, odd_adversario=None, prob_justa=None,
+                                        adversario=None):
     """
     VERSÃO REFINADA da análise de time.
     
     Mantém mesma assinatura, mas adiciona:
-    - Value Gap como métrica principal
+    - Value Gap como métrica principal (contra prob_justa, a probabilidade
+      sem margem em %, quando informada; senão contra 1/odd)
     - Análise condicional ao mando
-    - Força relativa via odd do adversário
+    - Força relativa via odd do adversário (ou pelos ratings Elo, se só o adversário for informado)
     - Forma recente como ajuste
     - Value Score composto
     """
     
-    # Filtra jogos por posição (CONDICIONAL AO MANDO)
-    if position == "Home":
-        games = df[df['Home'] == team].copy()
-        odd_col = 'odd Home'
-        gols_feitos = 'Gols Home'
-        gols_sofridos = 'Gols Away'
-    else:
-        games = df[df['Away'] == team].copy()
-        odd_col = 'odd Away'
-        gols_feitos = 'Gols Away'
-        gols_sofridos = 'Gols Home'
+    # Jogos do time no mando (CONDICIONAL AO MANDO)
+    venue = 'Home' if position == "Home" else 'Away'
+    odd_col = 'odd Home' if position == "Home" else 'odd Away'
     
     # Validação básica
-    if games.empty or len(games) < 10:
+    if len(indice_partidas(df).posicoes(team, venue)) < 10:
         return {"error": "Dados insuficientes para análise"}
     
-    required_cols = [odd_col, gols_feitos, gols_sofridos]
-    missing_cols = [col for col in required_cols if col not in games.columns]
+    missing_cols = [col for col in [odd_col, 'Gols Home', 'Gols Away'] if col not in df.columns]
     if missing_cols:
         return {"error": f"Colunas não encontradas: {missing_cols}"}
     
-    games = games.dropna(subset=required_cols)
-    
-    # Calcula resultado
-    if position == "Home":
-        games['Resultado'] = games.apply(lambda row: 
-            'Vitoria' if row[gols_feitos] > row[gols_sofridos] else
-            'Empate' if row[gols_feitos] == row[gols_sofridos] else
-            'Derrota', axis=1)
-    else:
-        games['Resultado'] = games.apply(lambda row: 
-            'Vitoria' if row[gols_feitos] > row[gols_sofridos] else
-            'Empate' if row[gols_feitos] == row[gols_sofridos] else
-            'Derrota', axis=1)
-    
     # ========== CÁLCULO DE FORÇA RELATIVA ==========
+    forca_elo = calcular_forca_relativa_elo(df, team, adversario, position) if adversario else None
     if odd_adversario:
         forca_relativa = calcular_forca_relativa(current_odd, odd_adversario)
+    elif forca_elo:
+        forca_relativa = forca_elo
     else:
         forca_relativa = {
             'categoria': 'Desconhecida',
@@ -2189,33 +4213,32 @@ def analyze_team_comprehensive_refinado(df, team, position, current_odd, odd_adv
     # ========== CÁLCULO DE FORMA RECENTE ==========
     forma_recente = calcular_ajuste_forma_recente(df, team, position, ultimos_n=5)
     
-    # Categorização por odds (mantém lógica original)
-    faixas_odds = categorize_odds(games, odd_col, current_odd)
+    # Contagens por faixa de odds (cubo pré-calculado por DataFrame)
+    faixas_odds = estatisticas_faixas_odds(df, team, position)
     
     # Análise detalhada por faixa
     resultados = []
-    for categoria, filtro_games in faixas_odds.items():
-        if len(filtro_games) >= 3:
-            total = len(filtro_games)
-            vitorias = len(filtro_games[filtro_games['Resultado'] == 'Vitoria'])
-            empates = len(filtro_games[filtro_games['Resultado'] == 'Empate'])
-            derrotas = len(filtro_games[filtro_games['Resultado'] == 'Derrota'])
+    for categoria, faixa in faixas_odds.items():
+        if faixa['total'] >= 3:
+            total = faixa['total']
+            vitorias = faixa['vitorias']
+            empates = faixa['empates']
+            derrotas = faixa['derrotas']
             
             perc_vitoria = (vitorias / total) * 100
             perc_empate = (empates / total) * 100
             perc_derrota = (derrotas / total) * 100
             
             # Análise de gols
-            filtro_games['Total_Gols'] = filtro_games[gols_feitos] + filtro_games[gols_sofridos]
-            over_15 = len(filtro_games[filtro_games['Total_Gols'] > 1.5])
-            over_25 = len(filtro_games[filtro_games['Total_Gols'] > 2.5])
+            over_15 = faixa['over_15']
+            over_25 = faixa['over_25']
             under_25 = total - over_25
             
             perc_over_25 = (over_25 / total) * 100
             
             # ========== NOVA LÓGICA: VALUE SCORE ==========
-            # Probabilidade implícita da odd atual
-            prob_implicita = (1 / current_odd) * 100
+            # Probabilidade implícita da odd atual (sem a margem da casa, se disponível)
+            prob_implicita = prob_justa if prob_justa is not None else (1 / current_odd) * 100
             
             # Value Gap
             value_gap = calcular_value_gap(perc_vitoria, prob_implicita)
@@ -2232,7 +4255,7 @@ def analyze_team_comprehensive_refinado(df, team, position, current_odd, odd_adv
             )
             
             # Odd média da faixa
-            odd_media = filtro_games[odd_col].mean()
+            odd_media = faixa['odd_media']
             
             # Verifica se é faixa atual
             is_current = is_current_range(current_odd, categoria)
@@ -2263,6 +4286,7 @@ def analyze_team_comprehensive_refinado(df, team, position, current_odd, odd_adv
         'resultados': resultados,
         # ========== NOVOS CAMPOS ==========
         'forca_relativa': forca_relativa,
+        'forca_elo': forca_elo,
         'forma_recente': forma_recente,
         'position': position  # Adiciona para contexto
     }
@@ -2272,34 +4296,802 @@ def analyze_team_comprehensive_refinado(df, team, position, current_odd, odd_adv
 # FUNÇÕES AUXILIARES ORIGINAIS (MANTIDAS PARA COMPATIBILIDADE)
 # ============================================================================
 
-def categorize_odds(games, odd_col, current_odd):
-    """Categoriza jogos por faixas de odds - MANTIDA DO ORIGINAL"""
-    faixas = {
-        'Forte Favorito': games[games[odd_col] <= 1.5],
-        'Favorito': games[(games[odd_col] > 1.5) & (games[odd_col] <= 2.0)],
-        'Leve Favorito': games[(games[odd_col] > 2.0) & (games[odd_col] <= 2.5)],
-        'Equilibrado': games[(games[odd_col] > 2.5) & (games[odd_col] <= 3.5)],
-        'Azarão Leve': games[(games[odd_col] > 3.5) & (games[odd_col] <= 5.0)],
-        'Azarão Forte': games[games[odd_col] > 5.0]
+# Faixas de odds do time (limites superiores inclusivos: odd <= 1.5, 1.5 < odd <= 2.0, ...)
+FAIXAS_ODDS = ['Forte Favorito', 'Favorito', 'Leve Favorito', 'Equilibrado', 'Azarão Leve', 'Azarão Forte']
+LIMITES_FAIXAS_ODDS = np.array(PARAMETROS_MODELO['limites_faixas_odds'])
+
+
+def faixa_das_odds(odds, limites=None):
+    """Índice da faixa (0..5) de cada odd; -1 para odd ausente"""
+    odds = np.asarray(odds, dtype='float64')
+    faixas = np.digitize(odds, LIMITES_FAIXAS_ODDS if limites is None else limites, right=True)
+    return np.where(np.isnan(odds), -1, faixas)
+
+
+def is_current_range(current_odd, categoria):
+    """Verifica se a odd atual está na faixa da categoria"""
+    if categoria not in FAIXAS_ODDS:
+        return False
+    return current_odd > 0 and int(faixa_das_odds([current_odd])[0]) == FAIXAS_ODDS.index(categoria)
+
+
+def _construir_cubo_faixas_odds(df):
+    """
+    Contagens time x mando x faixa de odd, com um digitize e um bincount por estatística.
+    
+    Cada jogo entra duas vezes: pelo mandante (odd Home) e pelo visitante (odd Away),
+    sempre com o resultado na perspectiva do time.
+    
+    Returns:
+        dict com 'times' ({nome: índice}) e arrays (times, 2, 6) para 'jogos',
+        'vitorias', 'empates', 'derrotas', 'over_15', 'over_25' e 'soma_odds'
+        (lado 0 = mandante, 1 = visitante)
+    """
+    codigos_home, codigos_away, nomes = _codigos_lados(df)
+    n_times, n_faixas = len(nomes), len(FAIXAS_ODDS)
+    
+    odds = np.concatenate([_coluna_float(df, 'odd Home'), _coluna_float(df, 'odd Away')])
+    gols_home, gols_away = _coluna_float(df, 'Gols Home'), _coluna_float(df, 'Gols Away')
+    codigo = np.sign(gols_home - gols_away)
+    resultado = np.concatenate([codigo, -codigo])
+    total_gols = np.tile(gols_home + gols_away, 2)
+    
+    faixa = faixa_das_odds(odds)
+    validos = (faixa >= 0) & ~np.isnan(resultado)
+    grupo = (np.concatenate([codigos_home * 2, codigos_away * 2 + 1]) * n_faixas + faixa)[validos]
+    
+    estatisticas = {
+        'jogos': np.ones(len(odds)),
+        'vitorias': resultado == 1,
+        'empates': resultado == 0,
+        'derrotas': resultado == -1,
+        'over_15': total_gols > 1.5,
+        'over_25': total_gols > 2.5,
+        'soma_odds': odds,
     }
+    
+    cubo = {'times': {nome: i for i, nome in enumerate(nomes)}}
+    # Total de jogos do time no mando (com ou sem odd), usado no mínimo de 10 jogos
+    cubo['jogos_mando'] = np.bincount(np.concatenate([codigos_home * 2, codigos_away * 2 + 1]),
+                                      minlength=n_times * 2).reshape(n_times, 2)
+    for nome, valores in estatisticas.items():
+        contagem = np.bincount(grupo, weights=np.asarray(valores, dtype='float64')[validos],
+                               minlength=n_times * 2 * n_faixas)
+        cubo[nome] = contagem.reshape(n_times, 2, n_faixas)
+    return cubo
+
+
+def cubo_faixas_odds(df):
+    """Cubo de contagens por faixa de odds (construído uma única vez por DataFrame)"""
+    return _artefato_do_frame(df, 'cubo_faixas_odds', _construir_cubo_faixas_odds)
+
+
+def estatisticas_faixas_odds(df, team, position):
+    """
+    Contagens por faixa de odd do time no mando ('Home' ou 'Away').
+    
+    Returns:
+        dict {categoria: {'total', 'vitorias', 'empates', 'derrotas', 'over_15',
+        'over_25', 'odd_media'}} com todas as 6 faixas, ou None se o time não existir
+    """
+    cubo = cubo_faixas_odds(df)
+    indice = cubo['times'].get(str(team))
+    if indice is None:
+        return None
+    
+    lado = 0 if position == "Home" else 1
+    faixas = {}
+    for i, categoria in enumerate(FAIXAS_ODDS):
+        total = int(cubo['jogos'][indice, lado, i])
+        faixas[categoria] = {
+            'total': total,
+            'vitorias': int(cubo['vitorias'][indice, lado, i]),
+            'empates': int(cubo['empates'][indice, lado, i]),
+            'derrotas': int(cubo['derrotas'][indice, lado, i]),
+            'over_15': int(cubo['over_15'][indice, lado, i]),
+            'over_25': int(cubo['over_25'][indice, lado, i]),
+            'odd_media': cubo['soma_odds'][indice, lado, i] / total if total else np.nan,
+        }
     return faixas
 
 
-def is_current_range(current_odd, categoria):
-    """Verifica se a odd atual está na faixa da categoria - MANTIDA DO ORIGINAL"""
-    ranges = {
-        'Forte Favorito': (0, 1.5),
-        'Favorito': (1.5, 2.0),
-        'Leve Favorito': (2.0, 2.5),
-        'Equilibrado': (2.5, 3.5),
-        'Azarão Leve': (3.5, 5.0),
-        'Azarão Forte': (5.0, float('inf'))
+# ============================================================================
+# TRIAGEM DE VALOR EM LOTE (RODADA INTEIRA A PARTIR DE UM CSV DE JOGOS)
+# ============================================================================
+
+COLUNAS_TRIAGEM = ['Home', 'Away', 'odd Home', 'odd Draw', 'odd Away']
+
+
+def _fatores_forma_times(df):
+    """Fator de forma recente (calcular_ajuste_forma_recente) de cada time e mando, calculado uma vez"""
+    fatores = {}
+    for time in cubo_faixas_odds(df)['times']:
+        for position in ("Home", "Away"):
+            fatores[(time, position)] = calcular_ajuste_forma_recente(df, time, position, ultimos_n=5)['fator']
+    return fatores
+
+
+def ler_jogos_triagem(arquivo):
+    """
+    Lê o CSV de jogos a analisar (separador detectado automaticamente).
+    
+    Colunas obrigatórias: Home, Away, odd Home, odd Draw, odd Away. Nomes de
+    times passam pela mesma resolução de aliases do carregamento e odds aceitam
+    vírgula decimal.
+    """
+    jogos = pd.read_csv(arquivo, sep=None, engine='python', encoding='utf-8-sig')
+    jogos.columns = [str(col).strip() for col in jogos.columns]
+    
+    faltando = [col for col in COLUNAS_TRIAGEM if col not in jogos.columns]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(faltando)}")
+    
+    jogos = jogos[COLUNAS_TRIAGEM].dropna(subset=['Home', 'Away']).copy()
+    jogos['Home'] = jogos['Home'].map(canonicalizar_time)
+    jogos['Away'] = jogos['Away'].map(canonicalizar_time)
+    for col in ['odd Home', 'odd Draw', 'odd Away']:
+        jogos[col] = pd.to_numeric(jogos[col].astype(str).str.replace(',', '.'), errors='coerce')
+    
+    return jogos.reset_index(drop=True)
+
+
+def triagem_valor_lote(df, jogos, metodo=METODO_DEVIG_PADRAO):
+    """
+    Calcula o valor de mandante, empate e visitante de todos os jogos de uma vez.
+    
+    Usa os mesmos critérios da análise individual (faixas de odds, mínimo de 10
+    jogos no mando e 3 na faixa, forma recente, força relativa e coerência de
+    gols), lendo os cubos pré-calculados em vez de filtrar o DataFrame por jogo.
+    Os value gaps comparam com as probabilidades sem margem (método de de-vig).
+    
+    O Value Score do empate é o próprio value gap (como na análise individual),
+    em outra escala que o score composto de mandante e visitante; por isso o
+    ranking e as classes são sempre por mercado.
+    
+    Returns:
+        DataFrame com uma linha por (jogo, mercado), ordenado por mercado e,
+        dentro de cada um, pelo Value Score
+    """
+    cubo = cubo_faixas_odds(df)
+    empates = cubo_faixas_empate(df)
+    fatores_forma = _artefato_do_frame(df, 'fatores_forma_times', _fatores_forma_times)
+    
+    nomes = pd.Index(list(cubo['times']))
+    idx_home = nomes.get_indexer(jogos['Home'])
+    idx_away = nomes.get_indexer(jogos['Away'])
+    conhecidos = (idx_home >= 0) & (idx_away >= 0)
+    h, a = np.where(conhecidos, idx_home, 0), np.where(conhecidos, idx_away, 0)
+    
+    odd_home = jogos['odd Home'].to_numpy(dtype='float64')
+    odd_draw = jogos['odd Draw'].to_numpy(dtype='float64')
+    odd_away = jogos['odd Away'].to_numpy(dtype='float64')
+    odds_validas = (odd_home > 1) & (odd_draw > 1) & (odd_away > 1)
+    justas = probabilidades_justas(np.column_stack([odd_home, odd_draw, odd_away]), metodo) * 100
+    
+    def lado_vitoria(indices, lado, odd, odd_adversario, prob_justa, times, position):
+        faixa = np.clip(faixa_das_odds(odd), 0, len(FAIXAS_ODDS) - 1)
+        total = cubo['jogos'][indices, lado, faixa]
+        com_historico = (conhecidos & odds_validas & (total >= 3) &
+                         (cubo['jogos_mando'][indices, lado] >= 10))
+        
+        divisor = np.where(total > 0, total, 1)
+        perc_vitoria = cubo['vitorias'][indices, lado, faixa] / divisor * 100
+        perc_over_25 = cubo['over_25'][indices, lado, faixa] / divisor * 100
+        fator_forma = np.array([fatores_forma.get((time, position), 1.0) for time in times])
+        
+        valor = kernel_value_score(perc_vitoria, odd, odd_adversario, fator_forma, perc_over_25, prob_justa)
+        return (np.where(com_historico, perc_vitoria, np.nan), np.where(com_historico, valor['value_gap'], np.nan),
+                np.where(com_historico, valor['score'], np.nan), np.where(com_historico, valor['classe'], -1),
+                np.where(com_historico, total, 0))
+    
+    casa = lado_vitoria(h, 0, odd_home, odd_away, justas[:, 0], jogos['Home'], "Home")
+    fora = lado_vitoria(a, 1, odd_away, odd_home, justas[:, 2], jogos['Away'], "Away")
+    
+    # Empate: soma das contagens do mandante em casa e do visitante fora (mesma faixa)
+    faixa_empate = np.clip(faixa_odd_empate(odd_draw), 0, len(FAIXAS_EMPATE) - 1)
+    total_empate = empates['jogos'][h, 0, faixa_empate] + empates['jogos'][a, 1, faixa_empate]
+    qtd_empates = empates['empates'][h, 0, faixa_empate] + empates['empates'][a, 1, faixa_empate]
+    jogos_base = empates['jogos_mando'][h, 0] + empates['jogos_mando'][a, 1]
+    com_historico = conhecidos & odds_validas & (total_empate >= 3) & (jogos_base >= 10)
+    perc_empate = np.where(com_historico, qtd_empates / np.where(total_empate > 0, total_empate, 1) * 100, np.nan)
+    gap_empate = perc_empate - justas[:, 1]
+    # Para o empate o critério de valor é o próprio gap (ver display_final_recommendations_refinado)
+    classe_empate = classe_gap_empate(gap_empate)
+    
+    confronto = (jogos['Home'] + " x " + jogos['Away']).to_numpy()
+    blocos = [
+        ('🏠 Mandante', odd_home, justas[:, 0], *casa),
+        ('🤝 Empate', odd_draw, justas[:, 1], perc_empate, gap_empate, gap_empate, classe_empate,
+         np.where(com_historico, total_empate, 0)),
+        ('✈️ Visitante', odd_away, justas[:, 2], *fora),
+    ]
+    
+    tabela = pd.concat([
+        pd.DataFrame({
+            'Jogo': confronto,
+            'Mercado': mercado,
+            'Odd': odd,
+            'Prob. Histórica (%)': historica,
+            'Prob. Justa (%)': prob_mercado,
+            'Value Gap (%)': gap,
+            'Value Score': score,
+            'Classificação': rotulos_classe_valor(classe),
+            'Jogos na Faixa': amostra.astype(int),
+        })
+        for mercado, odd, prob_mercado, historica, gap, score, classe, amostra in blocos
+    ], ignore_index=True)
+    
+    ordem_mercados = {bloco[0]: i for i, bloco in enumerate(blocos)}
+    tabela = tabela.sort_values('Value Score', ascending=False, na_position='last', kind='stable')
+    return tabela.sort_values('Mercado', key=lambda mercado: mercado.map(ordem_mercados),
+                              kind='stable').reset_index(drop=True)
+
+
+def display_batch_value_screener(df, metodo_devig=METODO_DEVIG_PADRAO):
+    """Expander da triagem em lote: upload do CSV de jogos e ranking de valor"""
+    with st.expander("📥 Triagem em Lote - vários jogos de uma vez (CSV)"):
+        st.caption("Envie um CSV com as colunas Home, Away, odd Home, odd Draw e odd Away "
+                   "(separador ';' ou ','). Cada jogo é avaliado com os mesmos critérios "
+                   "da análise individual, sobre o período filtrado. O ranking é por mercado: "
+                   "no empate o Value Score é o próprio value gap.")
+        
+        arquivo = st.file_uploader("CSV de jogos", type=['csv', 'txt'], key="triagem_lote_csv")
+        if arquivo is None:
+            return
+        
+        try:
+            jogos = ler_jogos_triagem(arquivo)
+        except Exception as e:
+            st.error(f"⚠ Não foi possível ler o arquivo: {e}")
+            return
+        
+        if jogos.empty:
+            st.warning("Nenhum jogo encontrado no arquivo.")
+            return
+        
+        desconhecidos = sorted((set(jogos['Home']) | set(jogos['Away'])) - set(cubo_faixas_odds(df)['times']))
+        if desconhecidos:
+            st.warning(f"Times sem histórico no período: {', '.join(desconhecidos)}")
+        
+        tabela = triagem_valor_lote(df, jogos, metodo_devig)
+        
+        apenas_valor = st.checkbox("Mostrar apenas oportunidades (Valor Moderado ou Alto Valor)",
+                                   value=False, key="triagem_lote_filtro")
+        if apenas_valor:
+            # A classe já usa os limites de cada mercado (score >= 4; gap de empate > 5)
+            tabela = tabela[tabela['Classificação'].isin([CLASSES_VALOR[3][0], CLASSES_VALOR[2][0]])]
+        
+        st.write(f"**{len(jogos)} jogos avaliados** | {len(tabela)} linhas exibidas")
+        st.dataframe(
+            tabela.style.format({
+                'Odd': '{:.2f}', 'Prob. Histórica (%)': '{:.1f}', 'Prob. Justa (%)': '{:.1f}',
+                'Value Gap (%)': '{:+.1f}', 'Value Score': '{:.1f}'
+            }, na_rep='—'),
+            use_container_width=True, hide_index=True
+        )
+        st.download_button(
+            "⬇️ Baixar ranking (CSV)",
+            tabela.to_csv(index=False, sep=';').encode('utf-8'),
+            file_name="triagem_valor.csv",
+            mime="text/csv",
+            key="triagem_lote_download"
+        )
+
+
+# ============================================================================
+# BACKTEST WALK-FORWARD DO VALUE SCORE
+# ============================================================================
+
+MERCADOS_BACKTEST = ['🏠 Mandante', '🤝 Empate', '✈️ Visitante']
+
+
+def _executar_backtest(df, parametros=None, metodo_devig=METODO_DEVIG_PADRAO):
+    """
+    Reproduz o histórico em ordem (Ano, Jogo ID) avaliando cada jogo só com os anteriores.
+    
+    O estado é incremental: contagens por faixa de odd (vitórias, Over 2.5, empates)
+    e jogos no mando são atualizados depois de cada jogo, e a forma recente sai do
+    MotorForma com corte antes do jogo. As regras são as da análise individual
+    (mínimo de 10 jogos no mando e 3 na faixa) e o score vem de kernel_value_score.
+    parametros (opcional) troca os limites das faixas e os pesos do score e
+    metodo_devig escolhe a remoção de margem usada nos value gaps.
+    
+    Returns:
+        DataFrame com uma linha por (jogo, mercado) avaliado: Ano, Jogo ID, Jogo,
+        Mercado, Odd, Value Gap, Value Score, Classe (código de CLASSES_VALOR),
+        Acerto e Lucro (stake de 1 unidade)
+    """
+    ordem = np.lexsort((_coluna_float(df, 'Jogo ID'), _coluna_float(df, 'Ano')))
+    codigos_home, codigos_away, nomes = _codigos_lados(df)
+    codigos_home, codigos_away = codigos_home[ordem], codigos_away[ordem]
+    n_jogos, n_times = len(ordem), len(nomes)
+    
+    anos = _coluna_float(df, 'Ano')[ordem]
+    jogo_ids = _coluna_float(df, 'Jogo ID')[ordem]
+    odds = np.column_stack([_coluna_float(df, col)[ordem] for col in COLUNAS_ODDS_1X2])
+    # As colunas de probabilidade justa do carregamento usam o método padrão
+    if metodo_devig == METODO_DEVIG_PADRAO and all(col in df.columns for col in COLUNAS_PROB_JUSTA):
+        justas = np.column_stack([_coluna_float(df, col)[ordem] for col in COLUNAS_PROB_JUSTA]) * 100
+    else:
+        justas = probabilidades_justas(odds, metodo_devig) * 100
+    codigo = np.sign(_coluna_float(df, 'Gols Home') - _coluna_float(df, 'Gols Away'))[ordem]
+    over_25 = (_coluna_float(df, 'Gols Home') + _coluna_float(df, 'Gols Away') > 2.5)[ordem]
+    
+    limites = None if parametros is None else parametros['limites_faixas_odds']
+    faixas = np.column_stack([faixa_das_odds(odds[:, 0], limites), faixa_odd_empate(odds[:, 1]),
+                              faixa_das_odds(odds[:, 2], limites)])
+    
+    # Estado incremental: [time, lado (0 mandante / 1 visitante), faixa]
+    jogos_mando = np.zeros((n_times, 2), dtype='int64')
+    jogos_faixa = np.zeros((n_times, 2, len(FAIXAS_ODDS)), dtype='int64')
+    vitorias_faixa = np.zeros_like(jogos_faixa)
+    over_faixa = np.zeros_like(jogos_faixa)
+    jogos_faixa_empate = np.zeros((n_times, 2, len(FAIXAS_EMPATE)), dtype='int64')
+    empates_faixa = np.zeros_like(jogos_faixa_empate)
+    
+    # Entradas do kernel por (jogo, lado); NaN = sem histórico suficiente
+    perc_vitoria = np.full((n_jogos, 2), np.nan)
+    perc_over = np.full((n_jogos, 2), np.nan)
+    fator_forma = np.ones((n_jogos, 2))
+    perc_empate = np.full(n_jogos, np.nan)
+    
+    motor = motor_forma(df)
+    
+    for i in range(n_jogos):
+        times = (codigos_home[i], codigos_away[i])
+        antes_de = (anos[i], jogo_ids[i] if not np.isnan(jogo_ids[i]) else 0)
+        
+        for lado, faixa in ((0, faixas[i, 0]), (1, faixas[i, 2])):
+            t = times[lado]
+            if faixa >= 0 and jogos_mando[t, lado] >= 10 and jogos_faixa[t, lado, faixa] >= 3:
+                total = jogos_faixa[t, lado, faixa]
+                perc_vitoria[i, lado] = vitorias_faixa[t, lado, faixa] / total * 100
+                perc_over[i, lado] = over_faixa[t, lado, faixa] / total * 100
+                
+                venue = 'Home' if lado == 0 else 'Away'
+                if motor.jogos(nomes[t], venue, antes_de) >= 5:
+                    recentes = motor.janela(nomes[t], venue, 5, antes_de)
+                    fator_forma[i, lado] = fator_forma_recente(
+                        recentes['total_vitorias'] / 5, recentes['gols_feitos'] - recentes['gols_sofridos'])
+        
+        faixa = faixas[i, 1]
+        if faixa >= 0 and jogos_mando[times[0], 0] + jogos_mando[times[1], 1] >= 10:
+            total = jogos_faixa_empate[times[0], 0, faixa] + jogos_faixa_empate[times[1], 1, faixa]
+            if total >= 3:
+                perc_empate[i] = (empates_faixa[times[0], 0, faixa] + empates_faixa[times[1], 1, faixa]) / total * 100
+        
+        # Atualiza o estado com o resultado do jogo (só depois de avaliá-lo)
+        for lado in (0, 1):
+            t = times[lado]
+            jogos_mando[t, lado] += 1
+            faixa = faixas[i, 2 * lado]
+            if faixa >= 0:
+                jogos_faixa[t, lado, faixa] += 1
+                vitorias_faixa[t, lado, faixa] += codigo[i] == (1 if lado == 0 else -1)
+                over_faixa[t, lado, faixa] += over_25[i]
+            if faixas[i, 1] >= 0:
+                jogos_faixa_empate[t, lado, faixas[i, 1]] += 1
+                empates_faixa[t, lado, faixas[i, 1]] += codigo[i] == 0
+    
+    # Score de todos os candidatos de uma vez
+    casa = kernel_value_score(perc_vitoria[:, 0], odds[:, 0], odds[:, 2], fator_forma[:, 0], perc_over[:, 0],
+                              justas[:, 0], parametros)
+    fora = kernel_value_score(perc_vitoria[:, 1], odds[:, 2], odds[:, 0], fator_forma[:, 1], perc_over[:, 1],
+                              justas[:, 2], parametros)
+    gap_empate = perc_empate - justas[:, 1]
+    
+    home = np.asarray(nomes, dtype=object)[codigos_home]
+    away = np.asarray(nomes, dtype=object)[codigos_away]
+    blocos = [
+        (MERCADOS_BACKTEST[0], odds[:, 0], casa['value_gap'], casa['score'], casa['classe'], codigo == 1),
+        (MERCADOS_BACKTEST[1], odds[:, 1], gap_empate, gap_empate, classe_gap_empate(gap_empate), codigo == 0),
+        (MERCADOS_BACKTEST[2], odds[:, 2], fora['value_gap'], fora['score'], fora['classe'], codigo == -1),
+    ]
+    
+    apostas = pd.concat([
+        pd.DataFrame({
+            'Ano': anos.astype(int),
+            'Jogo ID': jogo_ids,
+            'Jogo': home + " x " + away,
+            'Mercado': mercado,
+            'Odd': odd,
+            'Value Gap': gap,
+            'Value Score': score,
+            'Classe': np.where(np.isnan(score), -1, classe),
+            'Acerto': acerto,
+            'Lucro': np.where(acerto, odd - 1, -1.0),
+        })
+        for mercado, odd, gap, score, classe, acerto in blocos
+    ], ignore_index=True)
+    
+    apostas = apostas[apostas['Classe'] >= 0]
+    return apostas.sort_values(['Ano', 'Jogo ID'], kind='stable').reset_index(drop=True)
+
+
+def backtest_value_score(df, classe_minima=2, metodo_devig=METODO_DEVIG_PADRAO):
+    """
+    Resultado do backtest apostando 1 unidade em cada mercado com classe >= classe_minima.
+    
+    Args:
+        classe_minima: código de CLASSES_VALOR (2 = Valor Moderado, como nas recomendações)
+        metodo_devig: chave de METODOS_DEVIG usada nos value gaps (um backtest por método)
+    
+    Returns:
+        dict com 'resumo' (apostas, acertos, lucro, roi, taxa_acerto, drawdown_maximo),
+        'por_classe' e 'por_mercado' (DataFrames com apostas, acertos, lucro e yield),
+        'curva' (lucro acumulado por aposta, em ordem cronológica) e 'avaliados'
+        (quantidade de mercados com histórico suficiente)
+    """
+    avaliados = _artefato_do_frame(df, f'backtest_value_score|{metodo_devig}',
+                                   lambda dados: _executar_backtest(dados, metodo_devig=metodo_devig))
+    apostas = avaliados[avaliados['Classe'] >= classe_minima]
+    
+    curva = apostas['Lucro'].cumsum().to_numpy()
+    drawdown = float(np.max(np.maximum.accumulate(np.concatenate([[0.0], curva]))[1:] - curva)) if len(curva) else 0.0
+    
+    def agrupar(chave, dados):
+        grupos = dados.groupby(chave, sort=True).agg(
+            Apostas=('Lucro', 'size'), Acertos=('Acerto', 'sum'), Lucro=('Lucro', 'sum'), **{'Odd Média': ('Odd', 'mean')})
+        grupos['Taxa de Acerto (%)'] = grupos['Acertos'] / grupos['Apostas'] * 100
+        grupos['Yield (%)'] = grupos['Lucro'] / grupos['Apostas'] * 100
+        return grupos.reset_index()
+    
+    # Por classe: todas as classes avaliadas, para comparar a separação entre elas
+    por_classe = agrupar('Classe', avaliados).sort_values('Classe', ascending=False)
+    por_classe['Classe'] = rotulos_classe_valor(por_classe['Classe'])
+    
+    n_apostas = len(apostas)
+    lucro = float(apostas['Lucro'].sum())
+    return {
+        'resumo': {
+            'apostas': n_apostas,
+            'acertos': int(apostas['Acerto'].sum()),
+            'lucro': lucro,
+            'roi': lucro / n_apostas * 100 if n_apostas else 0.0,
+            'taxa_acerto': apostas['Acerto'].mean() * 100 if n_apostas else 0.0,
+            'drawdown_maximo': drawdown,
+        },
+        'por_classe': por_classe,
+        'por_mercado': agrupar('Mercado', apostas) if n_apostas else pd.DataFrame(),
+        'curva': curva,
+        'avaliados': len(avaliados),
+    }
+
+
+def display_value_backtest(df, metodo_devig=METODO_DEVIG_PADRAO):
+    """Expander do backtest: desempenho histórico das classificações de valor"""
+    with st.expander("📈 Backtest do Value Score (walk-forward)"):
+        st.caption("Cada jogo do período filtrado é avaliado apenas com os jogos anteriores, "
+                   "nas odds registradas, e aposta 1 unidade nos mercados que atingem a classe mínima. "
+                   f"Margem removida pelo método: {METODOS_DEVIG[metodo_devig]}.")
+        
+        opcoes = {CLASSES_VALOR[codigo][0]: codigo for codigo in (3, 2, 1, 0)}
+        rotulo = st.selectbox("Classe mínima para apostar", list(opcoes), index=1, key="backtest_classe_minima")
+        resultado = backtest_value_score(df, opcoes[rotulo], metodo_devig)
+        resumo = resultado['resumo']
+        
+        if resultado['avaliados'] == 0:
+            st.warning("Histórico insuficiente no período para o backtest.")
+            return
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Apostas", resumo['apostas'])
+        with col2:
+            st.metric("Taxa de Acerto", f"{resumo['taxa_acerto']:.1f}%")
+        with col3:
+            st.metric("ROI", f"{resumo['roi']:+.1f}%", delta=f"{resumo['lucro']:+.2f} u")
+        with col4:
+            st.metric("Drawdown Máximo", f"{resumo['drawdown_maximo']:.2f} u")
+        
+        if resumo['apostas'] > 0:
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(
+                y=resultado['curva'], mode='lines', name='Lucro acumulado',
+                line=dict(color='#2E86AB', width=2)
+            ))
+            fig.add_hline(y=0, line_dash="dash", line_color="gray")
+            fig.update_layout(
+                title="Lucro Acumulado (unidades)", xaxis_title="Aposta", yaxis_title="Lucro",
+                height=350, showlegend=False
+            )
+            st.plotly_chart(fig, use_container_width=True)
+            
+            st.markdown("#### Por Mercado")
+            st.dataframe(resultado['por_mercado'].style.format({
+                'Lucro': '{:+.2f}', 'Odd Média': '{:.2f}', 'Taxa de Acerto (%)': '{:.1f}', 'Yield (%)': '{:+.1f}'
+            }), use_container_width=True, hide_index=True)
+        
+        st.markdown("#### Yield por Classe (todos os mercados avaliados)")
+        st.dataframe(resultado['por_classe'].style.format({
+            'Lucro': '{:+.2f}', 'Odd Média': '{:.2f}', 'Taxa de Acerto (%)': '{:.1f}', 'Yield (%)': '{:+.1f}'
+        }), use_container_width=True, hide_index=True)
+
+
+# ============================================================================
+# VARREDURA DE PARÂMETROS DOS MODELOS (GRADE OU ALEATÓRIA, EM PARALELO)
+# ============================================================================
+
+# Valores candidatos; peso_ultimos_3 e peso_gols completam os grupos de pesos até 1
+GRADE_VARREDURA = {
+    'peso_geral': [0.4, 0.5, 0.6, 0.7, 0.8],
+    'peso_ultimos_5': [0.1, 0.2, 0.25, 0.3, 0.4],
+    'fator_mando': [1.0, 1.05, 1.10, 1.15, 1.20, 1.25],
+    'fator_visitante': [0.75, 0.80, 0.85, 0.90, 0.95, 1.0],
+    'peso_value_gap': [0.4, 0.5, 0.6],
+    'peso_forca': [0.1, 0.2, 0.3],
+    'peso_forma': [0.1, 0.2, 0.3],
+    'limites_faixas_odds': [
+        [1.5, 2.0, 2.5, 3.5, 5.0],
+        [1.4, 1.8, 2.3, 3.0, 4.5],
+        [1.6, 2.2, 2.8, 3.8, 5.5],
+    ],
+}
+
+# Grupos independentes: os pesos dos gols só afetam log-loss/Brier, os do valor só o ROI
+CHAVES_MODELO_GOLS = ('peso_geral', 'peso_ultimos_5', 'peso_ultimos_3', 'fator_mando', 'fator_visitante')
+CHAVES_MODELO_VALOR = ('peso_value_gap', 'peso_forca', 'peso_forma', 'peso_gols', 'limites_faixas_odds')
+
+ARQUIVO_RESULTADOS_VARREDURA = "varredura_resultados.csv"
+MIN_APOSTAS_VARREDURA = 30
+
+# Fração final (cronológica) dos jogos reservada para validar os parâmetros de valor
+FRACAO_VALIDACAO_VARREDURA = 0.3
+MAX_GOLS_VARREDURA = 10
+
+# Dados somente leitura de cada processo da varredura (preenchidos pelo inicializador)
+_DADOS_VARREDURA = {}
+
+
+def _completar_pesos(candidato):
+    """Completa peso_ultimos_3 e peso_gols para cada grupo somar 1; None se ficar negativo"""
+    configuracao = dict(PARAMETROS_MODELO_PADRAO, **candidato)
+    # + 0.0 evita o -0.0 do arredondamento
+    configuracao['peso_ultimos_3'] = round(1 - configuracao['peso_geral'] - configuracao['peso_ultimos_5'], 4) + 0.0
+    configuracao['peso_gols'] = round(
+        1 - configuracao['peso_value_gap'] - configuracao['peso_forca'] - configuracao['peso_forma'], 4) + 0.0
+    if configuracao['peso_ultimos_3'] < 0 or configuracao['peso_gols'] < 0:
+        return None
+    return configuracao
+
+
+def gerar_configuracoes(modo='aleatoria', amostras=200, semente=0):
+    """
+    Configurações a avaliar: a grade completa de GRADE_VARREDURA ou uma amostra
+    aleatória dela com até `amostras` configurações válidas e distintas.
+    
+    A configuração padrão é sempre a primeira, como referência.
+    """
+    chaves = list(GRADE_VARREDURA)
+    if modo == 'grade':
+        candidatos = (dict(zip(chaves, valores)) for valores in itertools.product(*GRADE_VARREDURA.values()))
+    else:
+        rng = np.random.default_rng(semente)
+        candidatos = ({chave: GRADE_VARREDURA[chave][rng.integers(len(GRADE_VARREDURA[chave]))] for chave in chaves}
+                      for _ in range(amostras * 20))
+    
+    configuracoes, vistas = [dict(PARAMETROS_MODELO_PADRAO)], {json.dumps(PARAMETROS_MODELO_PADRAO, sort_keys=True)}
+    for candidato in candidatos:
+        if modo != 'grade' and len(configuracoes) > amostras:
+            break
+        configuracao = _completar_pesos(candidato)
+        if configuracao is None:
+            continue
+        chave = json.dumps(configuracao, sort_keys=True)
+        if chave not in vistas:
+            vistas.add(chave)
+            configuracoes.append(configuracao)
+    return configuracoes
+
+
+def _features_modelo_gols(df):
+    """
+    Entradas do modelo de gols (calcular_lambda_*_ajustado) para cada jogo, só com jogos anteriores.
+    
+    Para cada lado: média de gols feitos no mando, média sofrida pelo adversário no
+    mando dele e médias dos últimos 5 e 3 jogos. Jogos em que um dos times tem menos
+    de 2 jogos anteriores no mando ficam de fora (mesma validação da predição).
+    """
+    motor = motor_forma(df)
+    home = df['Home'].astype(str).to_numpy()
+    away = df['Away'].astype(str).to_numpy()
+    anos, jogo_ids = _coluna_float(df, 'Ano'), np.nan_to_num(_coluna_float(df, 'Jogo ID'))
+    codigo = np.sign(_coluna_float(df, 'Gols Home') - _coluna_float(df, 'Gols Away'))
+    
+    linhas = []
+    for i in range(len(df)):
+        antes_de = (anos[i], jogo_ids[i])
+        n_home, n_away = motor.jogos(home[i], 'Home', antes_de), motor.jogos(away[i], 'Away', antes_de)
+        if n_home < 2 or n_away < 2 or np.isnan(codigo[i]):
+            continue
+        
+        geral_home = motor.janela(home[i], 'Home', n_home, antes_de)
+        geral_away = motor.janela(away[i], 'Away', n_away, antes_de)
+        linhas.append((
+            geral_home['gols_feitos'], geral_away['gols_sofridos'],
+            motor.janela(home[i], 'Home', 5, antes_de)['gols_feitos'],
+            motor.janela(home[i], 'Home', 3, antes_de)['gols_feitos'],
+            geral_away['gols_feitos'], geral_home['gols_sofridos'],
+            motor.janela(away[i], 'Away', 5, antes_de)['gols_feitos'],
+            motor.janela(away[i], 'Away', 3, antes_de)['gols_feitos'],
+            codigo[i],
+        ))
+    
+    colunas = ['ataque_home', 'defesa_away', 'home_5', 'home_3',
+               'ataque_away', 'defesa_home', 'away_5', 'away_3', 'resultado']
+    valores = np.array(linhas, dtype='float64').reshape(-1, len(colunas))
+    return {coluna: valores[:, i] for i, coluna in enumerate(colunas)}
+
+
+def metricas_modelo_gols(features, parametros):
+    """
+    Log-loss e Brier (1X2) do modelo de gols com os parâmetros dados, para todos os jogos de uma vez.
+    
+    Usa o mesmo lambda_gols_ajustado de calcular_lambda_home/away_ajustado (com os
+    parâmetros da configuração) e a matriz de Poisson até MAX_GOLS_VARREDURA.
+    """
+    lambda_home = lambda_gols_ajustado(features['ataque_home'], features['defesa_away'], features['home_5'],
+                                       features['home_3'], 'Home', parametros)
+    lambda_away = lambda_gols_ajustado(features['ataque_away'], features['defesa_home'], features['away_5'],
+                                       features['away_3'], 'Away', parametros)
+    
+    gols = np.arange(MAX_GOLS_VARREDURA + 1)
+    matriz, _ = matriz_placar(lambda_home, lambda_away, MAX_GOLS_VARREDURA)
+    diferenca = gols[:, None] - gols[None, :]
+    probs = np.column_stack([matriz[:, diferenca > 0].sum(axis=1), matriz[:, diferenca == 0].sum(axis=1),
+                             matriz[:, diferenca < 0].sum(axis=1)])
+    probs /= probs.sum(axis=1, keepdims=True)
+    
+    observado = np.column_stack([features['resultado'] == 1, features['resultado'] == 0, features['resultado'] == -1])
+    prob_observada = np.clip(probs[observado], 1e-12, 1.0)
+    return {
+        'jogos_avaliados': len(prob_observada),
+        'log_loss': float(-np.mean(np.log(prob_observada))) if len(prob_observada) else np.nan,
+        'brier': float(np.mean(np.sum((probs - observado) ** 2, axis=1))) if len(prob_observada) else np.nan,
     }
+
+
+def _iniciar_varredura(df, features, corte_validacao):
+    """Inicializador de cada processo: guarda os dados compartilhados (somente leitura)"""
+    _DADOS_VARREDURA['df'] = df
+    _DADOS_VARREDURA['features'] = features
+    _DADOS_VARREDURA['corte_validacao'] = corte_validacao
+    _DADOS_VARREDURA['roi'] = {}
+
+
+def _roi_apostas(apostas):
+    """(quantidade, ROI em %) de apostas de 1 unidade; ROI NaN sem apostas"""
+    return len(apostas), float(apostas['Lucro'].sum() / len(apostas) * 100) if len(apostas) else np.nan
+
+
+def _avaliar_configuracao(parametros):
+    """
+    Métricas de uma configuração: log-loss e Brier do modelo de gols e ROI do Value Score.
+    
+    O ROI é separado em jogos de busca (roi) e jogos reservados para validação
+    (roi_validacao), a partir de (Ano, Jogo ID) >= corte_validacao.
+    """
+    resultado = {chave: parametros[chave] for chave in PARAMETROS_MODELO_PADRAO}
+    resultado['padrao'] = parametros == PARAMETROS_MODELO_PADRAO
+    resultado['limites_faixas_odds'] = "/".join(f"{limite:g}" for limite in parametros['limites_faixas_odds'])
+    resultado.update(metricas_modelo_gols(_DADOS_VARREDURA['features'], parametros))
+    
+    # O backtest só depende dos parâmetros de valor: reaproveita entre configurações do processo
+    chave_valor = json.dumps({chave: parametros[chave] for chave in CHAVES_MODELO_VALOR}, sort_keys=True)
+    if chave_valor not in _DADOS_VARREDURA['roi']:
+        avaliados = _executar_backtest(_DADOS_VARREDURA['df'], parametros)
+        apostas = avaliados[avaliados['Classe'] >= 2]
+        validacao = (apostas['Ano'] * 1000 + apostas['Jogo ID'].fillna(0)) >= _DADOS_VARREDURA['corte_validacao']
+        _DADOS_VARREDURA['roi'][chave_valor] = _roi_apostas(apostas[~validacao]) + _roi_apostas(apostas[validacao])
+    (resultado['apostas'], resultado['roi'],
+     resultado['apostas_validacao'], resultado['roi_validacao']) = _DADOS_VARREDURA['roi'][chave_valor]
+    return resultado
+
+
+def executar_varredura(df, configuracoes, processos=None):
+    """
+    Avalia as configurações em paralelo (um processo por núcleo, por padrão).
+    
+    As entradas do modelo de gols são calculadas uma única vez aqui e enviadas,
+    junto com o DataFrame, ao inicializador de cada processo. Os últimos
+    FRACAO_VALIDACAO_VARREDURA dos jogos (em ordem cronológica) ficam reservados
+    para validar o ROI.
+    
+    Returns:
+        DataFrame com os parâmetros e as métricas (log_loss, brier, apostas, roi,
+        apostas_validacao, roi_validacao) de cada configuração
+    """
+    features = _features_modelo_gols(df)
+    processos = processos or os.cpu_count() or 1
+    tamanho_lote = max(1, len(configuracoes) // (processos * 4))
+    
+    ordinais = np.sort(_coluna_float(df, 'Ano') * 1000 + np.nan_to_num(_coluna_float(df, 'Jogo ID')))
+    corte_validacao = ordinais[int(len(ordinais) * (1 - FRACAO_VALIDACAO_VARREDURA))] if len(ordinais) else np.inf
+    
+    with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_varredura,
+                             initargs=(df, features, corte_validacao)) as executor:
+        resultados = list(executor.map(_avaliar_configuracao, configuracoes, chunksize=tamanho_lote))
+    
+    return pd.DataFrame(resultados).sort_values('log_loss').reset_index(drop=True)
+
+
+def melhor_configuracao(resultados):
+    """
+    Combina o melhor de cada grupo: parâmetros de gols com menor log-loss e
+    parâmetros de valor com maior ROI nos jogos de busca (mínimo de
+    MIN_APOSTAS_VARREDURA apostas). Os parâmetros de valor só substituem os valores
+    padrão se esse ROI for positivo e também positivo nos jogos reservados
+    para validação.
+    
+    Returns:
+        (parametros, metricas)
+    """
+    melhor_gols = resultados.loc[resultados['log_loss'].idxmin()]
+    candidatos_valor = resultados[resultados['apostas'] >= MIN_APOSTAS_VARREDURA].dropna(subset=['roi'])
+    
+    parametros = dict(PARAMETROS_MODELO_PADRAO)
+    parametros.update({chave: float(melhor_gols[chave]) for chave in CHAVES_MODELO_GOLS})
+    metricas = {'log_loss': float(melhor_gols['log_loss']), 'brier': float(melhor_gols['brier'])}
+    
+    metricas['parametros_valor'] = 'padrão'
+    if not candidatos_valor.empty:
+        melhor_valor = candidatos_valor.loc[candidatos_valor['roi'].idxmax()]
+        metricas.update({'apostas': int(melhor_valor['apostas']), 'roi': float(melhor_valor['roi']),
+                         'apostas_validacao': int(melhor_valor['apostas_validacao']),
+                         'roi_validacao': float(melhor_valor['roi_validacao'])})
+        
+        # Só substitui os valores padrão se o lucro da busca se confirmar nos jogos reservados
+        if (melhor_valor['roi'] > 0 and melhor_valor['roi_validacao'] > 0 and
+                melhor_valor['apostas_validacao'] >= MIN_APOSTAS_VARREDURA):
+            parametros.update({chave: float(melhor_valor[chave]) for chave in CHAVES_MODELO_VALOR
+                               if chave != 'limites_faixas_odds'})
+            parametros['limites_faixas_odds'] = [float(v) for v in melhor_valor['limites_faixas_odds'].split('/')]
+            metricas['parametros_valor'] = 'calibrados'
+    
+    return validar_parametros_modelo(parametros), metricas
+
+
+def executar_varredura_cli(argumentos):
+    """
+    Linha de comando: python streamlit_app.py --varredura [--modo grade|aleatoria] [--amostras N]
+    [--semente S] [--processos P] [--saida parametros_modelo.json] [--resultados varredura_resultados.csv]
+    """
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Varredura de parâmetros dos modelos")
+    parser.add_argument('--varredura', action='store_true')
+    parser.add_argument('--modo', choices=['grade', 'aleatoria'], default='aleatoria')
+    parser.add_argument('--amostras', type=int, default=200)
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--processos', type=int, default=None)
+    parser.add_argument('--saida', default=ARQUIVO_PARAMETROS_MODELO)
+    parser.add_argument('--resultados', default=ARQUIVO_RESULTADOS_VARREDURA)
+    opcoes = parser.parse_args(argumentos)
+    
+    df = _ler_dados()
+    if df.empty:
+        print("Dados não carregados; varredura cancelada.")
+        return
     
-    if categoria in ranges:
-        min_val, max_val = ranges[categoria]
-        return min_val < current_odd <= max_val
-    return False
+    configuracoes = gerar_configuracoes(opcoes.modo, opcoes.amostras, opcoes.semente)
+    print(f"Avaliando {len(configuracoes)} configurações em {len(df)} jogos...")
+    resultados = executar_varredura(df, configuracoes, opcoes.processos)
+    parametros, metricas = melhor_configuracao(resultados)
+    
+    resultados.to_csv(opcoes.resultados, index=False, sep=';')
+    with open(opcoes.saida, 'w', encoding='utf-8') as f:
+        json.dump({
+            'parametros': parametros,
+            'metricas': metricas,
+            'configuracoes_avaliadas': len(resultados),
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        }, f, ensure_ascii=False, indent=2)
+    
+    padrao = resultados[resultados['padrao']].iloc[0]
+    print(resultados.head(10).to_string(index=False))
+    print(f"\nPadrão: log-loss {padrao['log_loss']:.4f} | Brier {padrao['brier']:.4f} | "
+          f"ROI {padrao['roi']:+.1f}% (validação {padrao['roi_validacao']:+.1f}%)")
+    print(f"Melhor configuração gravada em {opcoes.saida}: {metricas}")
 
 
 # ============================================================================
@@ -2331,6 +5123,12 @@ def display_professional_analysis_refinado(analysis, team_name, position_label,
             st.markdown("**Força Relativa:**")
             forca = analysis.get('forca_relativa', {})
             st.info(f"{forca.get('categoria', 'N/A')} - {forca.get('descricao', 'N/A')}")
+            
+            forca_elo = analysis.get('forca_elo')
+            if forca_elo:
+                st.markdown("**Força pelo Elo:**")
+                st.info(f"{forca_elo['categoria']} - {forca_elo['descricao']} | "
+                        f"pontuação esperada {forca_elo['prob_elo']*100:.0f}%")
         
         with col2:
             st.markdown("**Forma Recente (últimos 5):**")
@@ -2627,32 +5425,46 @@ def show_probability_analysis(df, teams):
         f"🏠 {odd_home:.2f} | 🤝 {odd_draw:.2f} | ✈️ {odd_away:.2f}"
     )
     
+    metodos_por_rotulo = {rotulo: metodo for metodo, rotulo in METODOS_DEVIG.items()}
+    rotulo_devig = st.selectbox(
+        "Remoção da margem da casa",
+        options=list(metodos_por_rotulo),
+        index=list(METODOS_DEVIG).index(METODO_DEVIG_PADRAO),
+        key="metodo_devig"
+    )
+    metodo_devig = metodos_por_rotulo[rotulo_devig]
+    
     if st.button("🔍 Analisar Valor nas Odds", type="primary"):
-        # Probabilidades implícitas
-        prob_home_imp = (1 / odd_home) * 100
-        prob_draw_imp = (1 / odd_draw) * 100  
-        prob_away_imp = (1 / odd_away) * 100
+        # Probabilidades justas (odds sem a margem da casa)
+        margem = margem_das_odds([[odd_home, odd_draw, odd_away]])[0]
+        prob_home_imp, prob_draw_imp, prob_away_imp = (
+            probabilidades_justas([[odd_home, odd_draw, odd_away]], metodo_devig)[0] * 100
+        )
 
-        st.subheader("🔍 Probabilidades Implícitas das Odds")
-        col1, col2, col3 = st.columns(3)
+        st.subheader("🔍 Probabilidades Implícitas das Odds (sem margem)")
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("🏠 Mandante", f"{prob_home_imp:.1f}%")
+            st.metric("🏠 Mandante", f"{prob_home_imp:.1f}%", delta=f"bruta {100 / odd_home:.1f}%", delta_color="off")
         with col2:
-            st.metric("🤝 Empate", f"{prob_draw_imp:.1f}%")
+            st.metric("🤝 Empate", f"{prob_draw_imp:.1f}%", delta=f"bruta {100 / odd_draw:.1f}%", delta_color="off")
         with col3:
-            st.metric("✈️ Visitante", f"{prob_away_imp:.1f}%")
+            st.metric("✈️ Visitante", f"{prob_away_imp:.1f}%", delta=f"bruta {100 / odd_away:.1f}%", delta_color="off")
+        with col4:
+            st.metric("Margem da Casa", f"{margem * 100:.1f}%")
 
         # ========== ANÁLISES REFINADAS (LÓGICA NOVA) ==========
         home_analysis = analyze_team_comprehensive_refinado(
-            df, team_home, "Home", odd_home, odd_adversario=odd_away
+            df, team_home, "Home", odd_home, odd_adversario=odd_away, prob_justa=prob_home_imp,
+            adversario=team_away
         )
         
         away_analysis = analyze_team_comprehensive_refinado(
-            df, team_away, "Away", odd_away, odd_adversario=odd_home
+            df, team_away, "Away", odd_away, odd_adversario=odd_home, prob_justa=prob_away_imp,
+            adversario=team_home
         )
         
         # Empate (mantém lógica original por enquanto)
-        draw_analysis = analyze_draw_comprehensive(df, team_home, team_away, odd_draw)
+        draw_analysis = analyze_draw_comprehensive(df, team_home, team_away, odd_draw, prob_justa=prob_draw_imp)
         
         # ========== EXIBIÇÃO REFINADA ==========
         display_professional_analysis_refinado(
@@ -2672,6 +5484,11 @@ def show_probability_analysis(df, teams):
             odd_home, odd_away, odd_draw, 
             team_home, team_away
         )
+    
+    # ========== TRIAGEM EM LOTE ==========
+    st.markdown("---")
+    display_batch_value_screener(df, metodo_devig)
+    display_value_backtest(df, metodo_devig)
 
 
 def display_final_recommendations_refinado(home_analysis, away_analysis, draw_analysis, 
@@ -2704,7 +5521,7 @@ def display_final_recommendations_refinado(home_analysis, away_analysis, draw_an
                     'confianca': value_score_home.get('confianca', ''),
                     'value_gap': home_current.get('value_gap', 0),
                     'prob_historica': home_current['perc_vitoria'],
-                    'prob_mercado': (1/odd_home) * 100
+                    'prob_mercado': home_current['prob_implicita']
                 })
     
     # ========== VISITANTE ==========
@@ -2723,7 +5540,7 @@ def display_final_recommendations_refinado(home_analysis, away_analysis, draw_an
                     'confianca': value_score_away.get('confianca', ''),
                     'value_gap': away_current.get('value_gap', 0),
                     'prob_historica': away_current['perc_vitoria'],
-                    'prob_mercado': (1/odd_away) * 100
+                    'prob_mercado': away_current['prob_implicita']
                 })
     
     # ========== EMPATE (lógica simplificada) ==========
@@ -2731,7 +5548,7 @@ def display_final_recommendations_refinado(home_analysis, away_analysis, draw_an
         draw_current = next((r for r in draw_analysis['resultados'] if r['is_current']), None)
         if draw_current:
             prob_draw_hist = draw_current['perc_empate']
-            prob_draw_market = (1/odd_draw) * 100
+            prob_draw_market = draw_analysis.get('prob_mercado', (1/odd_draw) * 100)
             value_gap_draw = prob_draw_hist - prob_draw_market
             
             if value_gap_draw > 5:  # Threshold simples para empate
@@ -2813,22 +5630,110 @@ def display_final_recommendations_refinado(home_analysis, away_analysis, draw_an
 # FUNÇÕES AUXILIARES ORIGINAIS (PARA EMPATE) - MANTIDAS
 # ============================================================================
 
-def analyze_draw_comprehensive(df, team_home, team_away, current_odd):
-    """Análise de empates - MANTIDA DO CÓDIGO ORIGINAL"""
+# ============================================================================
+# FAIXAS DE ODD DE EMPATE (CONTAGENS POR TIME x MANDO E DA LIGA)
+# ============================================================================
+
+# Faixas de odd de empate (limites superiores inclusivos: odd <= 2.5, 2.5 < odd <= 3.2, ...)
+FAIXAS_EMPATE = ['Empate Muito Provável', 'Empate Provável', 'Empate Possível', 'Empate Improvável']
+LIMITES_FAIXAS_EMPATE = np.array([2.5, 3.2, 4.0])
+
+
+def faixa_odd_empate(odds):
+    """Índice da faixa de empate (0..3) de cada odd; -1 para odd ausente"""
+    odds = np.asarray(odds, dtype='float64')
+    faixas = np.digitize(odds, LIMITES_FAIXAS_EMPATE, right=True)
+    return np.where(np.isnan(odds), -1, faixas)
+
+
+def _construir_cubo_faixas_empate(df):
+    """
+    Contagens de jogos, empates e soma das odds de empate por faixa, em uma passada.
+    
+    Cada jogo entra pelo mandante (lado 0) e pelo visitante (lado 1); a liga
+    conta cada jogo uma vez. Por serem contagens, dois times se combinam por soma.
+    
+    Returns:
+        dict com 'times' ({nome: índice}), 'coluna_odd', 'jogos_mando' (times, 2)
+        com todos os jogos no mando, arrays (times, 2, 4) 'jogos', 'empates' e
+        'soma_odds', e arrays (4,) 'liga_jogos', 'liga_empates' e 'liga_soma_odds'
+    """
+    codigos_home, codigos_away, nomes = _codigos_lados(df)
+    n_times, n_faixas = len(nomes), len(FAIXAS_EMPATE)
+    lados = np.concatenate([codigos_home * 2, codigos_away * 2 + 1])
+    
+    coluna_odd = next((col for col in ('odd Empate', 'odd Draw') if col in df.columns), None)
+    odd_draw = _coluna_float(df, coluna_odd) if coluna_odd else np.full(len(df), np.nan)
+    empate = _coluna_float(df, 'Gols Home') == _coluna_float(df, 'Gols Away')
+    faixa = faixa_odd_empate(odd_draw)
+    validos = faixa >= 0
+    
+    grupo = (lados * n_faixas + np.tile(faixa, 2))[np.tile(validos, 2)]
+    tamanho = n_times * 2 * n_faixas
+    
+    def por_time(pesos=None):
+        if pesos is not None:
+            pesos = np.tile(pesos[validos], 2)
+        return np.bincount(grupo, weights=pesos, minlength=tamanho).reshape(n_times, 2, n_faixas)
+    
+    def da_liga(pesos=None):
+        return np.bincount(faixa[validos], weights=None if pesos is None else pesos[validos],
+                           minlength=n_faixas)
+    
+    return {
+        'times': {nome: i for i, nome in enumerate(nomes)},
+        'coluna_odd': coluna_odd,
+        'jogos_mando': np.bincount(lados, minlength=n_times * 2).reshape(n_times, 2),
+        'jogos': por_time(),
+        'empates': por_time(empate.astype('float64')).astype('int64'),
+        'soma_odds': por_time(odd_draw),
+        'liga_jogos': da_liga(),
+        'liga_empates': da_liga(empate.astype('float64')).astype('int64'),
+        'liga_soma_odds': da_liga(odd_draw),
+    }
+
+
+def cubo_faixas_empate(df):
+    """Cubo de contagens por faixa de odd de empate (construído uma única vez por DataFrame)"""
+    return _artefato_do_frame(df, 'cubo_faixas_empate', _construir_cubo_faixas_empate)
+
+
+def contagens_empate_confronto(df, team_home, team_away):
+    """
+    Contagens por faixa de empate do mandante em casa somadas às do visitante fora.
+    
+    Returns:
+        dict com 'jogos_base' (total de jogos dos dois recortes) e arrays (4,)
+        'jogos', 'empates' e 'soma_odds'
+    """
+    cubo = cubo_faixas_empate(df)
+    n_faixas = len(FAIXAS_EMPATE)
+    contagens = {'jogos_base': 0, 'jogos': np.zeros(n_faixas, dtype='int64'),
+                 'empates': np.zeros(n_faixas, dtype='int64'), 'soma_odds': np.zeros(n_faixas)}
+    
+    for team, lado in ((team_home, 0), (team_away, 1)):
+        indice = cubo['times'].get(str(team).strip())
+        if indice is None:
+            continue
+        contagens['jogos_base'] += int(cubo['jogos_mando'][indice, lado])
+        for chave in ('jogos', 'empates', 'soma_odds'):
+            contagens[chave] = contagens[chave] + cubo[chave][indice, lado]
+    
+    return contagens
+
+
+def analyze_draw_comprehensive(df, team_home, team_away, current_odd, prob_justa=None):
+    """Análise de empates - MANTIDA DO CÓDIGO ORIGINAL (prob_justa: prob. sem margem em %)"""
     # Esta função mantém a lógica original para empates
     # Pode ser refinada no futuro seguindo o mesmo padrão
     
-    # Confrontos diretos
-    direct_games = df[
-        ((df['Home'] == team_home) & (df['Away'] == team_away)) |
-        ((df['Home'] == team_away) & (df['Away'] == team_home))
-    ].copy()
+    # Confrontos diretos (totais pré-agregados no índice de pares)
+    confronto = confronto_direto(df, team_home, team_away)
     
     direct_analysis = None
-    if len(direct_games) >= 3:
-        direct_games['Empate'] = direct_games['Gols Home'] == direct_games['Gols Away']
-        total_direct = len(direct_games)
-        empates_direct = len(direct_games[direct_games['Empate']])
+    if confronto['jogos'] >= 3:
+        total_direct = confronto['jogos']
+        empates_direct = confronto['empates']
         perc_empate_direct = (empates_direct / total_direct) * 100 if total_direct > 0 else 0
         
         direct_analysis = {
@@ -2837,17 +5742,11 @@ def analyze_draw_comprehensive(df, team_home, team_away, current_odd):
             'percentual': perc_empate_direct
         }
     
-    # Histórico geral de empates dos times
-    home_games = df[df['Home'] == team_home].copy()
-    away_games = df[df['Away'] == team_away].copy()
+    # Histórico de empates por faixa: mandante em casa + visitante fora (contagens pré-calculadas)
+    cubo = cubo_faixas_empate(df)
+    contagens = contagens_empate_confronto(df, team_home, team_away)
     
-    all_games = pd.concat([home_games, away_games])
-    all_games['Empate'] = all_games['Gols Home'] == all_games['Gols Away']
-    
-    # Verifica se existe coluna de odd para empate
-    odd_draw_col = 'odd Empate' if 'odd Empate' in all_games.columns else 'odd Draw'
-    
-    if odd_draw_col not in all_games.columns or len(all_games) < 10:
+    if cubo['coluna_odd'] is None or contagens['jogos_base'] < 10:
         return {
             'error': 'Dados insuficientes para análise de empates',
             'current_odd': current_odd,
@@ -2855,53 +5754,36 @@ def analyze_draw_comprehensive(df, team_home, team_away, current_odd):
             'resultados': []
         }
     
-    all_games = all_games.dropna(subset=[odd_draw_col])
-    
-    # Categorização por odds
-    faixas = {
-        'Empate Muito Provável': all_games[all_games[odd_draw_col] <= 2.5],
-        'Empate Provável': all_games[(all_games[odd_draw_col] > 2.5) & (all_games[odd_draw_col] <= 3.2)],
-        'Empate Possível': all_games[(all_games[odd_draw_col] > 3.2) & (all_games[odd_draw_col] <= 4.0)],
-        'Empate Improvável': all_games[all_games[odd_draw_col] > 4.0]
-    }
-    
     resultados = []
-    for categoria, filtro in faixas.items():
-        if len(filtro) >= 3:
-            total = len(filtro)
-            empates = len(filtro[filtro['Empate']])
-            perc_empate = (empates / total) * 100
-            odd_media = filtro[odd_draw_col].mean()
+    for i, categoria in enumerate(FAIXAS_EMPATE):
+        total = int(contagens['jogos'][i])
+        if total >= 3:
+            empates = int(contagens['empates'][i])
+            liga_jogos = int(cubo['liga_jogos'][i])
             
             resultados.append({
                 'categoria': categoria,
                 'total': total,
                 'empates': empates,
-                'perc_empate': perc_empate,
-                'odd_media': odd_media,
+                'perc_empate': (empates / total) * 100,
+                'odd_media': contagens['soma_odds'][i] / total,
+                'perc_empate_liga': (cubo['liga_empates'][i] / liga_jogos) * 100 if liga_jogos > 0 else 0,
                 'is_current': is_current_draw_range(current_odd, categoria)
             })
     
     return {
         'current_odd': current_odd,
+        'prob_mercado': prob_justa if prob_justa is not None else (1 / current_odd) * 100,
         'direct_analysis': direct_analysis,
         'resultados': resultados
     }
 
 
 def is_current_draw_range(current_odd, categoria):
-    """Verifica range de empate - MANTIDA"""
-    ranges = {
-        'Empate Muito Provável': (0, 2.5),
-        'Empate Provável': (2.5, 3.2),
-        'Empate Possível': (3.2, 4.0),
-        'Empate Improvável': (4.0, float('inf'))
-    }
-    
-    if categoria in ranges:
-        min_val, max_val = ranges[categoria]
-        return min_val < current_odd <= max_val
-    return False
+    """Verifica se a odd de empate atual está na faixa da categoria"""
+    if categoria not in FAIXAS_EMPATE:
+        return False
+    return current_odd > 0 and int(faixa_odd_empate([current_odd])[0]) == FAIXAS_EMPATE.index(categoria)
 
 
 def display_draw_professional_analysis(analysis, current_odd, prob_implicita):
@@ -2931,6 +5813,7 @@ def display_draw_professional_analysis(analysis, current_odd, prob_implicita):
                 'Situação': r['categoria'],
                 'Jogos': r['total'],
                 'Empates': f"{r['empates']} ({r['perc_empate']:.1f}%)",
+                'Empates na Liga': f"{r.get('perc_empate_liga', 0):.1f}%",
                 'Odd Média': f"{r['odd_media']:.2f}"
             } for r in analysis['resultados']
         ])
@@ -2965,39 +5848,35 @@ def calculate_team_corner_stats(df, team, as_home=True):
     """
     Calcula estatísticas de escanteios por posição (mandante ou visitante)
     """
+    venue = 'Home' if as_home else 'Away'
     if as_home:
-        games = df[df['Home'] == team].copy()
         corners_made_col = 'Corner Home'
         corners_conceded_col = 'Corner Away'
     else:
-        games = df[df['Away'] == team].copy()
         corners_made_col = 'Corner Away'
-        corners_conceded_col = 'Corner Home'
-    
-    if games.empty:
-        return create_empty_corner_stats()
-    
-    games = games.dropna(subset=[corners_made_col, corners_conceded_col])
+        corners_conceded_col = 'Corner Home'
     
-    if len(games) < 3:
+    # Médias e desvios vêm do cubo de agregados
+    agregado = agregado_time(df, team, venue)
+    if agregado is None or agregado['jogos_escanteios'] < 3:
         return create_empty_corner_stats()
     
-    if 'Jogo ID' in games.columns:
-        games = games.sort_values('Jogo ID', ascending=False)
+    total_games = agregado['jogos_escanteios']
     
-    total_games = len(games)
+    # Sequência recente (do jogo mais novo ao mais antigo) vem do motor de forma
+    motor = motor_forma(df)
+    recentes = motor.sequencia(team, ['corners_feitos', 'corners_sofridos'], venue, n=5).astype('int64')
+    all_made, all_conceded = recentes[:, 0], recentes[:, 1]
     
     # Estatísticas FEITOS
-    all_made = games[corners_made_col].values
-    mean_made = np.mean(all_made)
-    std_made = np.std(all_made)
+    mean_made = agregado['media_corners_feitos']
+    std_made = agregado['desvio_corners_feitos']
     last_3_made = np.mean(all_made[:3]) if len(all_made) >= 3 else mean_made
     last_5_made = np.mean(all_made[:5]) if len(all_made) >= 5 else mean_made
     
     # Estatísticas SOFRIDOS
-    all_conceded = games[corners_conceded_col].values
-    mean_conceded = np.mean(all_conceded)
-    std_conceded = np.std(all_conceded)
+    mean_conceded = agregado['media_corners_sofridos']
+    std_conceded = agregado['desvio_corners_sofridos']
     last_3_conceded = np.mean(all_conceded[:3]) if len(all_conceded) >= 3 else mean_conceded
     last_5_conceded = np.mean(all_conceded[:5]) if len(all_conceded) >= 5 else mean_conceded
     
@@ -3037,9 +5916,9 @@ def calculate_lambda_home(home_stats, away_stats, odds_home=None, odds_away=None
     Calcula lambda (taxa esperada) de escanteios do MANDANTE
     Considera: o que o mandante FAZ em casa + o que o visitante SOFRE fora
     """
-    w_general = 0.60
-    w_last_5 = 0.25
-    w_last_3 = 0.15
+    w_general = PESOS_FORMA_ESCANTEIOS['peso_geral']
+    w_last_5 = PESOS_FORMA_ESCANTEIOS['peso_ultimos_5']
+    w_last_3 = PESOS_FORMA_ESCANTEIOS['peso_ultimos_3']
     
     # O que o mandante FAZ em casa
     home_attack = (
@@ -3080,9 +5959,9 @@ def calculate_lambda_away(home_stats, away_stats, odds_home=None, odds_away=None
     Calcula lambda (taxa esperada) de escanteios do VISITANTE
     Considera: o que o visitante FAZ fora + o que o mandante SOFRE em casa
     """
-    w_general = 0.60
-    w_last_5 = 0.25
-    w_last_3 = 0.15
+    w_general = PESOS_FORMA_ESCANTEIOS['peso_geral']
+    w_last_5 = PESOS_FORMA_ESCANTEIOS['peso_ultimos_5']
+    w_last_3 = PESOS_FORMA_ESCANTEIOS['peso_ultimos_3']
     
     # O que o visitante FAZ fora
     away_attack = (
@@ -3116,36 +5995,141 @@ def calculate_lambda_away(home_stats, away_stats, odds_home=None, odds_away=None
     
     return max(0.1, lambda_adjusted)
 
-def calculate_total_corners_distribution(lambda_home, lambda_away, max_corners=25):
+# ===================================================================
+# DISTRIBUIÇÕES DE ESCANTEIOS
+# ===================================================================
+
+MAX_ESCANTEIOS = 25
+
+# Modelos disponíveis para a contagem de escanteios de cada time
+MODELOS_ESCANTEIOS = {
+    'poisson': 'Poisson',
+    'binomial_negativa': 'Binomial Negativa (sobredispersão)',
+}
+
+# Linhas de handicap de escanteios do mandante
+LINHAS_HANDICAP_ESCANTEIOS = np.arange(-5.0, 5.01, 0.5)
+
+
+def _construir_dispersao_escanteios(df):
+    """Razão variância/média dos escanteios dentro de cada (time, mando), agregada por mando"""
+    longa = _tabela_longa_times(df).dropna(subset=['Escanteios Feitos'])
+    grupos = longa.groupby(['Mando', 'Time'])['Escanteios Feitos']
+    resumo = pd.DataFrame({'variancia': grupos.var(ddof=1), 'media': grupos.mean(), 'jogos': grupos.size()})
+    resumo = resumo[resumo['jogos'] >= 3]
+    
+    dispersao = {}
+    for mando in ['Home', 'Away']:
+        if mando not in resumo.index.get_level_values('Mando'):
+            dispersao[mando] = 1.0
+            continue
+        tabela = resumo.loc[mando]
+        pesos = tabela['jogos'] - 1
+        razao = (tabela['variancia'] * pesos).sum() / (tabela['media'] * pesos).sum()
+        dispersao[mando] = float(max(1.0, razao)) if np.isfinite(razao) else 1.0
+    return dispersao
+
+
+def dispersao_escanteios(df):
+    """Dispersão (variância/média) dos escanteios de mandantes e visitantes: {'Home': r, 'Away': r}"""
+    return _artefato_do_frame(df, 'dispersao_escanteios', _construir_dispersao_escanteios)
+
+
+def pmf_escanteios(lambdas, max_escanteios=MAX_ESCANTEIOS, dispersao=1.0):
     """
-    Calcula distribuição de probabilidade do TOTAL de escanteios
-    Usa Poisson para cada time
+    Distribuição de escanteios de um time em 0..max_escanteios (vetorizada em lambdas).
+    
+    Com dispersao <= 1 usa Poisson; acima disso, binomial negativa com a mesma média
+    e variância = dispersao * média.
+    """
+    lambdas = np.asarray(lambdas, dtype='float64')[..., None]
+    contagens = np.arange(max_escanteios + 1)
+    if dispersao <= 1.0:
+        return poisson.pmf(contagens, lambdas)
+    return nbinom.pmf(contagens, lambdas / (dispersao - 1.0), 1.0 / dispersao)
+
+
+def _convolucao_escanteios(pmf_home, pmf_away, sinal):
+    """Distribuição de home + away (sinal=1, suporte 0..K) ou home - away (sinal=-1, suporte -K..K)"""
+    k = pmf_home.shape[-1]
+    saida = np.arange(k) if sinal > 0 else np.arange(-(k - 1), k)
+    # Para cada saída t e gols do mandante i, o visitante precisa de j = sinal * (t - i)
+    indices = sinal * (saida[None, :] - np.arange(k)[:, None])
+    validos = (indices >= 0) & (indices < k)
+    deslocada = np.where(validos, pmf_away[..., np.clip(indices, 0, k - 1)], 0.0)
+    return np.einsum('...i,...it->...t', pmf_home, deslocada), saida
+
+
+def distribuicao_escanteios(lambda_home, lambda_away, max_escanteios=MAX_ESCANTEIOS,
+                            modelo='poisson', dispersao=None):
     """
-    corner_range = np.arange(0, max_corners + 1)
-    total_probs = {}
+    Motor de distribuições de escanteios de um confronto (aceita lotes de lambdas).
     
-    for total in corner_range:
-        prob_total = 0
-        for home_corners in range(total + 1):
-            away_corners = total - home_corners
-            prob_home = poisson.pmf(home_corners, lambda_home)
-            prob_away = poisson.pmf(away_corners, lambda_away)
-            prob_total += prob_home * prob_away
-        
-        total_probs[total] = prob_total * 100
+    Args:
+        modelo: chave de MODELOS_ESCANTEIOS
+        dispersao: {'Home': r, 'Away': r} para a binomial negativa (ver dispersao_escanteios)
+    
+    Returns:
+        dict com 'mandante' e 'visitante' (0..max), 'total' (0..max), 'diferenca' e
+        'margens' (-max..max, mandante - visitante) e '1x2' (vitória mandante,
+        empate, vitória visitante em escanteios)
+    """
+    dispersao = dispersao or {}
+    if modelo == 'binomial_negativa':
+        r_home, r_away = dispersao.get('Home', 1.0), dispersao.get('Away', 1.0)
+    else:
+        r_home = r_away = 1.0
+    
+    pmf_home = pmf_escanteios(lambda_home, max_escanteios, r_home)
+    pmf_away = pmf_escanteios(lambda_away, max_escanteios, r_away)
+    
+    if r_home <= 1.0 and r_away <= 1.0:
+        # Soma de Poissons independentes é Poisson(λh + λa)
+        total = poisson.pmf(np.arange(max_escanteios + 1),
+                            np.asarray(lambda_home, dtype='float64')[..., None] + np.asarray(lambda_away, dtype='float64')[..., None])
+    else:
+        total, _ = _convolucao_escanteios(pmf_home, pmf_away, 1)
+    
+    diferenca, margens = _convolucao_escanteios(pmf_home, pmf_away, -1)
+    prob_1x2 = np.stack([diferenca[..., margens > 0].sum(axis=-1),
+                         diferenca[..., margens == 0].sum(axis=-1),
+                         diferenca[..., margens < 0].sum(axis=-1)], axis=-1)
     
-    return total_probs
+    return {'mandante': pmf_home, 'visitante': pmf_away, 'total': total,
+            'diferenca': diferenca, 'margens': margens, '1x2': prob_1x2}
+
+
+def handicap_escanteios(distribuicao, linhas=LINHAS_HANDICAP_ESCANTEIOS):
+    """Handicap de escanteios do mandante (mesma convenção do handicap asiático de gols)"""
+    return _handicap_asiatico(distribuicao['diferenca'], distribuicao['margens'], linhas)
+
+
+def calculate_total_corners_distribution(lambda_home, lambda_away, max_corners=MAX_ESCANTEIOS,
+                                         modelo='poisson', dispersao=None):
+    """
+    Calcula distribuição de probabilidade do TOTAL de escanteios
+    Usa o motor de distribuições (Poisson ou binomial negativa)
+    """
+    distribuicao = distribuicao_escanteios(lambda_home, lambda_away, max_corners, modelo, dispersao)
+    return {total: prob * 100 for total, prob in enumerate(distribuicao['total'])}
 
 
-def calculate_over_under_probabilities(lambda_home, lambda_away, lines=[8.5, 9.5, 10.5, 11.5]):
+def calculate_over_under_probabilities(lambda_home, lambda_away, lines=[8.5, 9.5, 10.5, 11.5],
+                                       modelo='poisson', dispersao=None):
     """Calcula probabilidades de Over/Under"""
-    lambda_total = lambda_home + lambda_away
+    distribuicao = distribuicao_escanteios(lambda_home, lambda_away, modelo=modelo, dispersao=dispersao)
+    return _over_under_escanteios(distribuicao['total'], lines)
+
+
+def _over_under_escanteios(prob_total, lines):
+    """Over/Under (%) nas linhas pedidas a partir da distribuição do total"""
+    acumulada = np.cumsum(prob_total)
     probabilities = {}
     
     for line in lines:
         threshold = int(np.floor(line))
-        prob_under = poisson.cdf(threshold, lambda_total) * 100
-        prob_over = (1 - poisson.cdf(threshold, lambda_total)) * 100
+        prob_under = acumulada[threshold] * 100
+        prob_over = (1 - acumulada[threshold]) * 100
         
         probabilities[f'Over {line}'] = prob_over
         probabilities[f'Under {line}'] = prob_under
@@ -3318,10 +6302,14 @@ def display_comparative_corner_chart(home_stats, away_stats, home_team, away_tea
     st.plotly_chart(fig, use_container_width=True)
 
 
-def display_match_prediction(lambda_home, lambda_away, total_probs, home_team, away_team, confidence):
+def display_match_prediction(lambda_home, lambda_away, total_probs, home_team, away_team, confidence,
+                             distribuicao=None):
     """Exibe previsão do confronto com distribuição de probabilidades"""
     st.subheader("🎯 Previsão do Confronto")
     
+    if distribuicao is None:
+        distribuicao = distribuicao_escanteios(lambda_home, lambda_away)
+    
     most_likely_total = max(total_probs.items(), key=lambda x: x[1])[0]
     most_likely_prob = total_probs[most_likely_total]
     min_range, max_range, cumulative_prob = find_probable_range(total_probs, 0.70)
@@ -3354,7 +6342,8 @@ def display_match_prediction(lambda_home, lambda_away, total_probs, home_team, a
         st.info(f"**Faixa Provável (70%):** {min_range} a {max_range} escanteios")
     
     with col3:
-        variance = lambda_home + lambda_away
+        totais = np.arange(len(distribuicao['total']))
+        variance = np.sum(distribuicao['total'] * (totais - np.sum(distribuicao['total'] * totais)) ** 2)
         st.info(f"**Desvio Padrão:** ±{np.sqrt(variance):.1f} escanteios")
     
     # Gráfico de distribuição
@@ -3396,7 +6385,7 @@ def display_match_prediction(lambda_home, lambda_away, total_probs, home_team, a
     # Probabilidades Over/Under
     st.markdown("### 📊 Probabilidades Over/Under")
     
-    over_under_probs = calculate_over_under_probabilities(lambda_home, lambda_away)
+    over_under_probs = _over_under_escanteios(distribuicao['total'], [8.5, 9.5, 10.5, 11.5])
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -3412,6 +6401,28 @@ def display_match_prediction(lambda_home, lambda_away, total_probs, home_team, a
     with col4:
         st.metric("Over 11.5", f"{over_under_probs['Over 11.5']:.1f}%")
     
+    # 1X2 e handicap de escanteios (mesma distribuição da diferença)
+    st.markdown("### 🏁 1X2 e Handicap de Escanteios")
+    
+    prob_home, prob_draw, prob_away = distribuicao['1x2']
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric(f"🏠 Mais escanteios: {home_team}", f"{prob_home*100:.1f}%", help=f"Odd justa: {odd_justa(prob_home):.2f}")
+    
+    with col2:
+        st.metric("⚖️ Empate em escanteios", f"{prob_draw*100:.1f}%", help=f"Odd justa: {odd_justa(prob_draw):.2f}")
+    
+    with col3:
+        st.metric(f"✈️ Mais escanteios: {away_team}", f"{prob_away*100:.1f}%", help=f"Odd justa: {odd_justa(prob_away):.2f}")
+    
+    with st.expander("📋 Handicap de escanteios (odds justas)"):
+        st.caption(f"Linha aplicada ao mandante ({home_team}); o visitante ({away_team}) recebe a linha oposta.")
+        st.dataframe(handicap_escanteios(distribuicao).style.format({
+            'Linha': '{:+.1f}', 'Vitória Mandante': '{:.1%}', 'Devolução': '{:.1%}',
+            'Vitória Visitante': '{:.1%}', 'Odd Justa Mandante': '{:.2f}', 'Odd Justa Visitante': '{:.2f}'
+        }), use_container_width=True, hide_index=True)
+    
     # Recomendações
     st.markdown("### 💡 Análise de Oportunidades")
     
@@ -3482,15 +6493,24 @@ def show_corner_analysis(df, teams):
             key="corner_away"
         )
     
+    rotulos_modelos = {rotulo: chave for chave, rotulo in MODELOS_ESCANTEIOS.items()}
+    rotulo_modelo = st.selectbox(
+        "📐 Modelo de distribuição",
+        options=list(rotulos_modelos),
+        key="modelo_escanteios",
+        help="A binomial negativa usa a dispersão (variância/média) observada nos escanteios da liga"
+    )
+    
     st.markdown("---")
     
     # Botão de análise
     if st.button("📊 Analisar Confronto de Escanteios", type="primary", use_container_width=True):
         # Chama a função principal do código novo
-        analyze_corner_match(df, home_team, away_team)
+        analyze_corner_match(df, home_team, away_team, modelo=rotulos_modelos[rotulo_modelo])
 
 
-def analyze_corner_match(df, home_team, away_team, odds_home=None, odds_draw=None, odds_away=None):
+def analyze_corner_match(df, home_team, away_team, odds_home=None, odds_draw=None, odds_away=None,
+                         modelo='poisson'):
     
     st.title("⚽ Análise Avançada de Escanteios")
     st.markdown(f"**{home_team}** 🆚 **{away_team}**")
@@ -3528,18 +6548,25 @@ def analyze_corner_match(df, home_team, away_team, odds_home=None, odds_draw=Non
     
     st.markdown("---")
     
-    # Calcular lambdas
-    lambda_home = calculate_lambda_home(home_stats, away_stats, odds_home, odds_away)
-    lambda_away = calculate_lambda_away(home_stats, away_stats, odds_home, odds_away)
+    # Calcular lambdas (sem odds, consulta direta à tabela de confrontos)
+    previsao = previsao_confronto(df, home_team, away_team) if odds_home is None or odds_away is None else None
+    if previsao is not None:
+        lambda_home, lambda_away = previsao['lambda_escanteios_home'], previsao['lambda_escanteios_away']
+    else:
+        lambda_home = calculate_lambda_home(home_stats, away_stats, odds_home, odds_away)
+        lambda_away = calculate_lambda_away(home_stats, away_stats, odds_home, odds_away)
     
-    # Distribuição de probabilidades
-    total_probs = calculate_total_corners_distribution(lambda_home, lambda_away)
+    # Distribuição de probabilidades (uma única passada do motor de escanteios)
+    distribuicao = distribuicao_escanteios(lambda_home, lambda_away, modelo=modelo,
+                                           dispersao=dispersao_escanteios(df))
+    total_probs = {total: prob * 100 for total, prob in enumerate(distribuicao['total'])}
     
     # Confiabilidade
     confidence = calculate_confidence_metric(lambda_home, lambda_away, home_stats, away_stats)
     
     # Exibir previsão
-    display_match_prediction(lambda_home, lambda_away, total_probs, home_team, away_team, confidence)
+    display_match_prediction(lambda_home, lambda_away, total_probs, home_team, away_team, confidence,
+                             distribuicao)
 
 
 def get_team_display_name_with_logo(team_name, logo_size=(25, 25)):
@@ -3668,22 +6695,6 @@ def adjust_expectations_with_odds(exp_home, exp_away, prob_home, prob_draw, prob
     
     return exp_home_corrigida, exp_away_corrigida
 
-def generate_score_matrix(exp_home, exp_away):
-    """Gera matriz de probabilidades para placares de 0-0 até 5-5"""
-    
-    matrix = []
-    total_prob = 0
-    
-    for h in range(6):
-        row = []
-        for a in range(6):
-            prob = poisson.pmf(h, exp_home) * poisson.pmf(a, exp_away)
-            row.append(prob)
-            total_prob += prob
-        matrix.append(row)
-    
-    return np.array(matrix), total_prob
-
 def find_most_probable_score(matrix):
     """Encontra o placar mais provável na matriz"""
     max_prob_idx = np.unravel_index(np.argmax(matrix), matrix.shape)
@@ -3822,22 +6833,6 @@ def adjust_expectations_with_odds(exp_home, exp_away, prob_home, prob_draw, prob
     
     return exp_home_corrigida, exp_away_corrigida
 
-def generate_score_matrix(exp_home, exp_away):
-    """Gera matriz de probabilidades para placares de 0-0 até 5-5"""
-    
-    matrix = []
-    total_prob = 0
-    
-    for h in range(6):
-        row = []
-        for a in range(6):
-            prob = poisson.pmf(h, exp_home) * poisson.pmf(a, exp_away)
-            row.append(prob)
-            total_prob += prob
-        matrix.append(row)
-    
-    return np.array(matrix), total_prob
-
 def find_most_probable_score(matrix):
     """Encontra o placar mais provável na matriz"""
     max_prob_idx = np.unravel_index(np.argmax(matrix), matrix.shape)
@@ -3886,7 +6881,7 @@ def calculate_team_stats_advanced(df, team_name):
     """Calcula estatísticas avançadas do time separando jogos como mandante e visitante"""
     
     # Jogos como mandante (Home)
-    home_games = df[df['Home'] == team_name].copy()
+    home_games = jogos_do_time(df, team_name, 'Home')
     if len(home_games) > 0:
         gols_marcados_casa = home_games['Gols Home'].mean()
         gols_sofridos_casa = home_games['Gols  Away'].mean()  # Note o espaço extra em 'Gols  Away'
@@ -3897,7 +6892,7 @@ def calculate_team_stats_advanced(df, team_name):
         jogos_casa = 0
     
     # Jogos como visitante (Away)
-    away_games = df[df['Away'] == team_name].copy()
+    away_games = jogos_do_time(df, team_name, 'Away')
     if len(away_games) > 0:
         gols_marcados_fora = away_games['Gols  Away'].mean()  # Note o espaço extra em 'Gols  Away'
         gols_sofridos_fora = away_games['Gols Home'].mean()
@@ -3917,24 +6912,18 @@ def calculate_team_stats_advanced(df, team_name):
         'total_jogos': jogos_casa + jogos_fora
     }
 
-def convert_odds_to_probabilities(odd_home, odd_draw, odd_away):
-    """Converte odds para probabilidades implícitas normalizadas"""
-    
-    # Calcula probabilidades implícitas
-    prob_home_raw = 1 / odd_home if odd_home > 0 else 0
-    prob_draw_raw = 1 / odd_draw if odd_draw > 0 else 0
-    prob_away_raw = 1 / odd_away if odd_away > 0 else 0
-    
-    # Normaliza as probabilidades
-    total_prob = prob_home_raw + prob_draw_raw + prob_away_raw
-    
-    if total_prob > 0:
-        prob_home = prob_home_raw / total_prob
-        prob_draw = prob_draw_raw / total_prob
-        prob_away = prob_away_raw / total_prob
-    else:
-        prob_home = prob_draw = prob_away = 1/3
+def convert_odds_to_probabilities(odd_home, odd_draw, odd_away, metodo='proporcional'):
+    """Converte odds para probabilidades normalizadas (sem margem), pelo método escolhido"""
     
+    probs = probabilidades_justas([[odd_home, odd_draw, odd_away]], metodo)[0]
+    if np.isnan(probs).any():
+        # Odd <= 1 não admite remoção de margem: normaliza as odds positivas como antes
+        odds = np.array([odd_home, odd_draw, odd_away], dtype='float64')
+        prob_raw = np.where(odds > 0, 1 / np.where(odds > 0, odds, 1), 0.0)
+        total_prob = prob_raw.sum()
+        probs = prob_raw / total_prob if total_prob > 0 else np.full(3, 1/3)
+
+    prob_home, prob_draw, prob_away = (float(p) for p in probs)
     return prob_home, prob_draw, prob_away
 
 def calculate_goal_expectations(home_stats, away_stats):
@@ -3979,18 +6968,8 @@ def adjust_expectations_with_odds(exp_home, exp_away, prob_home, prob_draw, prob
 def generate_score_matrix(exp_home, exp_away):
     """Gera matriz de probabilidades para placares de 0-0 até 5-5"""
     
-    matrix = []
-    total_prob = 0
-    
-    for h in range(6):
-        row = []
-        for a in range(6):
-            prob = poisson.pmf(h, exp_home) * poisson.pmf(a, exp_away)
-            row.append(prob)
-            total_prob += prob
-        matrix.append(row)
-    
-    return np.array(matrix), total_prob
+    matrix, massa_cauda = matriz_placar(exp_home, exp_away, max_gols=5)
+    return matrix, 1.0 - massa_cauda
 
 def find_most_probable_score(matrix):
     """Encontra o placar mais provável na matriz"""
@@ -4176,13 +7155,7 @@ def show_advanced_score_prediction(df, teams):
         st.subheader("🏆 Top 10 Placares Mais Prováveis")
         
         # Gera lista ordenada
-        scores_list = []
-        for i in range(6):
-            for j in range(6):
-                prob = resultado['matriz_probabilidades'][i][j]
-                scores_list.append(((i, j), prob))
-        
-        scores_list.sort(key=lambda x: x[1], reverse=True)
+        scores_list = placares_mais_provaveis(resultado['matriz_probabilidades'])
         
         # Exibe top 10
         for idx, ((h, a), prob) in enumerate(scores_list[:10], 1):
@@ -4223,18 +7196,45 @@ def predict_score_poisson(home_avg, away_avg, home_def, away_def):
     gols_esperados_away = (away_avg + home_def) / 2
     
     # Encontra placar mais provável
-    max_prob = 0
-    resultado = (0, 0)
-    
-    for h in range(6):
-        for a in range(6):
-            prob = poisson.pmf(h, gols_esperados_home) * poisson.pmf(a, gols_esperados_away)
-            if prob > max_prob:
-                max_prob = prob
-                resultado = (h, a)
+    matriz, _ = matriz_placar(gols_esperados_home, gols_esperados_away, max_gols=5)
+    resultado, max_prob = placares_mais_provaveis(matriz, 1)[0]
     
     return resultado, max_prob, gols_esperados_home, gols_esperados_away
 
+# Base do λ de gols: peso do ataque do time e da defesa do adversário
+PESOS_BASE_LAMBDA_GOLS = (0.6, 0.4)
+
+# Limites (mínimo, máximo) de gols esperados por mando
+LIMITES_LAMBDA_GOLS = {'Home': (0.3, 4.0), 'Away': (0.2, 3.5)}
+
+
+def lambda_gols_ajustado(ataque, defesa_adversaria, forma_5, forma_3, venue, parametros=None):
+    """
+    λ de gols de um lado: base ataque x defesa, forma recente, mando e limites.
+    
+    Aceita escalares ou arrays que se combinam por broadcasting (tabela de
+    confrontos, varredura). Forma NaN mantém a base sem o ajuste de forma.
+    
+    Args:
+        ataque: média de gols feitos pelo time no mando
+        defesa_adversaria: média de gols sofridos pelo adversário no mando dele
+        forma_5, forma_3: médias de gols feitos nos últimos 5 e 3 jogos
+        venue: 'Home' (fator_mando) ou 'Away' (fator_visitante)
+        parametros: pesos e fatores (padrão: PARAMETROS_MODELO)
+    """
+    parametros = parametros or PARAMETROS_MODELO
+    peso_ataque, peso_defesa = PESOS_BASE_LAMBDA_GOLS
+    base = (peso_ataque * ataque) + (peso_defesa * defesa_adversaria)
+    
+    com_forma = (parametros['peso_geral'] * base + parametros['peso_ultimos_5'] * forma_5 +
+                 parametros['peso_ultimos_3'] * forma_3)
+    com_forma = np.where(np.isnan(com_forma), base, com_forma)
+    
+    fator = parametros['fator_mando'] if venue == 'Home' else parametros['fator_visitante']
+    minimo, maximo = LIMITES_LAMBDA_GOLS[venue]
+    return np.clip(com_forma * fator, minimo, maximo)
+
+
 # Função compatível com o código original
 
 def calcular_lambda_home_ajustado(home_stats, away_stats, df=None, team_home=None, team_away=None):
@@ -4264,37 +7264,19 @@ def calcular_lambda_home_ajustado(home_stats, away_stats, df=None, team_home=Non
     # Média de gols que o visitante sofre fora
     defesa_visitante_fora = away_stats.get('media_gols_sofridos', 1.5)
     
-    # Lambda base: média ponderada (60% ataque, 40% defesa adversária)
-    lambda_base = (0.6 * ataque_mandante_casa) + (0.4 * defesa_visitante_fora)
-    
     
     # ========== COMPONENTE 2: FORMA RECENTE ==========
-    # Pesos: 60% geral, 25% últimos 5, 15% últimos 3
+    # Pesos (padrão): 60% geral, 25% últimos 5, 15% últimos 3
     forma_recente_home = _calcular_forma_recente_gols(
         df, team_home, as_home=True, ultimos_jogos=[5, 3]
     ) if df is not None and team_home else None
-    
-    if forma_recente_home:
-        lambda_com_forma = (
-            0.60 * lambda_base +
-            0.25 * forma_recente_home['ultimos_5'] +
-            0.15 * forma_recente_home['ultimos_3']
-        )
-    else:
-        lambda_com_forma = lambda_base
+    forma_recente_home = forma_recente_home or {'ultimos_5': np.nan, 'ultimos_3': np.nan}
     
     
-    # ========== COMPONENTE 3: AJUSTE POR MANDO DE CAMPO ==========
-    # Fator de mando: times geralmente fazem ~15-20% mais gols em casa
-    fator_mando = 1.15
-    lambda_ajustado = lambda_com_forma * fator_mando
-    
-    
-    # ========== COMPONENTE 4: LIMITAÇÃO DE VARIAÇÃO ==========
-    # Evita valores extremos: mínimo 0.3, máximo 4.0 gols esperados
-    lambda_final = np.clip(lambda_ajustado, 0.3, 4.0)
-    
-    return lambda_final
+    # ========== COMPONENTES 3 E 4: MANDO DE CAMPO E LIMITAÇÃO ==========
+    # Fator de mando (times fazem ~15-20% mais gols em casa); limites de 0.3 a 4.0 gols
+    return lambda_gols_ajustado(ataque_mandante_casa, defesa_visitante_fora,
+                                forma_recente_home['ultimos_5'], forma_recente_home['ultimos_3'], 'Home')
 
 
 def calcular_lambda_away_ajustado(home_stats, away_stats, df=None, team_home=None, team_away=None):
@@ -4308,34 +7290,18 @@ def calcular_lambda_away_ajustado(home_stats, away_stats, df=None, team_home=Non
     ataque_visitante_fora = away_stats.get('media_gols_feitos', 1.2)
     defesa_mandante_casa = home_stats.get('media_gols_sofridos', 1.2)
     
-    lambda_base = (0.6 * ataque_visitante_fora) + (0.4 * defesa_mandante_casa)
-    
     
     # ========== COMPONENTE 2: FORMA RECENTE ==========
     forma_recente_away = _calcular_forma_recente_gols(
         df, team_away, as_home=False, ultimos_jogos=[5, 3]
     ) if df is not None and team_away else None
+    forma_recente_away = forma_recente_away or {'ultimos_5': np.nan, 'ultimos_3': np.nan}
     
-    if forma_recente_away:
-        lambda_com_forma = (
-            0.60 * lambda_base +
-            0.25 * forma_recente_away['ultimos_5'] +
-            0.15 * forma_recente_away['ultimos_3']
-        )
-    else:
-        lambda_com_forma = lambda_base
-    
-    
-    # ========== COMPONENTE 3: PENALIZAÇÃO POR JOGAR FORA ==========
-    # Visitantes geralmente fazem ~15-20% menos gols
-    fator_visitante = 0.85
-    lambda_ajustado = lambda_com_forma * fator_visitante
     
-    
-    # ========== COMPONENTE 4: LIMITAÇÃO ==========
-    lambda_final = np.clip(lambda_ajustado, 0.2, 3.5)
-    
-    return lambda_final
+    # ========== COMPONENTES 3 E 4: PENALIZAÇÃO POR JOGAR FORA E LIMITAÇÃO ==========
+    # Visitantes geralmente fazem ~15-20% menos gols; limites de 0.2 a 3.5 gols
+    return lambda_gols_ajustado(ataque_visitante_fora, defesa_mandante_casa,
+                                forma_recente_away['ultimos_5'], forma_recente_away['ultimos_3'], 'Away')
 
 
 def _calcular_forma_recente_gols(df, team_name, as_home=True, ultimos_jogos=[5, 3]):
@@ -4348,28 +7314,20 @@ def _calcular_forma_recente_gols(df, team_name, as_home=True, ultimos_jogos=[5,
         return None
     
     try:
-        # Filtra jogos do time
-        if as_home:
-            jogos_time = df[df['mandante'] == team_name].copy()
-            coluna_gols = 'gols_mandante'
-        else:
-            jogos_time = df[df['visitante'] == team_name].copy()
-            coluna_gols = 'gols_visitante'
-        
-        # Ordena por data (assumindo que há coluna 'data' ou similar)
-        if 'data' in jogos_time.columns:
-            jogos_time = jogos_time.sort_values('data', ascending=False)
+        # Janelas cronológicas do motor de forma (gols feitos pelo time no mando)
+        venue = 'Home' if as_home else 'Away'
+        motor = motor_forma(df)
+        total_jogos = motor.jogos(team_name, venue)
         
         forma = {}
         
         # Calcula média para cada janela
         for n in ultimos_jogos:
-            jogos_recentes = jogos_time.head(n)
-            if len(jogos_recentes) >= max(1, n // 2):  # Pelo menos metade dos jogos
-                forma[f'ultimos_{n}'] = jogos_recentes[coluna_gols].mean()
+            if total_jogos >= max(1, n // 2):  # Pelo menos metade dos jogos
+                forma[f'ultimos_{n}'] = motor.janela(team_name, venue, n)['gols_feitos']
             else:
                 # Fallback: usa a média geral se não houver dados suficientes
-                forma[f'ultimos_{n}'] = jogos_time[coluna_gols].mean() if len(jogos_time) > 0 else 1.0
+                forma[f'ultimos_{n}'] = motor.janela(team_name, venue, total_jogos)['gols_feitos'] if total_jogos > 0 else 1.0
         
         return forma
     
@@ -4500,16 +7458,9 @@ def predict_score_poisson_refinado(home_stats, away_stats, df=None, team_home=No
     
     
     # ========== ENCONTRA PLACAR MAIS PROVÁVEL ==========
-    max_prob = 0
-    resultado = (0, 0)
-    
     # Explora placares até 6x6 (99%+ dos resultados reais)
-    for h in range(7):
-        for a in range(7):
-            prob = poisson.pmf(h, lambda_home) * poisson.pmf(a, lambda_away)
-            if prob > max_prob:
-                max_prob = prob
-                resultado = (h, a)
+    matriz, massa_cauda = matriz_placar(lambda_home, lambda_away, max_gols=6)
+    resultado, max_prob = placares_mais_provaveis(matriz, 1)[0]
     
     
     # ========== MONTA DETALHES PARA DEBUG/TRANSPARÊNCIA ==========
@@ -4521,7 +7472,8 @@ def predict_score_poisson_refinado(home_stats, away_stats, df=None, team_home=No
         'fator_mando_aplicado': True,
         'forma_recente_aplicada': df is not None,
         'odds_aplicadas': odd_home is not None,
-        'ajustes_ht': ajustes_ht
+        'ajustes_ht': ajustes_ht,
+        'massa_cauda': float(massa_cauda)
     }
     
     return resultado, max_prob, lambda_home, lambda_away, detalhes
@@ -4581,6 +7533,183 @@ def predict_score_poisson(home_avg, away_avg, home_def, away_def,
     # Retorna no formato original (sem detalhes extras)
     return resultado, prob, lambda_h, lambda_a
 
+# ============================================================================
+# TABELA DE CONFRONTOS (TODOS OS PARES, PRÉ-CALCULADA POR DATAFRAME)
+# ============================================================================
+
+# Linhas de Over/Under de gols guardadas para cada par
+LINHAS_OVER_CONFRONTOS = [1.5, 2.5, 3.5]
+
+# Maior placar da matriz guardada por par (o placar mais provável usa até 6 gols)
+MAX_GOLS_CONFRONTOS = 10
+
+
+def _construir_tabela_confrontos(df):
+    """
+    Previsões de todos os pares ordenados (mandante, visitante) em uma passada.
+    
+    Os termos de calcular_lambda_home_ajustado / calcular_lambda_away_ajustado e
+    de calculate_lambda_home / calculate_lambda_away (escanteios, sem odds)
+    dependem de um time só; calculados uma vez por time, os λ de todos os pares
+    saem por broadcasting (mandante nas linhas, visitante nas colunas), e as
+    matrizes de placar de todos os pares vêm de uma única chamada a matriz_placar.
+    
+    Returns:
+        dict com 'times' ({nome: índice}), 'jogos' (T, 2) e arrays (T, T):
+        'lambda_home', 'lambda_away', 'placar' (T, T, 2), 'prob_placar',
+        'prob_1x2' (T, T, 3), 'prob_over' (T, T, linhas), 'matrizes'
+        (T, T, g, g), 'lambda_escanteios_home', 'lambda_escanteios_away' e
+        'escanteios_validos'
+    """
+    nomes = _times_da_visao(df)
+    
+    def por_time(funcao, chave):
+        return np.array([funcao(time)[chave] for time in nomes], dtype='float64')
+    
+    def forma(time, as_home):
+        forma_time = _calcular_forma_recente_gols(df, time, as_home=as_home, ultimos_jogos=[5, 3])
+        return forma_time if forma_time else {'ultimos_5': np.nan, 'ultimos_3': np.nan}
+    
+    # ========== GOLS: termos de cada time ==========
+    estatisticas_home = [calculate_team_stats(df, time, as_home=True) for time in nomes]
+    estatisticas_away = [calculate_team_stats(df, time, as_home=False) for time in nomes]
+    formas_home = [forma(time, True) for time in nomes]
+    formas_away = [forma(time, False) for time in nomes]
+    
+    def coluna(lista, chave):
+        return np.array([item[chave] for item in lista], dtype='float64')
+    
+    def lambda_gols(estatisticas, estatisticas_adversario, formas, venue):
+        # Time nas linhas, adversário nas colunas
+        return lambda_gols_ajustado(coluna(estatisticas, 'media_gols_feitos')[:, None],
+                                    coluna(estatisticas_adversario, 'media_gols_sofridos')[None, :],
+                                    coluna(formas, 'ultimos_5')[:, None], coluna(formas, 'ultimos_3')[:, None], venue)
+    
+    lambda_home = lambda_gols(estatisticas_home, estatisticas_away, formas_home, 'Home')
+    # Visitante nas colunas: calcula com o visitante nas linhas e transpõe
+    lambda_away = lambda_gols(estatisticas_away, estatisticas_home, formas_away, 'Away').T
+    
+    matrizes, _ = matriz_placar(lambda_home, lambda_away, max_gols=MAX_GOLS_CONFRONTOS)
+    
+    # Placar mais provável até 6x6 (mesmo recorte de predict_score_poisson_refinado)
+    recorte = matrizes[..., :MAX_GOLS_MATRIZ + 1, :MAX_GOLS_MATRIZ + 1]
+    mais_provavel = recorte.reshape(*recorte.shape[:2], -1).argmax(axis=-1)
+    placar = np.stack(np.unravel_index(mais_provavel, recorte.shape[-2:]), axis=-1)
+    prob_placar = np.take_along_axis(recorte.reshape(*recorte.shape[:2], -1), mais_provavel[..., None], axis=-1)[..., 0]
+    
+    # 1X2 e Over/Under da matriz completa (renormalizada, como em precificar_mercados)
+    normalizadas = matrizes / matrizes.sum(axis=(-2, -1), keepdims=True)
+    gols_home, gols_away = np.indices(normalizadas.shape[-2:])
+    prob_1x2 = np.stack([
+        normalizadas[..., gols_home > gols_away].sum(axis=-1),
+        normalizadas[..., gols_home == gols_away].sum(axis=-1),
+        normalizadas[..., gols_home < gols_away].sum(axis=-1),
+    ], axis=-1)
+    total = gols_home + gols_away
+    prob_over = np.stack([normalizadas[..., total > linha].sum(axis=-1) for linha in LINHAS_OVER_CONFRONTOS], axis=-1)
+    
+    # ========== ESCANTEIOS: termos de cada time (sem ajuste por odds) ==========
+    escanteios_home = [calculate_team_corner_stats(df, time, as_home=True) for time in nomes]
+    escanteios_away = [calculate_team_corner_stats(df, time, as_home=False) for time in nomes]
+    
+    def ponderada(lista, sufixo):
+        return (coluna(lista, f'mean_{sufixo}') * PESOS_FORMA_ESCANTEIOS['peso_geral'] +
+                coluna(lista, f'last_5_{sufixo}') * PESOS_FORMA_ESCANTEIOS['peso_ultimos_5'] +
+                coluna(lista, f'last_3_{sufixo}') * PESOS_FORMA_ESCANTEIOS['peso_ultimos_3'])
+    
+    lambda_escanteios_home = np.maximum(0.1, (ponderada(escanteios_home, 'made')[:, None] +
+                                              ponderada(escanteios_away, 'conceded')[None, :]) / 2)
+    lambda_escanteios_away = np.maximum(0.1, (ponderada(escanteios_away, 'made')[None, :] +
+                                              ponderada(escanteios_home, 'conceded')[:, None]) / 2)
+    escanteios_validos = ((coluna(escanteios_home, 'total_games') >= 3)[:, None] &
+                          (coluna(escanteios_away, 'total_games') >= 3)[None, :])
+    
+    return {
+        'times': {nome: i for i, nome in enumerate(nomes)},
+        'jogos': np.column_stack([coluna(estatisticas_home, 'jogos'), coluna(estatisticas_away, 'jogos')]),
+        'lambda_home': lambda_home,
+        'lambda_away': lambda_away,
+        'placar': placar,
+        'prob_placar': prob_placar,
+        'prob_1x2': prob_1x2,
+        'prob_over': prob_over,
+        'matrizes': matrizes,
+        'lambda_escanteios_home': lambda_escanteios_home,
+        'lambda_escanteios_away': lambda_escanteios_away,
+        'escanteios_validos': escanteios_validos,
+    }
+
+
+def tabela_confrontos(df):
+    """Tabela de previsões de todos os pares do DataFrame (construída uma única vez por DataFrame)"""
+    return _artefato_do_frame(df, 'tabela_confrontos', _construir_tabela_confrontos)
+
+
+def previsao_confronto(df, team_home, team_away):
+    """
+    Consulta O(1) da tabela de confrontos.
+    
+    Returns:
+        dict com jogos, λ de gols e escanteios, placar mais provável, 1X2, Over/Under
+        e a matriz de placares do par; None se algum time não estiver no df
+    """
+    tabela = tabela_confrontos(df)
+    home, away = tabela['times'].get(team_home), tabela['times'].get(team_away)
+    if home is None or away is None:
+        return None
+    
+    return {
+        'jogos_home': int(tabela['jogos'][home, 0]),
+        'jogos_away': int(tabela['jogos'][away, 1]),
+        'lambda_home': float(tabela['lambda_home'][home, away]),
+        'lambda_away': float(tabela['lambda_away'][home, away]),
+        'placar': tuple(int(gols) for gols in tabela['placar'][home, away]),
+        'prob_placar': float(tabela['prob_placar'][home, away]),
+        'prob_1x2': tabela['prob_1x2'][home, away],
+        'prob_over': dict(zip(LINHAS_OVER_CONFRONTOS, tabela['prob_over'][home, away])),
+        'matriz': tabela['matrizes'][home, away],
+        'lambda_escanteios_home': float(tabela['lambda_escanteios_home'][home, away]),
+        'lambda_escanteios_away': float(tabela['lambda_escanteios_away'][home, away]),
+        'escanteios_validos': bool(tabela['escanteios_validos'][home, away]),
+    }
+
+
+# Métricas disponíveis no mapa de calor dos confrontos: rótulo -> valores (T, T) a partir da tabela
+METRICAS_MAPA_CONFRONTOS = {
+    "Vitória do Mandante (%)": lambda tabela: tabela['prob_1x2'][..., 0] * 100,
+    "Empate (%)": lambda tabela: tabela['prob_1x2'][..., 1] * 100,
+    "Vitória do Visitante (%)": lambda tabela: tabela['prob_1x2'][..., 2] * 100,
+    "Over 2.5 (%)": lambda tabela: tabela['prob_over'][..., LINHAS_OVER_CONFRONTOS.index(2.5)] * 100,
+    "Gols Esperados (Total)": lambda tabela: tabela['lambda_home'] + tabela['lambda_away'],
+    "Escanteios Esperados (Total)": lambda tabela: tabela['lambda_escanteios_home'] + tabela['lambda_escanteios_away'],
+}
+
+
+def display_fixture_heatmap(df):
+    """Mapa de calor N x N da tabela de confrontos (mandante nas linhas, visitante nas colunas)"""
+    tabela = tabela_confrontos(df)
+    nomes = list(tabela['times'])
+    if len(nomes) < 2:
+        st.info("Times insuficientes para o mapa de confrontos.")
+        return
+    
+    metrica = st.selectbox("Métrica:", list(METRICAS_MAPA_CONFRONTOS), key="metrica_mapa_confrontos")
+    valores = METRICAS_MAPA_CONFRONTOS[metrica](tabela).astype('float64')
+    np.fill_diagonal(valores, np.nan)
+    
+    fig = px.imshow(
+        valores,
+        x=nomes,
+        y=nomes,
+        labels=dict(x="Visitante", y="Mandante", color=metrica),
+        color_continuous_scale='RdYlGn',
+        aspect='auto'
+    )
+    fig.update_traces(hovertemplate='<b>%{y}</b> x <b>%{x}</b><br>%{z:.1f}<extra></extra>')
+    fig.update_layout(height=700, xaxis=dict(tickangle=-45))
+    st.plotly_chart(fig, use_container_width=True)
+
+
 def show_score_prediction(df, teams):
 
     import streamlit as st
@@ -4597,6 +7726,17 @@ def show_score_prediction(df, teams):
     with col2:
         team_away = create_team_selectbox_with_logos("✈️ Time Visitante:", teams, key="poisson_away")
 
+    modelo_predicao = st.selectbox(
+        "📐 Modelo de predição:",
+        options=[MODELO_PREDICAO_MEDIAS, MODELO_PREDICAO_DIXON_COLES],
+        key="modelo_predicao",
+        help="Dixon-Coles: forças de ataque/defesa e mando ajustados por máxima verossimilhança, "
+             "com correção de placares baixos e peso maior para jogos recentes"
+    )
+
+    with st.expander("🗺️ Mapa de Confrontos (todos os pares)"):
+        display_fixture_heatmap(df)
+
     if team_home == team_away:
         st.warning("Por favor, selecione dois times diferentes.")
         return
@@ -4607,24 +7747,26 @@ def show_score_prediction(df, teams):
         display_vs_matchup(team_home, team_away)
 
     if st.button("🔮 Prever Placar"):
-        # Obtém estatísticas dos times
-        home_stats = calculate_team_stats(df, team_home, as_home=True)
-        away_stats = calculate_team_stats(df, team_away, as_home=False)
+        # Previsão do par já calculada na tabela de confrontos
+        previsao = previsao_confronto(df, team_home, team_away)
 
         # Validação mínima
-        if home_stats['jogos'] < 2 or away_stats['jogos'] < 2:
+        if previsao is None or previsao['jogos_home'] < 2 or previsao['jogos_away'] < 2:
             st.warning("Dados insuficientes para realizar predição com confiança.")
             return
 
-        resultado, probabilidade, gols_esperados_home, gols_esperados_away = predict_score_poisson(
-            home_avg=home_stats['media_gols_feitos'],
-            away_avg=away_stats['media_gols_feitos'],
-            home_def=home_stats['media_gols_sofridos'],
-            away_def=away_stats['media_gols_sofridos'],
-            df=df,  # NOVO: passa DataFrame
-            team_home=team_home,  # NOVO: passa nome do time
-            team_away=team_away   # NOVO: passa nome do adversário
-        )
+        if modelo_predicao == MODELO_PREDICAO_DIXON_COLES:
+            modelo = modelo_dixon_coles(df)
+            matriz_completa = modelo.matriz(team_home, team_away, max_gols=10)
+            if matriz_completa is None:
+                st.warning("Times fora do ajuste do modelo Dixon-Coles.")
+                return
+            gols_esperados_home, gols_esperados_away = modelo.lambdas(team_home, team_away)
+            (resultado, probabilidade), = placares_mais_provaveis(matriz_completa[:7, :7], 1)
+        else:
+            resultado, probabilidade = previsao['placar'], previsao['prob_placar']
+            gols_esperados_home, gols_esperados_away = previsao['lambda_home'], previsao['lambda_away']
+            matriz_completa = previsao['matriz']
 
         # Exibição de resultado com logos
         st.success("Placar Mais Provável:")
@@ -4673,14 +7815,13 @@ def show_score_prediction(df, teams):
             """
             st.markdown(html_away, unsafe_allow_html=True)
 
+        # Uma única matriz (até 10 gols) alimenta o top 10 e a folha de preços
+        matriz = matriz_completa[:7, :7]
+        massa_cauda = 1.0 - matriz.sum()
+        
         # Tabela com top 10 placares prováveis
         st.subheader("Top 10 placares mais prováveis")
-        results = []
-        for h in range(7):  # Aumentado de 6 para 7
-            for a in range(7):
-                prob = poisson.pmf(h, gols_esperados_home) * poisson.pmf(a, gols_esperados_away)
-                results.append(((h, a), prob))
-        results.sort(key=lambda x: x[1], reverse=True)
+        results = placares_mais_provaveis(matriz, 10)
         
         for i, ((h, a), p) in enumerate(results[:10], 1):
             if i == 1:
@@ -4706,13 +7847,28 @@ def show_score_prediction(df, teams):
             </div>
             """
             st.markdown(placar_html, unsafe_allow_html=True)
+        
+        st.caption(f"Placares com mais de 6 gols de um dos lados (fora da lista): {massa_cauda*100:.2f}%")
+        
+        st.subheader("💰 Folha de Preços (odds justas)")
+        display_price_sheet(precificar_mercados(matriz_completa), team_home, team_away)
+        
+        if modelo_predicao == MODELO_PREDICAO_DIXON_COLES:
+            with st.expander("🧮 Forças ajustadas (Dixon-Coles)"):
+                st.caption(
+                    f"{modelo.jogos} jogos | mando: ×{np.exp(modelo.mando):.2f} | ρ: {modelo.rho:+.3f} | "
+                    f"meia-vida: {modelo.meia_vida} rodadas"
+                    + ("" if modelo.convergiu else " | ⚠️ otimização não convergiu")
+                )
+                st.dataframe(modelo.forcas().style.format({'Ataque': '{:.2f}', 'Defesa': '{:.2f}'}),
+                             use_container_width=True, hide_index=True)
 
 
 # ============================================================================
 # EXEMPLO DE USO E TESTES
 # ============================================================================
 
-if __name__ == "__main__":
+if __name__ == "__main__" and '--varredura' not in sys.argv:
     """
     Exemplos de uso e validação das melhorias.
     """
@@ -4770,13 +7926,82 @@ if __name__ == "__main__":
 
 
 
+def show_season_simulation(df):
+    """Simulação de Monte Carlo do restante da temporada"""
+    st.header("🎲 Simulação da Temporada (Monte Carlo)")
+    
+    anos = sorted(int(ano) for ano in df['Ano'].dropna().unique())
+    if not anos:
+        st.warning("Nenhuma temporada disponível.")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        ano = st.selectbox("📅 Temporada:", anos[::-1], key="simulacao_ano")
+    with col2:
+        simulacoes = st.select_slider(
+            "🔁 Simulações:", options=[10_000, 50_000, 100_000, 200_000],
+            value=SIMULACOES_TEMPORADA, key="simulacao_n"
+        )
+    with col3:
+        semente = st.number_input("🌱 Semente:", min_value=0, value=SEMENTE_SIMULACAO, step=1, key="simulacao_semente")
+    
+    processos = 1
+    if (os.cpu_count() or 1) > 1 and st.checkbox("Usar múltiplos processos", key="simulacao_processos"):
+        processos = os.cpu_count()
+    
+    if not st.button("🎲 Simular Temporada", type="primary", use_container_width=True):
+        return
+    
+    with st.spinner("Simulando temporadas..."):
+        resultado = simular_temporada(df, ano, simulacoes=simulacoes, semente=int(semente), processos=processos)
+    
+    if resultado is None:
+        st.warning("Temporada sem dados suficientes para simulação.")
+        return
+    if resultado['jogos_restantes'] == 0:
+        st.info("✅ Temporada encerrada: a tabela final já está definida.")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Jogos Restantes", resultado['jogos_restantes'])
+    with col2:
+        st.metric("Simulações", f"{resultado['simulacoes']:,}".replace(",", "."))
+    with col3:
+        favorito = resultado['resumo'].sort_values('Título', ascending=False).iloc[0]
+        st.metric("Favorito ao Título", favorito['Time'], delta=f"{favorito['Título']*100:.1f}%", delta_color="off")
+    
+    st.subheader("📋 Projeção da Tabela Final")
+    formato = {zona: '{:.1%}' for zona in ZONAS_TABELA}
+    formato.update({'Pontos Esperados': '{:.1f}', 'Posição Média': '{:.1f}'})
+    st.dataframe(resultado['resumo'].style.format(formato), use_container_width=True, hide_index=True)
+    st.caption(
+        "Jogos restantes sorteados com o modelo Dixon-Coles do filtro atual. "
+        "Zonas: Libertadores 1º-4º, Sul-Americana 5º-6º, rebaixamento nos 4 últimos."
+    )
+    
+    st.subheader("🗺️ Distribuição de Posições")
+    distribuicao = resultado['distribuicao'] * 100
+    fig = px.imshow(
+        distribuicao,
+        labels=dict(x="Posição Final", y="Time", color="Probabilidade (%)"),
+        x=[str(posicao) for posicao in distribuicao.columns],
+        color_continuous_scale='Blues',
+        aspect='auto'
+    )
+    fig.update_traces(hovertemplate='<b>%{y}</b><br>Posição %{x}: %{z:.1f}%<extra></extra>')
+    fig.update_layout(height=650)
+    st.plotly_chart(fig, use_container_width=True)
+
+
 def main():
     st.markdown('<h1 class="main-header">Analise & Estatistica Brasileirao</h1>', unsafe_allow_html=True)
     st.markdown('<p class="subtitle">Sistema completo de analise estatistica do Campeonato Brasileiro</p>', unsafe_allow_html=True)
     
-    # Carrega os dados
+    # Carrega os dados (visões por temporada já particionadas e cacheadas)
     with st.spinner("Carregando dados..."):
-        df = load_data()
+        visoes = obter_visoes_temporada()
+    df = visoes['base']
     
     if df.empty:
         st.error("Nao foi possivel carregar os dados.")
@@ -4892,27 +8117,10 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    # Aplicação do filtro baseado na seleção
-    df_original = df.copy()
-    anos = sorted(df['Ano'].dropna().unique())
-    
-    if ano_selecionado == "2025 + 2026 (Combinados)":
-        df = df[df['Ano'].isin([2025, 2026])]
-    elif ano_selecionado == "Todos os Anos":
-        # Mantém todos os dados
-        pass
-    else:
-        # Filtro por ano específico
-        ano_num = int(ano_selecionado)
-        df = df[df['Ano'] == ano_num]
-
-    # Inicializa lista de times
-    if ('Home' in df.columns) and ('Away' in df.columns):
-        home_teams = df['Home'].dropna().astype(str).str.strip()
-        away_teams = df['Away'].dropna().astype(str).str.strip()
-        teams = sorted(set(home_teams) | set(away_teams))
-    else:
-        teams = []
+    # Aplicação do filtro baseado na seleção (visão pré-particionada, sem cópia)
+    df_original = visoes['base']
+    anos = visoes['anos']
+    df, teams = obter_visao(visoes, ano_selecionado)
 
     # ==== ESTATÍSTICAS UNIFICADAS EM CARD COMPACTO ====
     if not df.empty:
@@ -5040,6 +8248,10 @@ def main():
             if st.button("🤝 Confronto Direto", key="confronto", use_container_width=True):
                 st.session_state.selected_analysis = "4. Confronto Direto"
                 st.rerun()
+            
+            if st.button("🎲 Simulação da Temporada", key="simulacao", use_container_width=True):
+                st.session_state.selected_analysis = "8. Simulação da Temporada"
+                st.rerun()
 
         with col3:
             if st.button("🔮 Predição de Placar", key="predicao", use_container_width=True):
@@ -5083,6 +8295,8 @@ def main():
                 show_interactive_charts(df)
             elif st.session_state.selected_analysis == "7. Análise Escanteio":
                 show_corner_analysis(df, teams)
+            elif st.session_state.selected_analysis == "8. Simulação da Temporada":
+                show_season_simulation(df)
             else:
                 st.error("Opção de análise inválida.")
         except Exception as e:
@@ -5141,94 +8355,34 @@ def show_team_performance(df, teams):
     display_team_evolution_chart(df, teams, team)
 
 def calculate_advanced_team_stats(df, team, as_home=True):
-    """Calcula estatísticas avançadas incluindo primeiro tempo"""
-    if as_home:
-        games = df[df['Home'] == team].copy()
-        gols_feitos_col = 'Gols Home'
-        gols_sofridos_col = 'Gols Away'
-        gols_ht_feitos_col = 'Home Score HT'
-        gols_ht_sofridos_col = 'Away Score HT'
-        corners_feitos_col = 'Corner Home'
-        corners_sofridos_col = 'Corner Away'
-    else:
-        games = df[df['Away'] == team].copy()
-        gols_feitos_col = 'Gols Away'
-        gols_sofridos_col = 'Gols Home'
-        gols_ht_feitos_col = 'Away Score HT'
-        gols_ht_sofridos_col = 'Home Score HT'
-        corners_feitos_col = 'Corner Away'
-        corners_sofridos_col = 'Corner Home'
+    """Calcula estatísticas avançadas incluindo primeiro tempo (consulta ao cubo de agregados)"""
+    agregado = agregado_time(df, team, 'Home' if as_home else 'Away')
     
-    if games.empty:
-        return create_empty_team_stats()
-    
-    # Remove jogos com dados faltantes
-    required_cols = [gols_feitos_col, gols_sofridos_col]
-    available_cols = [col for col in required_cols if col in games.columns]
-    
-    if not available_cols:
-        return create_empty_team_stats()
-    
-    games = games.dropna(subset=available_cols)
-    
-    if games.empty:
+    if agregado is None:
         return create_empty_team_stats()
     
-    # Calcular resultados
-    if as_home:
-        games['Resultado'] = games.apply(lambda row: 
-            'Vitoria' if row[gols_feitos_col] > row[gols_sofridos_col] else
-            'Empate' if row[gols_feitos_col] == row[gols_sofridos_col] else
-            'Derrota', axis=1)
-    else:
-        games['Resultado'] = games.apply(lambda row: 
-            'Vitoria' if row[gols_feitos_col] > row[gols_sofridos_col] else
-            'Empate' if row[gols_feitos_col] == row[gols_sofridos_col] else
-            'Derrota', axis=1)
-    
-    # Estatísticas básicas
-    total_jogos = len(games)
-    vitorias = len(games[games['Resultado'] == 'Vitoria'])
-    empates = len(games[games['Resultado'] == 'Empate'])
-    derrotas = len(games[games['Resultado'] == 'Derrota'])
-    
-    gols_feitos = games[gols_feitos_col].sum()
-    gols_sofridos = games[gols_sofridos_col].sum()
-    
-    # Estatísticas do primeiro tempo
-    gols_ht_feitos = 0
-    gols_ht_sofridos = 0
-    if gols_ht_feitos_col in games.columns and gols_ht_sofridos_col in games.columns:
-        games_ht = games.dropna(subset=[gols_ht_feitos_col, gols_ht_sofridos_col])
-        if not games_ht.empty:
-            gols_ht_feitos = games_ht[gols_ht_feitos_col].sum()
-            gols_ht_sofridos = games_ht[gols_ht_sofridos_col].sum()
-    
-    # Estatísticas de s
-    corners_feitos = 0
-    corners_sofridos = 0
-    if corners_feitos_col in games.columns and corners_sofridos_col in games.columns:
-        games_corners = games.dropna(subset=[corners_feitos_col, corners_sofridos_col])
-        if not games_corners.empty:
-            corners_feitos = games_corners[corners_feitos_col].sum()
-            corners_sofridos = games_corners[corners_sofridos_col].sum()
+    total_jogos = agregado['jogos']
+    gols_feitos = agregado['gols_feitos']
+    gols_sofridos = agregado['gols_sofridos']
+    corners_feitos = agregado['corners_feitos']
+    corners_sofridos = agregado['corners_sofridos']
     
     return {
         'jogos': total_jogos,
-        'vitorias': vitorias,
-        'empates': empates,
-        'derrotas': derrotas,
-        'perc_vitorias': (vitorias / total_jogos * 100) if total_jogos > 0 else 0,
-        'perc_empates': (empates / total_jogos * 100) if total_jogos > 0 else 0,
-        'perc_derrotas': (derrotas / total_jogos * 100) if total_jogos > 0 else 0,
+        'vitorias': agregado['vitorias'],
+        'empates': agregado['empates'],
+        'derrotas': agregado['derrotas'],
+        'perc_vitorias': agregado['perc_vitorias'],
+        'perc_empates': agregado['perc_empates'],
+        'perc_derrotas': agregado['perc_derrotas'],
         'gols_feitos': gols_feitos,
         'gols_sofridos': gols_sofridos,
-        'media_gols_feitos': gols_feitos / total_jogos if total_jogos > 0 else 0,
-        'media_gols_sofridos': gols_sofridos / total_jogos if total_jogos > 0 else 0,
-        'gols_ht_feitos': gols_ht_feitos,
-        'gols_ht_sofridos': gols_ht_sofridos,
-        'media_gols_ht_feitos': gols_ht_feitos / total_jogos if total_jogos > 0 else 0,
-        'media_gols_ht_sofridos': gols_ht_sofridos / total_jogos if total_jogos > 0 else 0,
+        'media_gols_feitos': agregado['media_gols_feitos'],
+        'media_gols_sofridos': agregado['media_gols_sofridos'],
+        'gols_ht_feitos': agregado['gols_ht_feitos'],
+        'gols_ht_sofridos': agregado['gols_ht_sofridos'],
+        'media_gols_ht_feitos': agregado['media_gols_ht_feitos'],
+        'media_gols_ht_sofridos': agregado['media_gols_ht_sofridos'],
         'corners_feitos': corners_feitos,
         'corners_sofridos': corners_sofridos,
         'media_corners_feitos': corners_feitos / total_jogos if total_jogos > 0 else 0,
@@ -5412,72 +8566,122 @@ def display_team_evolution_chart(df, teams, selected_team):
         st.warning("Selecione pelo menos um time para análise.")
         return
     
+    metrica = st.radio(
+        "📐 Métrica:",
+        ["Posição na Tabela", "Rating Elo"],
+        horizontal=True,
+        key="metrica_evolucao"
+    )
+    
     # Criar gráfico de evolução
-    create_position_evolution_chart(df, times_comparacao, anos_selecionados)
+    if metrica == "Rating Elo":
+        create_elo_evolution_chart(df, times_comparacao, anos_selecionados)
+    else:
+        create_position_evolution_chart(df, times_comparacao, anos_selecionados)
+
+
+def create_elo_evolution_chart(df, teams_selected, years_selected):
+    """Cria gráfico da evolução do rating Elo (snapshot após cada jogo do time)"""
+    motor = motor_elo(df)
+    anos = [int(ano) for ano in years_selected]
+    
+    fig = go.Figure()
+    colors = px.colors.qualitative.Set1
+    resumo = []
+    
+    for i, team in enumerate(teams_selected):
+        historico = motor.historico(team)
+        if anos:
+            historico = historico[historico['Ano'].isin(anos)]
+        
+        for ano, dados in historico.groupby('Ano'):
+            team_label = f"{team} ({ano})" if len(anos) != 1 else team
+            fig.add_trace(go.Scatter(
+                x=dados['Jogo Nº'],
+                y=dados['Rating'],
+                mode='lines+markers',
+                name=team_label,
+                line=dict(color=colors[i % len(colors)], width=3),
+                marker=dict(size=6),
+                customdata=dados['Mando'],
+                hovertemplate=f'<b>{team_label}</b><br>' +
+                             'Jogo: %{x}<br>' +
+                             'Elo: %{y:.0f}<br>' +
+                             'Mando: %{customdata}<br>' +
+                             '<extra></extra>'
+            ))
+            resumo.append({
+                'Time': team_label,
+                'Elo Atual': round(dados['Rating'].iloc[-1]),
+                'Maior Elo': round(dados['Rating'].max()),
+                'Menor Elo': round(dados['Rating'].min()),
+                'Jogos': len(dados)
+            })
+    
+    if not resumo:
+        st.warning("Não há dados suficientes para criar o gráfico de evolução.")
+        return
+    
+    fig.update_layout(
+        title="Evolução do Rating Elo",
+        xaxis_title="Jogos do Time na Temporada",
+        yaxis_title="Rating Elo",
+        xaxis=dict(dtick=2),
+        hovermode='closest',
+        height=600,
+        showlegend=True,
+        legend=dict(
+            yanchor="top",
+            y=0.99,
+            xanchor="left",
+            x=1.01
+        ),
+        plot_bgcolor='rgba(50,50,50,1)',
+        paper_bgcolor='#1E1E1E',
+        font=dict(color='white'),
+        title_font=dict(color='white')
+    )
+    fig.add_hline(y=ELO_INICIAL, line_dash="dash", line_color="gray",
+                  annotation_text="Média", annotation_position="left")
+    
+    st.plotly_chart(fig, use_container_width=True)
+    
+    if len(resumo) > 1:
+        st.subheader("📊 Resumo Comparativo")
+        st.dataframe(pd.DataFrame(resumo), use_container_width=True, hide_index=True)
 
 def create_position_evolution_chart(df, teams_selected, years_selected):
-    """Cria gráfico de evolução das posições"""
+    """Cria gráfico de evolução das posições (classificação real após cada rodada)"""
+    
+    # Classificações por rodada de cada temporada (cacheadas por DataFrame)
+    classificacoes = classificacoes_por_temporada(df)
+    anos = [int(ano) for ano in years_selected] if years_selected else list(classificacoes)
     
     # Preparar dados
     evolution_data = []
     
     for team in teams_selected:
-        for year in years_selected if years_selected else [None]:
-            # Filtrar dados
-            if year and 'Ano' in df.columns:
-                team_games = df[((df['Home'] == team) | (df['Away'] == team)) & (df['Ano'] == year)].copy()
-            else:
-                team_games = df[(df['Home'] == team) | (df['Away'] == team)].copy()
-            
-            if team_games.empty:
+        for year in anos:
+            tabela = classificacoes.get(year)
+            if tabela is None or team not in tabela['times']:
                 continue
             
-            # Simular evolução da posição (baseado em pontos acumulados)
-            team_games = team_games.sort_values('Jogo ID' if 'Jogo ID' in team_games.columns else team_games.index)
+            indice = tabela['times'].index(team)
+            # Só as rodadas a partir da primeira partida do time
+            jogou = tabela['jogos'][:, indice] > 0
             
-            points = 0
-            positions = []
-            rodadas = []
-            
-            for idx, (_, game) in enumerate(team_games.iterrows(), 1):
-                # Calcular pontos do jogo
-                if game['Home'] == team:
-                    gols_feitos = game['Gols Home']
-                    gols_sofridos = game['Gols Away']
-                else:
-                    gols_feitos = game['Gols Away']
-                    gols_sofridos = game['Gols Home']
-                
-                if gols_feitos > gols_sofridos:
-                    points += 3
-                elif gols_feitos == gols_sofridos:
-                    points += 1
-                
-                # Simular posição (simplificado - baseado em pontos por jogo)
-                avg_points = points / idx
-                # Converter para posição (simulada)
-                if avg_points >= 2.0:
-                    position = min(1 + (2.5 - avg_points) * 4, 4)
-                elif avg_points >= 1.5:
-                    position = 4 + (2.0 - avg_points) * 8
-                elif avg_points >= 1.0:
-                    position = 8 + (1.5 - avg_points) * 8
-                else:
-                    position = 16 + (1.0 - avg_points) * 4
-                
-                positions.append(max(1, min(20, int(position))))
-                rodadas.append(idx)
-            
-            # Adicionar aos dados
-            team_label = f"{team}" if not years_selected else f"{team} ({year})"
+            team_label = f"{team} ({year})" if years_selected or len(anos) > 1 else f"{team}"
             evolution_data.extend([
                 {
                     'Time': team_label,
-                    'Rodada': rodada,
-                    'Posicao': pos,
-                    'Ano': year if year else 'N/A'
+                    'Rodada': int(rodada),
+                    'Posicao': int(posicao),
+                    'Pontos': int(pontos),
+                    'Ano': year
                 }
-                for rodada, pos in zip(rodadas, positions)
+                for rodada, posicao, pontos in zip(tabela['rodadas'][jogou],
+                                                   tabela['posicao'][jogou, indice],
+                                                   tabela['pontos'][jogou, indice])
             ])
     
     if not evolution_data:
@@ -5502,9 +8706,11 @@ def create_position_evolution_chart(df, teams_selected, years_selected):
             name=team,
             line=dict(color=colors[i % len(colors)], width=3),
             marker=dict(size=6),
+            customdata=team_data['Pontos'],
             hovertemplate=f'<b>{team}</b><br>' +
                          'Rodada: %{x}<br>' +
                          'Posição: %{y}<br>' +
+                         'Pontos: %{customdata}<br>' +
                          '<extra></extra>'
         ))
     
@@ -5582,7 +8788,10 @@ def display_team_with_logo(team_name, logo_size=(80, 80)):
 
 # CHAMADA DA MAIN (adicionar no final do arquivo)
 if __name__ == "__main__":
-    main()
+    if '--varredura' in sys.argv:
+        executar_varredura_cli(sys.argv[1:])
+    else:
+        main()
 
 
 